@@ -0,0 +1,227 @@
+"""Admission control for media jobs: quotas, in-flight cap, queue and resource pressure."""
+
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import ADMISSION_REJECTED_TOTAL
+
+RESOURCE_CHECK_INTERVAL = 1.0
+
+
+def available_memory_mb() -> Optional[float]:
+    """MemAvailable from /proc/meminfo (Linux containers); None elsewhere."""
+    try:
+        with open("/proc/meminfo", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def free_disk_mb(path: str) -> Optional[float]:
+    try:
+        return shutil.disk_usage(path).free / (1024 * 1024)
+    except OSError:
+        return None
+
+
+def load_per_cpu() -> Optional[float]:
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except (OSError, AttributeError):
+        return None
+
+
+class Ticket:
+    """Admitted jobs; release() (or leaving the ``with`` block) frees the quota once."""
+
+    __slots__ = ("_admission", "user_id", "chat_id", "jobs")
+
+    def __init__(self, admission: "Admission", user_id: Any, chat_id: Any, jobs: int):
+        self._admission = admission
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.jobs = jobs
+
+    def release(self) -> None:
+        if self._admission is not None:
+            self._admission._release(self)
+            self._admission = None
+
+    def __enter__(self) -> "Ticket":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class InFlight:
+    """
+    Admitted jobs and jobs waiting for a download slot across every bot of a
+    process. The bots share it (SharedServices) so the in-flight cap and the
+    queue limit hold for the host, not once per token.
+    """
+
+    __slots__ = ("jobs", "waiting")
+
+    def __init__(self) -> None:
+        self.jobs = 0
+        self.waiting = 0
+
+
+class Admission:
+    """
+    Decides up front whether a message's media jobs are accepted. Rejects when
+    the user or chat already has its quota of jobs in flight, the global
+    in-flight cap would be exceeded, too many jobs wait for a download slot,
+    or the host is short on disk, memory or CPU. Rejections are immediate so
+    the caller can answer "busy" instead of queueing work it cannot finish.
+    The quotas are this instance's own; the in-flight count and the slot
+    queue come from ``shared`` when several bots share one host.
+    Event-loop only; not thread-safe.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_in_flight: int,
+        per_user: int,
+        per_chat: int,
+        max_waiting: int,
+        waiting: Optional[Callable[[], int]] = None,
+        shared: Optional[InFlight] = None,
+        disk_path: str = ".",
+        min_free_disk_mb: float = 0,
+        min_free_memory_mb: float = 0,
+        max_load_per_cpu: float = 0,
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.per_user = max(1, per_user)
+        self.per_chat = max(1, per_chat)
+        self.max_waiting = max_waiting
+        self._shared = shared or InFlight()
+        self._waiting = waiting or (lambda: self._shared.waiting)
+        self.disk_path = disk_path
+        self.min_free_disk_mb = min_free_disk_mb
+        self.min_free_memory_mb = min_free_memory_mb
+        self.max_load_per_cpu = max_load_per_cpu
+        self._by_user: Dict[Any, int] = {}
+        self._by_chat: Dict[Any, int] = {}
+        self._pressure: Optional[str] = None
+        self._pressure_checked = 0.0
+        self.rejected: Dict[str, int] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._shared.jobs
+
+    def _resource_pressure(self) -> Optional[str]:
+        now = time.monotonic()
+        if now - self._pressure_checked < RESOURCE_CHECK_INTERVAL:
+            return self._pressure
+        self._pressure_checked = now
+        pressure = None
+        if self.min_free_disk_mb > 0:
+            disk = free_disk_mb(self.disk_path)
+            if disk is not None and disk < self.min_free_disk_mb:
+                pressure = "disk"
+        if pressure is None and self.min_free_memory_mb > 0:
+            memory = available_memory_mb()
+            if memory is not None and memory < self.min_free_memory_mb:
+                pressure = "memory"
+        if pressure is None and self.max_load_per_cpu > 0:
+            load = load_per_cpu()
+            if load is not None and load > self.max_load_per_cpu:
+                pressure = "cpu"
+        self._pressure = pressure
+        return pressure
+
+    def _reason(self, user_id: Any, chat_id: Any, jobs: int) -> Optional[str]:
+        if user_id is not None and self._by_user.get(user_id, 0) + jobs > self.per_user:
+            return "user_quota"
+        if self._by_chat.get(chat_id, 0) + jobs > self.per_chat:
+            return "chat_quota"
+        if self.in_flight + jobs > self.max_in_flight:
+            return "in_flight"
+        if self.max_waiting > 0 and self._waiting() >= self.max_waiting:
+            return "queue"
+        return self._resource_pressure()
+
+    def room(self, user_id: Any, chat_id: Any) -> int:
+        """
+        How many more jobs this user and chat fit under the quotas and the
+        in-flight cap right now. A message with more links than this can only
+        be admitted in part: asking for all of them would fail every time.
+        """
+        room = min(self.per_chat - self._by_chat.get(chat_id, 0), self.max_in_flight - self.in_flight)
+        if user_id is not None:
+            room = min(room, self.per_user - self._by_user.get(user_id, 0))
+        return max(0, room)
+
+    def try_admit(
+        self, user_id: Any, chat_id: Any, jobs: int = 1
+    ) -> Tuple[Optional[Ticket], Optional[str]]:
+        """(ticket, None) when admitted, else (None, reason)."""
+        reason = self._reason(user_id, chat_id, jobs)
+        if reason is not None:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            ADMISSION_REJECTED_TOTAL.inc(reason=reason)
+            return None, reason
+        self._shared.jobs += jobs
+        if user_id is not None:
+            self._by_user[user_id] = self._by_user.get(user_id, 0) + jobs
+        self._by_chat[chat_id] = self._by_chat.get(chat_id, 0) + jobs
+        return Ticket(self, user_id, chat_id, jobs), None
+
+    def queued_room(
+        self, user_jobs: int, chat_jobs: int, in_flight: int, user_id: Any = None
+    ) -> int:
+        """room() against counts kept elsewhere, as in check_queued()."""
+        room = min(
+            self.per_chat - chat_jobs, self.max_in_flight + max(0, self.max_waiting) - in_flight
+        )
+        if user_id is not None:
+            room = min(room, self.per_user - user_jobs)
+        return max(0, room)
+
+    def check_queued(
+        self, user_jobs: int, chat_jobs: int, in_flight: int, jobs: int = 1, user_id: Any = None
+    ) -> Optional[str]:
+        """
+        Quotas against counts kept elsewhere (the shared job queue, on an ingest
+        node whose own host does not run the jobs). None when admitted.
+        """
+        reason = None
+        if user_id is not None and user_jobs + jobs > self.per_user:
+            reason = "user_quota"
+        elif chat_jobs + jobs > self.per_chat:
+            reason = "chat_quota"
+        elif in_flight + jobs > self.max_in_flight + max(0, self.max_waiting):
+            reason = "queue"
+        if reason is not None:
+            self.rejected[reason] = self.rejected.get(reason, 0) + 1
+            ADMISSION_REJECTED_TOTAL.inc(reason=reason)
+        return reason
+
+    def _release(self, ticket: Ticket) -> None:
+        self._shared.jobs -= ticket.jobs
+        for counts, key in ((self._by_user, ticket.user_id), (self._by_chat, ticket.chat_id)):
+            if key is None or key not in counts:
+                continue
+            counts[key] -= ticket.jobs
+            if counts[key] <= 0:
+                del counts[key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pressure": self._pressure,
+            "rejected": dict(self.rejected),
+        }
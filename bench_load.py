@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Offline load test: synthetic Instagram-link messages through the real bot,
+against a local fake Bot API and local fake mirrors. Nothing leaves the host,
+so runs are reproducible and comparable across changes to probing and
+scheduling.
+
+    python bench_load.py --messages 500 --chats 50 --rate 100
+    python bench_load.py --mirror instagram7.com=latency=0.4,placeholder=0.3 \\
+        --mirror eeinstagram.com=redirect=1 --default-mirror latency=0.05
+    MAX_CONCURRENT_UPDATES=4 python bench_load.py --json
+
+Mirror behaviour is ``latency``, ``jitter`` (seconds) and the ``placeholder``,
+``redirect`` (to instagram.com) and ``error`` (HTTP 502) shares of answers,
+per host or as the default. Every other knob is the bot's own environment
+(MIRROR_FALLBACK_HOSTS, PREVIEW_*, MIRROR_TRUST_*, TELEGRAM_RATE_LIMIT, ...);
+TikTok downloads and the mirror canary are off unless set in the environment.
+
+Reports throughput, reply latency (update queued on the fake API -> reply
+received by it) as p50/p95/p99/max, which mirror the replies used, what the
+fake mirrors answered, and CPU, peak RSS, threads and event-loop lag. The
+fakes run in this process too, so CPU and memory include them: compare runs
+with each other, not with production.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import urlparse
+
+from bench_startup import peak_rss_mb, rss_mb
+from fake_mirrors import FakeMirrors, MirrorBehaviour
+from fake_telegram import FakeBotAPI
+
+TOKEN = "1:load"
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def _shortcode(rng: random.Random) -> str:
+    alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789_-"
+    return "".join(rng.choice(alphabet) for _ in range(11))
+
+
+def build_messages(
+    count: int, chats: int, photos: float, repeat: float, seed: int
+) -> List[Tuple[int, int, str]]:
+    """(chat_id, message_id, text); a ``repeat`` share links a post sent before."""
+    rng = random.Random(seed)
+    posts: List[str] = []
+    out = []
+    for i in range(count):
+        if posts and rng.random() < repeat:
+            url = rng.choice(posts)
+        else:
+            kind = "p" if rng.random() < photos else "reel"
+            url = f"https://www.instagram.com/{kind}/{_shortcode(rng)}/"
+            posts.append(url)
+        # Every other chat is a group, the rest are DMs.
+        chat = i % chats
+        chat_id = 10_000 + chat if chat % 2 == 0 else -1001000000000 - chat
+        out.append((chat_id, i + 1, f"look {url}"))
+    return out
+
+
+def _reply_to(params: Dict[str, Any]) -> Optional[int]:
+    reply = params.get("reply_to_message_id")
+    if reply is None:
+        reply = (params.get("reply_parameters") or {}).get("message_id")
+    return int(reply) if reply is not None else None
+
+
+def _cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+async def drive(
+    host,
+    api: FakeBotAPI,
+    messages: List[Tuple[int, int, str]],
+    *,
+    rate: float,
+    timeout: float,
+) -> Dict[str, Any]:
+    """Push ``messages`` at ``rate`` per second (0 = all at once) and wait for the replies."""
+    stop = asyncio.Event()
+    serving = asyncio.create_task(host.serve(stop))
+    result: Dict[str, Any] = {}
+    try:
+        started = time.monotonic()
+        while not api.calls_to("getUpdates"):
+            if serving.done() or time.monotonic() - started > timeout:
+                raise RuntimeError("bot never started polling")
+            await asyncio.sleep(0.01)
+
+        seen = len(api.calls)
+        sent: Dict[Tuple[int, int], float] = {}
+        replies: Dict[Tuple[int, int], Tuple[float, str]] = {}
+        threads = threading.active_count()
+        cpu_before = _cpu_seconds()
+        began = time.monotonic()
+
+        # Messages of each chat not answered yet, oldest first. Replies in DMs
+        # do not quote, so they go to the oldest; chats are handled in order.
+        pending: Dict[int, List[int]] = {}
+
+        def collect() -> None:
+            nonlocal seen
+            new = api.calls_since(seen)
+            seen += len(new)
+            for method, params, at in new:
+                if method.lower() != "sendmessage":
+                    continue
+                chat_id = int(params.get("chat_id", 0))
+                waiting = pending.get(chat_id)
+                if not waiting:
+                    continue
+                reply_to = _reply_to(params)
+                message_id = reply_to if reply_to in waiting else waiting[0]
+                waiting.remove(message_id)
+                replies[(chat_id, message_id)] = (at, str(params.get("text", "")))
+
+        for i, (chat_id, message_id, text) in enumerate(messages):
+            if rate > 0:
+                delay = began + i / rate - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            sent[(chat_id, message_id)] = time.monotonic()
+            pending.setdefault(chat_id, []).append(message_id)
+            api.push_update(
+                TOKEN,
+                {
+                    "message": {
+                        "message_id": message_id,
+                        "date": int(time.time()),
+                        "chat": {
+                            "id": chat_id,
+                            "type": "private" if chat_id > 0 else "supergroup",
+                        },
+                        "from": {"id": abs(chat_id) % 100_000, "is_bot": False, "first_name": "L"},
+                        "text": text,
+                    }
+                },
+            )
+            collect()
+            threads = max(threads, threading.active_count())
+
+        deadline = time.monotonic() + timeout
+        while len(replies) < len(sent) and time.monotonic() < deadline:
+            if serving.done():
+                break
+            await asyncio.sleep(0.01)
+            collect()
+            threads = max(threads, threading.active_count())
+        finished = max((at for at, _ in replies.values()), default=time.monotonic())
+
+        latencies = [at - sent[key] for key, (at, _) in replies.items()]
+        used = Counter(
+            urlparse(text.split()[-1]).netloc.removeprefix("www.") if text else "?"
+            for _, text in replies.values()
+        )
+        bot = host.bots[0]
+        result.update(
+            messages=len(sent),
+            replied=len(replies),
+            unanswered=len(sent) - len(replies),
+            duration_s=finished - began,
+            throughput_per_s=len(replies) / max(finished - began, 1e-9),
+            latency_s={
+                "p50": percentile(latencies, 0.50),
+                "p95": percentile(latencies, 0.95),
+                "p99": percentile(latencies, 0.99),
+                "max": max(latencies, default=None),
+                "mean": sum(latencies) / len(latencies) if latencies else None,
+            },
+            replies_by_mirror=dict(used.most_common()),
+            cpu_s=_cpu_seconds() - cpu_before,
+            max_threads=threads,
+            max_loop_lag_s=bot.health.loop.peak_lag,
+        )
+        if bot.preview_slo:
+            result["preview_slo"] = bot.preview_slo.snapshot()["state"]
+    finally:
+        stop.set()
+        await asyncio.wait_for(serving, timeout)
+    return result
+
+
+def _round(value: Any) -> Any:
+    if isinstance(value, float):
+        return round(value, 4)
+    if isinstance(value, dict):
+        return {k: _round(v) for k, v in value.items()}
+    return value
+
+
+def _print_report(report: Dict[str, Any]) -> None:
+    lat = report["latency_s"]
+
+    def ms(v: Optional[float]) -> str:
+        return f"{v * 1000:.0f}ms" if v is not None else "-"
+
+    print(
+        f"{report['replied']}/{report['messages']} replied in {report['duration_s']:.2f}s"
+        f" ({report['throughput_per_s']:.1f}/s), {report['unanswered']} unanswered"
+    )
+    print(
+        f"latency p50 {ms(lat['p50'])}  p95 {ms(lat['p95'])}  p99 {ms(lat['p99'])}"
+        f"  max {ms(lat['max'])}"
+    )
+    print(f"replies by mirror: {report['replies_by_mirror']}")
+    print(f"mirror answers: {report['mirror_hits']}")
+    print(
+        f"cpu {report['cpu_s']:.2f}s  peak rss {report['peak_rss_mb']:.0f}MB"
+        f"  rss {report['rss_mb']:.0f}MB  threads {report['max_threads']}"
+        f"  loop lag max {ms(report['max_loop_lag_s'])}"
+        + (f"  slo {report['preview_slo']}" if "preview_slo" in report else "")
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=50.0, help="messages/s; 0 = all at once")
+    parser.add_argument("--photos", type=float, default=0.3, help="share of /p/ links")
+    parser.add_argument("--repeat", type=float, default=0.0, help="share of repeated posts")
+    parser.add_argument(
+        "--mirror",
+        action="append",
+        default=[],
+        metavar="HOST=SPEC",
+        help="behaviour of one mirror, e.g. instagram7.com=latency=0.3,placeholder=0.5",
+    )
+    parser.add_argument("--default-mirror", default="", metavar="SPEC")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="fake Bot API delay (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="wait for replies (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="keep the bot's INFO logs")
+    args = parser.parse_args()
+
+    if "bot" in sys.modules:
+        print("bench_load needs a fresh interpreter", file=sys.stderr)
+        return 1
+    behaviours = {}
+    for spec in args.mirror:
+        name, _, rest = spec.partition("=")
+        behaviours[name.strip()] = MirrorBehaviour.parse(rest)
+    default = MirrorBehaviour.parse(args.default_mirror)
+    messages = build_messages(
+        args.messages, max(1, args.chats), args.photos, args.repeat, args.seed
+    )
+
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    with FakeBotAPI(latency=args.api_latency) as api, FakeMirrors(
+        behaviours, default, seed=args.seed
+    ) as mirrors:
+        os.environ.update(
+            BOT_TOKEN=TOKEN,
+            DOWNLOAD_PATH=os.path.join(workdir, "downloads"),
+            JOB_STORE_PATH="",
+            PORT="0",
+            TELEGRAM_API_BASE_URL=api.base_url,
+        )
+        os.environ.pop("BOT_PROFILES", None)
+        for name, value in (
+            ("ENABLE_TIKTOK_DOWNLOAD", "false"),
+            ("MIRROR_CANARY_INTERVAL", "0"),
+            ("TELEGRAM_RATE_LIMIT", "false"),
+        ):
+            os.environ.setdefault(name, value)
+
+        import bot
+        import config
+        import preview_check
+
+        if not args.verbose:
+            logging.getLogger().setLevel(logging.WARNING)
+        preview_check.use_transport(mirrors.transport())
+        host = bot.BotHost(config.BOT_PROFILES, bot.SocialLinksBot)
+        try:
+            report = asyncio.run(
+                drive(host, api, messages, rate=args.rate, timeout=args.timeout)
+            )
+        finally:
+            host.shared.close()
+            preview_check.use_transport(None)
+        report["mirror_hits"] = {
+            f"{h}/{outcome}": n for (h, outcome), n in sorted(mirrors.hits.items())
+        }
+    report["rss_mb"] = rss_mb()
+    report["peak_rss_mb"] = peak_rss_mb()
+    report["settings"] = {
+        "messages": args.messages,
+        "chats": args.chats,
+        "rate": args.rate,
+        "check_link_preview": config.CHECK_LINK_PREVIEW,
+        "max_concurrent_updates": config.MAX_CONCURRENT_UPDATES,
+        "mirror_hosts": host.bots[0]._mirror_hosts,
+    }
+    report = _round(report)
+    if args.json:
+        print(json.dumps(report))
+    else:
+        _print_report(report)
+    return 0 if report["unanswered"] == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
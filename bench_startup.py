@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: how long ``import bot`` takes and how much memory the
+process holds once the bot is ready for its first update.
+
+Runs the real bot with long polling against a local fake Bot API (no network,
+link previews off), waits for the first getUpdates call, then sends one
+Instagram link and times the reply. Prints one JSON object:
+
+    python bench_startup.py                 # as configured (TikTok on by default)
+    python bench_startup.py --no-tiktok     # ENABLE_TIKTOK_DOWNLOAD=false
+    python bench_startup.py --eager         # import yt-dlp up front, for comparison
+
+Run it once per configuration; every run needs a fresh interpreter.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import time
+
+
+def rss_mb() -> float:
+    """Current resident set size (VmRSS on Linux, else the peak)."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kB on Linux, bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+async def _serve_first_update(host, api, token: str, timeout: float) -> dict:
+    stop = asyncio.Event()
+    serving = asyncio.create_task(host.serve(stop))
+    started = time.perf_counter()
+    result: dict = {}
+    try:
+        while not api.calls_to("getUpdates"):
+            if serving.done() or time.perf_counter() - started > timeout:
+                raise RuntimeError("bot never started polling")
+            await asyncio.sleep(0.005)
+        result["ready_s"] = time.perf_counter() - started
+        result["rss_at_ready_mb"] = rss_mb()
+        result["yt_dlp_loaded_at_ready"] = "yt_dlp" in sys.modules
+
+        sent = time.perf_counter()
+        api.push_update(
+            token,
+            {
+                "message": {
+                    "message_id": 1,
+                    "date": int(time.time()),
+                    "chat": {"id": 77, "type": "private"},
+                    "from": {"id": 77, "is_bot": False, "first_name": "Bench"},
+                    "text": "https://www.instagram.com/reel/AbCdE/",
+                }
+            },
+        )
+        while not api.calls_to("sendMessage"):
+            if serving.done() or time.perf_counter() - sent > timeout:
+                raise RuntimeError("no reply to the first update")
+            await asyncio.sleep(0.002)
+        result["first_reply_s"] = time.perf_counter() - sent
+    finally:
+        stop.set()
+        await asyncio.wait_for(serving, timeout)
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    tiktok = parser.add_mutually_exclusive_group()
+    tiktok.add_argument("--tiktok", dest="tiktok", action="store_true", default=None)
+    tiktok.add_argument("--no-tiktok", dest="tiktok", action="store_false")
+    parser.add_argument("--eager", action="store_true", help="import yt-dlp before the bot")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    if "bot" in sys.modules:
+        print("bench_startup needs a fresh interpreter", file=sys.stderr)
+        return 1
+
+    from fake_telegram import FakeBotAPI
+
+    token = "1:bench"
+    workdir = tempfile.mkdtemp(prefix="bench-startup-")
+    with FakeBotAPI() as api:
+        os.environ.update(
+            BOT_TOKEN=token,
+            CHECK_LINK_PREVIEW="false",
+            DOWNLOAD_PATH=os.path.join(workdir, "downloads"),
+            JOB_STORE_PATH=os.path.join(workdir, "jobs.sqlite3"),
+            PORT="0",
+            TELEGRAM_API_BASE_URL=api.base_url,
+            TELEGRAM_RATE_LIMIT="false",
+        )
+        os.environ.pop("BOT_PROFILES", None)
+        if args.tiktok is not None:
+            os.environ["ENABLE_TIKTOK_DOWNLOAD"] = "true" if args.tiktok else "false"
+
+        baseline_mb = rss_mb()
+        started = time.perf_counter()
+        if args.eager:
+            import yt_dlp  # noqa: F401
+        import bot
+        import config
+
+        report = {
+            "tiktok": config.ENABLE_TIKTOK_DOWNLOAD,
+            "eager": args.eager,
+            "import_s": time.perf_counter() - started,
+            "rss_before_import_mb": baseline_mb,
+            "rss_after_import_mb": rss_mb(),
+            "yt_dlp_loaded_at_import": "yt_dlp" in sys.modules,
+        }
+        logging.getLogger().setLevel(logging.WARNING)
+
+        built = time.perf_counter()
+        host = bot.BotHost(config.BOT_PROFILES, bot.SocialLinksBot)
+        report["build_s"] = time.perf_counter() - built
+        try:
+            report.update(asyncio.run(_serve_first_update(host, api, token, args.timeout)))
+        finally:
+            host.shared.close()
+    report["startup_to_ready_s"] = report["import_s"] + report["build_s"] + report["ready_s"]
+    report["peak_rss_mb"] = peak_rss_mb()
+    print(json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in report.items()}))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,17 +1,24 @@
 import asyncio
+import functools
+import hmac
 import html
 import logging
 import os
-import threading
+import secrets
+import signal
+import socket
 import time
-from typing import Any, Dict, Optional
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-from telegram import Update
-from telegram.constants import ChatType
+from telegram import Chat, InputMediaVideo, Message, Update
+from telegram.constants import ChatAction, ChatType
 from telegram.error import Conflict, NetworkError, TelegramError, TimedOut
 from telegram.ext import (
     Application,
     BaseHandler,
+    CallbackContext,
     CommandHandler,
     ContextTypes,
     MessageHandler,
@@ -19,31 +26,103 @@ from telegram.ext import (
 )
 
 from config import (
-    ALLOWED_CHAT_IDS,
-    ALLOW_PRIVATE_CHAT,
-    BOT_TOKEN,
+    ADMIN_TOKEN,
+    BOT_PROFILES,
+    BOT_ROLE,
     CHECK_LINK_PREVIEW,
-    ENABLE_TIKTOK_DOWNLOAD,
+    DOWNLOAD_PATH,
+    ERROR_MESSAGES,
+    HANDLED_MESSAGES_CAPACITY,
+    HANDLED_MESSAGES_TTL_HOURS,
+    HEALTH_MAX_LOOP_LAG,
+    HEALTH_POLL_STALE_AFTER,
+    INGEST_LEASE_SECONDS,
+    JOB_DRAIN_TIMEOUT,
+    JOB_QUEUE_BACKEND,
+    JOB_RESUME_MAX_AGE,
+    JOB_RESUME_MAX_ATTEMPTS,
     LOG_LINK_ACTIVITY,
+    MAX_CONCURRENT_UPDATES,
+    MAX_FILE_SIZE_MB,
+    MIRROR_TRUST_MIN_SAMPLES,
+    MIRROR_TRUST_RECHECK_EVERY,
+    MIRROR_TRUST_SUCCESS_RATE,
     MIRROR_FALLBACK_HOSTS,
-    MIRROR_HOST,
     PREVIEW_FALLBACK_UNCHECKED,
     PREVIEW_PROBE_TIMEOUT,
+    PREVIEW_SLO_COOLDOWN,
+    PREVIEW_SLO_MIN_SUCCESS,
+    PREVIEW_SLO_P95_SECONDS,
+    PREVIEW_SLO_WINDOW,
     RESTART_ON_STOP,
+    TELEGRAM_API_BASE_FILE_URL,
+    TELEGRAM_API_BASE_URL,
     TELEGRAM_CONNECT_TIMEOUT,
+    TELEGRAM_GLOBAL_PER_SECOND,
+    TELEGRAM_GROUP_CHAT_PER_MINUTE,
     TELEGRAM_GET_UPDATES_READ_TIMEOUT,
+    TELEGRAM_LOCAL_MODE,
     TELEGRAM_POOL_TIMEOUT,
+    TELEGRAM_PRIVATE_CHAT_PER_SECOND,
+    TELEGRAM_RATE_LIMIT,
     TELEGRAM_READ_TIMEOUT,
+    TELEGRAM_RETRY_AFTER_RETRIES,
+    TELEGRAM_WEBHOOK_REGISTER,
+    TELEGRAM_WEBHOOK_SECRET,
+    TELEGRAM_WEBHOOK_URL,
     TELEGRAM_WRITE_TIMEOUT,
+    TIKTOK_JOB_DEADLINE,
+    TIKTOK_MAX_CONCURRENT_DOWNLOADS,
+    TIKTOK_MAX_IN_FLIGHT,
+    TIKTOK_MAX_JOBS_PER_CHAT,
+    TIKTOK_MAX_JOBS_PER_USER,
+    TIKTOK_MAX_LOAD_PER_CPU,
+    TIKTOK_MAX_WAITING,
+    TIKTOK_MIN_FREE_DISK_MB,
+    TIKTOK_MIN_FREE_MEMORY_MB,
+    TIKTOK_PROGRESS_EDIT_INTERVAL,
+    TIKTOK_STATUS_DELAY,
+    TIKTOK_STATUS_MODE,
+    TIKTOK_WARMUP_DELAY,
+    TRACE_BUFFER_SIZE,
+    TRACE_SLOW_SECONDS,
+    TRACING_ENABLED,
+    WEBHOOK_DRAIN_TIMEOUT,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_MAX_PENDING,
+    WORK_LEASE_SECONDS,
+    WORKER_POLL_INTERVAL,
+    BotProfile,
 )
+from admission import Admission
+from bot_host import BotHost, SharedServices
+from dedupe import DedupeStore, HandledMessage
+from health import HealthState, TrackingRequest
+from http_server import HttpServer, Response
+from job_status import make_job_status
+from job_store import DOWNLOADING, SENDING, JobQueue, StoredJob, open_job_queue
 from link_mirror import (
     collect_message_link_text,
     extract_instagram_urls,
     replace_instagram_hosts_checked,
 )
-from preview_check import mirror_host_chain
-from tiktok_downloader import TikTokDownloader
+from metrics import (
+    CONTENT_TYPE as METRICS_CONTENT_TYPE,
+    QUEUE_DEPTH,
+    REGISTRY,
+    TIKTOK_JOBS_TOTAL,
+    UPLOAD_BYTES_TOTAL,
+    UPLOAD_SECONDS,
+)
+from mirror_stats import MIRROR_STATS
+from preview_check import close_http_client, mirror_host_chain
+from preview_slo import PreviewSLO
+from rate_limit import RetryLater
+from telegram_rate_limit import PriorityRateLimiter
 from tiktok_urls import extract_tiktok_urls
+from tracing import configure as configure_tracing, slow_traces, span, trace
+from update_processor import ChatOrderedUpdateProcessor
+from webhook import WebhookIngress
 
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
@@ -51,6 +130,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Name of the lease that elects the one replica receiving updates.
+INGEST_LEASE = "ingest"
+# Rejection reason for the links of a message past the room admission has left.
+TOO_MANY_LINKS = "too_many_links"
+
+
+def _split_at_room(links: List[str], room: int) -> Tuple[List[str], List[str]]:
+    """(links to admit, links to turn away). At least one is tried, so a full quota reads "busy"."""
+    keep = max(1, room)
+    return links[:keep], links[keep:]
+
 
 def _forum_topic_api_kwargs(message_thread_id: Optional[int]) -> Optional[Dict[str, Any]]:
     """PTB v20 has no message_thread_id on edit/delete; pass it via api_kwargs for forum topics."""
@@ -79,29 +169,142 @@ class SocialLinksBot:
     TikTok: download via yt-dlp and send the MP4 (optional).
     """
 
-    def __init__(self):
-        self.mirror_host = MIRROR_HOST
-        self._mirror_hosts = mirror_host_chain(MIRROR_HOST, MIRROR_FALLBACK_HOSTS)
+    def __init__(
+        self, profile: Optional[BotProfile] = None, shared: Optional[SharedServices] = None
+    ):
+        # One process may host several bots (BotHost); they share ``shared``.
+        self.profile = profile or BOT_PROFILES[0]
+        self.shared = shared or SharedServices(self.profile.tiktok)
+        self.peers: List["SocialLinksBot"] = []
+        self.serve_http = True
+        self.mirror_host = self.profile.mirror_host
+        self._mirror_hosts = mirror_host_chain(self.mirror_host, MIRROR_FALLBACK_HOSTS)
         self._check_preview = CHECK_LINK_PREVIEW
         self._preview_fallback_unchecked = PREVIEW_FALLBACK_UNCHECKED
         self._preview_timeout = PREVIEW_PROBE_TIMEOUT
-        self._allowed_chat_ids = ALLOWED_CHAT_IDS
+        self._allowed_chat_ids = self.profile.allowed_chat_ids
+        self.preview_slo = (
+            PreviewSLO(
+                p95_budget=PREVIEW_SLO_P95_SECONDS,
+                min_success=PREVIEW_SLO_MIN_SUCCESS,
+                window=PREVIEW_SLO_WINDOW,
+                cooldown=PREVIEW_SLO_COOLDOWN,
+            )
+            if CHECK_LINK_PREVIEW and PREVIEW_SLO_P95_SECONDS > 0
+            else None
+        )
+        self.mirror_canary = self.shared.canary(self._mirror_hosts)
         # Telegram re-sends edited_message when link previews attach (same text).
-        self._handled_bodies: dict[tuple[int, int], str] = {}
-        self._handled_bodies_max = 4000
-        self.downloader = TikTokDownloader() if ENABLE_TIKTOK_DOWNLOAD else None
+        self._handled_bodies = DedupeStore(
+            HANDLED_MESSAGES_CAPACITY, HANDLED_MESSAGES_TTL_HOURS * 3600
+        )
+        self.downloader = self.shared.downloader if self.profile.tiktok else None
+        self.admission = Admission(
+            max_in_flight=TIKTOK_MAX_IN_FLIGHT,
+            per_user=TIKTOK_MAX_JOBS_PER_USER,
+            per_chat=TIKTOK_MAX_JOBS_PER_CHAT,
+            max_waiting=TIKTOK_MAX_WAITING,
+            shared=self.shared.in_flight,
+            disk_path=DOWNLOAD_PATH,
+            min_free_disk_mb=TIKTOK_MIN_FREE_DISK_MB,
+            min_free_memory_mb=TIKTOK_MIN_FREE_MEMORY_MB,
+            max_load_per_cpu=TIKTOK_MAX_LOAD_PER_CPU,
+        )
+        self._worker_pool = self.shared.worker_pool if self.downloader else None
+        self.shared.download_slots.register(self.profile.name, self.profile.download_weight)
+        self._downloads_running = 0
+        self.jobs: Optional[JobQueue] = (
+            open_job_queue(JOB_QUEUE_BACKEND, self.profile.job_store_path)
+            if self.profile.job_store_path and self.downloader
+            else None
+        )
+        self.role = BOT_ROLE
+        if self.role != "all" and self.jobs is None:
+            raise ValueError(
+                "BOT_ROLE=ingest/worker needs ENABLE_TIKTOK_DOWNLOAD and a shared JOB_STORE_PATH"
+            )
+        # Owner of job and ingest leases in the shared store.
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(3)}"
+        self._lease_task: Optional[asyncio.Task] = None
+        self._warmup_task: Optional[asyncio.Task] = None
+        self._job_tasks: set = set()
+        self._draining = False
+        self._drain_deadline: Optional[float] = None
+        self._owns_signals = False
+        self._standby = False
+        self._ingress: Optional[WebhookIngress] = None
+        self._http_port = int(os.environ.get("PORT", "8000"))
+        self.http_server: Optional[HttpServer] = None
+        REGISTRY.on_collect(f"queue_depths:{self.profile.name}", self._collect_queue_depths)
+        configure_tracing(
+            enabled=TRACING_ENABLED,
+            slow_threshold=TRACE_SLOW_SECONDS,
+            buffer_size=TRACE_BUFFER_SIZE,
+        )
+        MIRROR_STATS.configure(
+            trust_rate=MIRROR_TRUST_SUCCESS_RATE,
+            trust_min_samples=MIRROR_TRUST_MIN_SAMPLES,
+            recheck_every=MIRROR_TRUST_RECHECK_EVERY,
+        )
         self._build_application()
 
     def _build_application(self) -> None:
-        self.application = (
+        # Own request objects: Bot API metrics, and readiness sees when polling last succeeded.
+        self._poll_request = TrackingRequest(
+            connection_pool_size=1,
+            read_timeout=TELEGRAM_GET_UPDATES_READ_TIMEOUT,
+            connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+            write_timeout=TELEGRAM_WRITE_TIMEOUT,
+            pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        )
+        api_request = TrackingRequest(
+            connection_pool_size=256,
+            connect_timeout=TELEGRAM_CONNECT_TIMEOUT,
+            read_timeout=TELEGRAM_READ_TIMEOUT,
+            write_timeout=TELEGRAM_WRITE_TIMEOUT,
+            pool_timeout=TELEGRAM_POOL_TIMEOUT,
+        )
+        builder = (
             Application.builder()
-            .token(BOT_TOKEN)
-            .connect_timeout(TELEGRAM_CONNECT_TIMEOUT)
-            .read_timeout(TELEGRAM_READ_TIMEOUT)
-            .write_timeout(TELEGRAM_WRITE_TIMEOUT)
-            .pool_timeout(TELEGRAM_POOL_TIMEOUT)
-            .get_updates_read_timeout(TELEGRAM_GET_UPDATES_READ_TIMEOUT)
-            .build()
+            .token(self.profile.token)
+            .request(api_request)
+            .get_updates_request(self._poll_request)
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+        )
+        if TELEGRAM_RATE_LIMIT:
+            builder = builder.rate_limiter(
+                PriorityRateLimiter(
+                    global_per_second=TELEGRAM_GLOBAL_PER_SECOND,
+                    private_per_second=TELEGRAM_PRIVATE_CHAT_PER_SECOND,
+                    group_per_minute=TELEGRAM_GROUP_CHAT_PER_MINUTE,
+                    max_retries=TELEGRAM_RETRY_AFTER_RETRIES,
+                )
+            )
+        # With 1 PTB awaits each update in turn; the processor still times them.
+        builder = builder.concurrent_updates(
+            ChatOrderedUpdateProcessor(
+                MAX_CONCURRENT_UPDATES,
+                max_pending=1 if MAX_CONCURRENT_UPDATES == 1 else None,
+            )
+        )
+        if TELEGRAM_API_BASE_URL:
+            # Self-hosted telegram-bot-api; in local mode send_video passes file:// paths.
+            builder = builder.base_url(TELEGRAM_API_BASE_URL)
+            if TELEGRAM_API_BASE_FILE_URL:
+                builder = builder.base_file_url(TELEGRAM_API_BASE_FILE_URL)
+            builder = builder.local_mode(TELEGRAM_LOCAL_MODE)
+        self.application = builder.build()
+        self.health = HealthState(
+            mode="worker"
+            if self.role == "worker"
+            else "webhook" if TELEGRAM_WEBHOOK_URL else "polling",
+            poll_request=self._poll_request,
+            poll_stale_after=HEALTH_POLL_STALE_AFTER,
+            max_loop_lag=HEALTH_MAX_LOOP_LAG,
+            queues=self._queue_depths,
+            is_running=self._accepting_updates,
         )
         self._register_handlers()
 
@@ -122,19 +325,17 @@ class SocialLinksBot:
     def _chat_is_allowed(self, chat) -> bool:
         if self._allowed_chat_ids is None:
             return True
-        if ALLOW_PRIVATE_CHAT and chat.type == ChatType.PRIVATE:
+        if self.profile.allow_private_chat and chat.type == ChatType.PRIVATE:
             return True
         return chat.id in self._allowed_chat_ids
 
-    def _remember_handled_body(self, chat_id: int, message_id: int, body: str) -> None:
-        if len(self._handled_bodies) >= self._handled_bodies_max:
-            drop = self._handled_bodies_max // 2
-            for key in list(self._handled_bodies.keys())[:drop]:
-                del self._handled_bodies[key]
-        self._handled_bodies[(chat_id, message_id)] = body
+    def _remember_handled_body(
+        self, chat_id: int, message_id: int, body: str, handled: HandledMessage
+    ) -> None:
+        self._handled_bodies.remember((chat_id, message_id), body, handled)
 
     def _already_handled(self, chat_id: int, message_id: int, body: str) -> bool:
-        return self._handled_bodies.get((chat_id, message_id)) == body
+        return self._handled_bodies.seen((chat_id, message_id), body)
 
     async def cmd_chatid(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         """Always works — use this to read a group's id before adding it to ALLOWED_CHAT_IDS."""
@@ -164,13 +365,16 @@ class SocialLinksBot:
         status_message_id: int,
         message_thread_id,
         text: str,
+        parse_mode: Optional[str] = None,
     ) -> None:
         """edit_message_text can fail when two pollers compete or Telegram rejects edits."""
         try:
             await context.bot.edit_message_text(
                 chat_id=chat_id,
                 message_id=status_message_id,
-                text=text[:3900],
+                # Cutting markup could break a tag; HTML callers keep to the limit themselves.
+                text=text if parse_mode else text[:3900],
+                parse_mode=parse_mode,
                 api_kwargs=_forum_topic_api_kwargs(message_thread_id),
             )
         except TelegramError as exc:
@@ -182,7 +386,7 @@ class SocialLinksBot:
         host = html.escape(self.mirror_host)
         tt = (
             " I can also download <b>TikTok</b> videos and send the file here."
-            if ENABLE_TIKTOK_DOWNLOAD
+            if self.downloader
             else ""
         )
         await update.message.reply_text(
@@ -207,12 +411,13 @@ class SocialLinksBot:
             fb = ", ".join(html.escape(h) for h in self._mirror_hosts[1:3])
             if fb:
                 lines.append(f"Fallback hosts: <code>{fb}</code> …")
-        if ENABLE_TIKTOK_DOWNLOAD:
+        if self.downloader:
             lines += [
                 "",
                 "<b>TikTok</b>",
                 "Paste a <code>tiktok.com</code> or <code>vm.tiktok.com</code> link. "
-                "I'll download it with yt-dlp and send the video (max ~50&nbsp;MB). "
+                "I'll download it with yt-dlp and send the video "
+                f"(max ~{MAX_FILE_SIZE_MB}&nbsp;MB). "
                 "Set <code>ENABLE_TIKTOK_DOWNLOAD=false</code> to turn this off.",
             ]
         lines += ["", "<i>Only one polling instance per bot token (local vs Railway).</i>"]
@@ -232,7 +437,20 @@ class SocialLinksBot:
         message = update.message or update.edited_message
         if not message:
             return
-        body = collect_message_link_text(message)
+        with trace(
+            "update",
+            update_id=update.update_id,
+            chat_id=message.chat_id,
+            message_id=message.message_id,
+            edit=update.edited_message is not None,
+        ):
+            await self._handle_message(update, context, message)
+
+    async def _handle_message(
+        self, update: Update, context: ContextTypes.DEFAULT_TYPE, message
+    ) -> None:
+        with span("collect_links"):
+            body = collect_message_link_text(message)
         if not body:
             return
 
@@ -252,29 +470,59 @@ class SocialLinksBot:
                 )
             return
 
-        mirror_text, mirrored = await asyncio.to_thread(
-            replace_instagram_hosts_checked,
-            body,
-            self._mirror_hosts,
-            verify_preview=self._check_preview,
-            preview_timeout=self._preview_timeout,
-            fallback_unchecked=self._preview_fallback_unchecked,
-        )
+        # On an edit, links handled before are neither probed nor downloaded again.
+        handled = (
+            is_edit and self._handled_bodies.record((message.chat_id, message.message_id))
+        ) or HandledMessage()
+        instagram_urls = extract_instagram_urls(body)
+        if self.mirror_canary:
+            for url in instagram_urls:
+                self.mirror_canary.observe(url)
+        verify = self._check_preview
+        if verify and self.preview_slo and instagram_urls:
+            verify = self.preview_slo.should_verify()
+        picks: List[bool] = []
+        with span("instagram.mirror", known=len(handled.instagram), verify=verify):
+            started = time.perf_counter()
+            mirror_text, mirrored = await asyncio.to_thread(
+                replace_instagram_hosts_checked,
+                body,
+                self._mirror_hosts,
+                verify_preview=verify,
+                preview_timeout=self._preview_timeout,
+                fallback_unchecked=self._preview_fallback_unchecked,
+                known=handled.instagram,
+                picks=picks,
+                rank_unverified=self._check_preview,
+            )
+        if self.preview_slo and picks:
+            self.preview_slo.observe(time.perf_counter() - started, all(picks))
         thread_id = getattr(message, "message_thread_id", None)
         if mirrored:
             if LOG_LINK_ACTIVITY:
                 logger.info(
-                    "Handled Instagram mirror chat_id=%s topic=%s",
+                    "Handled Instagram mirror chat_id=%s topic=%s edit=%s",
                     message.chat_id,
                     thread_id,
+                    handled.reply_id is not None,
                 )
             try:
-                await message.reply_text(
-                    mirror_text,
-                    disable_web_page_preview=False,
-                    message_thread_id=thread_id,
-                )
-                self._remember_handled_body(message.chat_id, message.message_id, body)
+                if handled.reply_id is not None:
+                    with span("instagram.edit_reply"):
+                        await context.bot.edit_message_text(
+                            chat_id=message.chat_id,
+                            message_id=handled.reply_id,
+                            text=mirror_text,
+                            disable_web_page_preview=False,
+                        )
+                else:
+                    with span("instagram.reply"):
+                        reply = await message.reply_text(
+                            mirror_text,
+                            disable_web_page_preview=False,
+                            message_thread_id=thread_id,
+                        )
+                    handled.reply_id = reply.message_id
             except TelegramError as exc:
                 logger.error(
                     "Instagram mirror reply failed chat_id=%s msg_id=%s: %s",
@@ -282,118 +530,291 @@ class SocialLinksBot:
                     message.message_id,
                     exc,
                 )
-        elif extract_instagram_urls(body):
+        elif instagram_urls:
             logger.warning(
                 "Instagram link(s) in chat_id=%s: could not mirror",
                 message.chat_id,
             )
 
+        links: List[str] = []
         if self.downloader:
-            for link in extract_tiktok_urls(body):
-                if self.downloader.is_valid_tiktok_url(link):
-                    if LOG_LINK_ACTIVITY:
-                        logger.info(
-                            "TikTok download start chat_id=%s host=%s…",
-                            message.chat_id,
-                            link[:48],
-                        )
-                    await self._process_tiktok(context, message, link)
+            links = [
+                link
+                for link in extract_tiktok_urls(body)
+                if self.downloader.is_valid_tiktok_url(link) and link not in handled.tiktok
+            ]
+            handled.tiktok.update(links)
+        if handled.instagram or handled.reply_id is not None or handled.tiktok:
+            self._remember_handled_body(message.chat_id, message.message_id, body, handled)
+
+        if not links:
+            return
+        user_id = message.from_user.id if message.from_user else None
+        if self.role == "ingest":
+            await self._queue_tiktok_job(message, links, handled)
+            return
+        links, extra = _split_at_room(links, self.admission.room(user_id, message.chat_id))
+        ticket, reason = self.admission.try_admit(user_id, message.chat_id, len(links))
+        if ticket is None:
+            await self._reject_tiktok_job(message, links + extra, handled, reason)
+            return
+        job_id = None
+        if self.jobs is not None:
+            job_id = self.jobs.add(
+                chat_id=message.chat_id,
+                thread_id=thread_id,
+                message_id=message.message_id,
+                user_id=user_id,
+                links=links,
+            )
+            if job_id is None:
+                # Already queued or running (a redelivered update).
+                ticket.release()
+                return
+            if self._draining:
+                # Shutting down: the next start picks the queued job up.
+                ticket.release()
+                return
+        if extra:
+            await self._reject_tiktok_job(message, extra, handled, TOO_MANY_LINKS)
+        with ticket:
+            if LOG_LINK_ACTIVITY:
+                for link in links:
+                    logger.info(
+                        "TikTok download start chat_id=%s host=%s…",
+                        message.chat_id,
+                        link[:48],
+                    )
+            await self._run_tiktok_job(context, message, links, job_id)
+
+    async def _reject_tiktok_job(
+        self, message, links: List[str], handled: HandledMessage, reason: str
+    ) -> None:
+        # Not started, so sending (or editing in) the links again later is not a duplicate.
+        handled.tiktok.difference_update(links)
+        logger.warning(
+            "TikTok jobs rejected chat_id=%s user_id=%s links=%s reason=%s",
+            message.chat_id,
+            message.from_user.id if message.from_user else None,
+            len(links),
+            reason,
+        )
+        try:
+            await message.reply_text(
+                ERROR_MESSAGES["too_many_links" if reason == TOO_MANY_LINKS else "busy"],
+                message_thread_id=getattr(message, "message_thread_id", None),
+            )
+        except TelegramError as exc:
+            logger.warning("Busy reply failed chat_id=%s: %s", message.chat_id, exc)
+
+    async def _queue_tiktok_job(self, message, links: List[str], handled: HandledMessage) -> None:
+        """Ingest role: quota-check against the shared queue and leave the job to a worker."""
+        user_id = message.from_user.id if message.from_user else None
+        user_jobs, chat_jobs, queued = await asyncio.to_thread(
+            self.jobs.load, user_id, message.chat_id
+        )
+        links, extra = _split_at_room(
+            links, self.admission.queued_room(user_jobs, chat_jobs, queued, user_id=user_id)
+        )
+        reason = self.admission.check_queued(
+            user_jobs, chat_jobs, queued, len(links), user_id=user_id
+        )
+        if reason is not None:
+            await self._reject_tiktok_job(message, links + extra, handled, reason)
+            return
+        if extra:
+            await self._reject_tiktok_job(message, extra, handled, TOO_MANY_LINKS)
+        job_id = await asyncio.to_thread(
+            functools.partial(
+                self.jobs.add,
+                chat_id=message.chat_id,
+                thread_id=getattr(message, "message_thread_id", None),
+                message_id=message.message_id,
+                user_id=user_id,
+                links=links,
+            )
+        )
+        if LOG_LINK_ACTIVITY:
+            logger.info(
+                "TikTok job queued chat_id=%s links=%s job=%s",
+                message.chat_id,
+                len(links),
+                job_id if job_id is not None else "duplicate",
+            )
+
+    async def _run_tiktok_job(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        message,
+        links: List[str],
+        job_id: Optional[int] = None,
+        claimed: bool = False,
+    ) -> None:
+        """
+        Run one message's TikTok links; its stored row goes away unless a drain
+        cut it short, in which case it goes back to the queue. ``claimed``: the
+        row was already taken with JobQueue.claim_next.
+        """
+        task = asyncio.current_task()
+        self._job_tasks.add(task)
+        interrupted = False
+        try:
+            if job_id is not None and not claimed:
+                self.jobs.claim(job_id, self.node_id, WORK_LEASE_SECONDS)
+            if len(links) == 1:
+                with span("tiktok.job", link=links[0]):
+                    await self._process_tiktok(context, message, links[0], job_id=job_id)
+            else:
+                with span("tiktok.batch", links=len(links)):
+                    await self._process_tiktok_batch(context, message, links, job_id=job_id)
+        except asyncio.CancelledError:
+            interrupted = True
+            raise
+        finally:
+            self._job_tasks.discard(task)
+            if job_id is not None:
+                if interrupted:
+                    self.jobs.release(job_id)
+                else:
+                    self.jobs.finish(job_id)
+
+    def _job_stage(self, job_id: Optional[int], stage: str, status) -> None:
+        if job_id is not None and self.jobs is not None:
+            self.jobs.set_stage(job_id, stage, status.status_message_id)
+
+    def _job_status(self, context: ContextTypes.DEFAULT_TYPE, message, link: str):
+        chat_id = message.chat_id
+        thread_id = getattr(message, "message_thread_id", None)
+
+        async def edit(status_message_id: int, text: str) -> None:
+            await self._safe_edit_message(
+                context, chat_id, status_message_id, thread_id, text, parse_mode="HTML"
+            )
+
+        async def delete(status_message_id: int) -> None:
+            try:
+                await context.bot.delete_message(
+                    chat_id=chat_id,
+                    message_id=status_message_id,
+                    api_kwargs=_forum_topic_api_kwargs(thread_id),
+                )
+            except Exception:
+                pass
+
+        async def send_action() -> None:
+            await context.bot.send_chat_action(
+                chat_id=chat_id,
+                action=ChatAction.UPLOAD_VIDEO,
+                message_thread_id=thread_id,
+            )
+
+        return make_job_status(
+            TIKTOK_STATUS_MODE,
+            message,
+            link,
+            edit=edit,
+            delete=delete,
+            send_action=send_action,
+            edit_interval=TIKTOK_PROGRESS_EDIT_INTERVAL,
+            delay=TIKTOK_STATUS_DELAY,
+        )
+
+    async def _download_tiktok(self, link: str, progress_hook):
+        """
+        Download with 403/429 backoff. The wait happens here, between attempts,
+        without a download slot (and outside the worker deadline); a backoff
+        that would reach TIKTOK_JOB_DEADLINE in total gives up instead.
+        """
+        attempt = 0
+        waited = 0.0
+        while True:
+            result = await self._download_attempt(link, progress_hook, attempt)
+            if not isinstance(result, RetryLater):
+                return result
+            if waited + result.delay >= TIKTOK_JOB_DEADLINE:
+                logger.warning(
+                    "TikTok still throttled after %.0fs of backoff; giving up on %s…",
+                    waited,
+                    link[:48],
+                )
+                TIKTOK_JOBS_TOTAL.inc(result="blocked")
+                return False, result.message, []
+            if progress_hook:
+                progress_hook({"status": "retrying", "retry_in": result.delay})
+            await asyncio.sleep(result.delay)
+            waited += result.delay
+            attempt += 1
+
+    async def _download_attempt(self, link: str, progress_hook, attempt: int):
+        """Run download_video on a thread, or in a killable worker process."""
+        self.shared.in_flight.waiting += 1
+        try:
+            with span("tiktok.slot_wait"):
+                await self.shared.download_slots.acquire(self.profile.name)
+        finally:
+            self.shared.in_flight.waiting -= 1
+        self._downloads_running += 1
+        try:
+            with span("tiktok.download", link=link, process=bool(self._worker_pool)):
+                if self._worker_pool:
+                    return await self._worker_pool.run(link, progress_hook, attempt)
+                return await asyncio.to_thread(
+                    self.downloader.download_video, link, progress_hook, attempt
+                )
+        finally:
+            self._downloads_running -= 1
+            self.shared.download_slots.release(self.profile.name)
 
     async def _process_tiktok(
         self,
         context: ContextTypes.DEFAULT_TYPE,
         message,
         link: str,
+        *,
+        job_id: Optional[int] = None,
     ) -> None:
         chat_id = message.chat_id
         thread_id = getattr(message, "message_thread_id", None)
 
-        status = await message.reply_text(
-            text=f"⏳ Downloading TikTok…\n<code>{html.escape(link)}</code>",
-            parse_mode="HTML",
-        )
+        status = self._job_status(context, message, link)
+        await status.start()
+        self._job_stage(job_id, DOWNLOADING, status)
+
+        loop = asyncio.get_running_loop()
+        last_progress = 0.0
+
+        def on_progress(d: Dict[str, Any]) -> None:
+            # yt-dlp calls this per chunk on the download thread; hop to the loop sparingly.
+            nonlocal last_progress
+            now = time.monotonic()
+            if d.get("status") == "downloading" and now - last_progress < 0.5:
+                return
+            last_progress = now
+            loop.call_soon_threadsafe(status.progress, d)
 
         try:
-            ok, detail, media_files = await asyncio.to_thread(
-                self.downloader.download_video, link
-            )
+            ok, detail, media_files = await self._download_tiktok(link, on_progress)
         except Exception as e:
             logger.exception("TikTok download crashed: %s", e)
-            await self._safe_edit_message(
-                context,
-                chat_id,
-                status.message_id,
-                thread_id,
-                "❌ TikTok download failed unexpectedly.",
-            )
+            await status.fail("❌ TikTok download failed unexpectedly.")
             return
 
         if not ok:
-            await self._safe_edit_message(
-                context,
-                chat_id,
-                status.message_id,
-                thread_id,
-                str(detail),
-            )
+            await status.fail(str(detail))
             return
 
         if not media_files:
-            await self._safe_edit_message(
-                context,
-                chat_id,
-                status.message_id,
-                thread_id,
-                "❌ Download finished but no file was produced.",
-            )
+            await status.fail("❌ Download finished but no file was produced.")
             return
 
-        await self._safe_edit_message(
-            context,
-            chat_id,
-            status.message_id,
-            thread_id,
-            "✅ Sending video…",
-        )
+        await status.stage("✅ Sending video…")
+        self._job_stage(job_id, SENDING, status)
 
         try:
+            # Pacing between uploads is left to the rate limiter.
             for media in media_files:
-                path = media["file_path"]
-                raw_cap = media.get("title") or ""
-                cap = html.escape(raw_cap.strip())[:1020] if raw_cap.strip() else ""
-                vid_kw = dict(
-                    chat_id=chat_id,
-                    video=path,
-                    message_thread_id=thread_id,
-                    supports_streaming=True,
-                )
-                w, h = media.get("width"), media.get("height")
-                if w and h:
-                    vid_kw["width"] = int(w)
-                    vid_kw["height"] = int(h)
-                dur = media.get("duration")
-                if dur:
-                    vid_kw["duration"] = int(dur)
-                if cap:
-                    vid_kw["caption"] = cap[:1024]
-                    vid_kw["parse_mode"] = "HTML"
-                try:
-                    await context.bot.send_video(**vid_kw)
-                except TelegramError as send_err:
-                    logger.warning(
-                        "send_video failed (%s); retrying as document", send_err
-                    )
-                    doc_kw = dict(
-                        chat_id=chat_id,
-                        document=path,
-                        filename=os.path.basename(path),
-                        message_thread_id=thread_id,
-                    )
-                    if cap:
-                        doc_kw["caption"] = cap[:1024]
-                        doc_kw["parse_mode"] = "HTML"
-                    await context.bot.send_document(**doc_kw)
-                await asyncio.sleep(0.4)
+                with span("tiktok.upload", bytes=media.get("file_size")):
+                    await self._send_tiktok_media(context, chat_id, thread_id, media)
         except Exception as e:
             logger.exception("Sending TikTok video failed: %s", e)
             await context.bot.send_message(
@@ -403,14 +824,172 @@ class SocialLinksBot:
             )
         finally:
             await asyncio.to_thread(self.downloader.cleanup_files, media_files)
+            await status.finish()
+
+    @staticmethod
+    def _tiktok_caption(media: Dict[str, Any]) -> str:
+        raw_cap = (media.get("title") or "").strip()
+        return html.escape(raw_cap)[:1020] if raw_cap else ""
+
+    async def _send_tiktok_media(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        thread_id,
+        media: Dict[str, Any],
+    ) -> None:
+        path = media["file_path"]
+        cap = self._tiktok_caption(media)
+        vid_kw = dict(
+            chat_id=chat_id,
+            video=path,
+            message_thread_id=thread_id,
+            supports_streaming=True,
+        )
+        w, h = media.get("width"), media.get("height")
+        if w and h:
+            vid_kw["width"] = int(w)
+            vid_kw["height"] = int(h)
+        dur = media.get("duration")
+        if dur:
+            vid_kw["duration"] = int(dur)
+        if cap:
+            vid_kw["caption"] = cap[:1024]
+            vid_kw["parse_mode"] = "HTML"
+        size = media.get("file_size") or 0
+        try:
+            with UPLOAD_SECONDS.time(kind="video"):
+                await context.bot.send_video(**vid_kw)
+            UPLOAD_BYTES_TOTAL.inc(size, kind="video")
+        except TelegramError as send_err:
+            logger.warning(
+                "send_video failed (%s); retrying as document", send_err
+            )
+            doc_kw = dict(
+                chat_id=chat_id,
+                document=path,
+                filename=os.path.basename(path),
+                message_thread_id=thread_id,
+            )
+            if cap:
+                doc_kw["caption"] = cap[:1024]
+                doc_kw["parse_mode"] = "HTML"
+            with UPLOAD_SECONDS.time(kind="document"):
+                await context.bot.send_document(**doc_kw)
+            UPLOAD_BYTES_TOTAL.inc(size, kind="document")
+
+    async def _send_tiktok_album(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        chat_id: int,
+        thread_id,
+        media_files: List[Dict[str, Any]],
+    ) -> None:
+        """send_media_group in chunks of 10; a rejected album falls back to one-by-one."""
+        for i in range(0, len(media_files), 10):
+            chunk = media_files[i : i + 10]
+            if len(chunk) == 1:
+                await self._send_tiktok_media(context, chat_id, thread_id, chunk[0])
+                continue
+            items = []
+            for media in chunk:
+                cap = self._tiktok_caption(media)
+                items.append(
+                    InputMediaVideo(
+                        media=media["file_path"],
+                        caption=cap or None,
+                        parse_mode="HTML" if cap else None,
+                        width=int(media["width"]) if media.get("width") else None,
+                        height=int(media["height"]) if media.get("height") else None,
+                        duration=int(media["duration"]) if media.get("duration") else None,
+                        supports_streaming=True,
+                    )
+                )
             try:
-                await context.bot.delete_message(
+                with UPLOAD_SECONDS.time(kind="album"):
+                    await context.bot.send_media_group(
+                        chat_id=chat_id, media=items, message_thread_id=thread_id
+                    )
+                UPLOAD_BYTES_TOTAL.inc(
+                    sum(m.get("file_size") or 0 for m in chunk), kind="album"
+                )
+            except TelegramError as exc:
+                logger.warning("send_media_group failed (%s); sending one by one", exc)
+                for media in chunk:
+                    try:
+                        await self._send_tiktok_media(context, chat_id, thread_id, media)
+                    except TelegramError as item_err:
+                        logger.warning("Sending TikTok album item failed: %s", item_err)
+                        await context.bot.send_message(
+                            chat_id=chat_id,
+                            text=f"❌ Could not upload the video: {item_err}",
+                            message_thread_id=thread_id,
+                        )
+
+    async def _process_tiktok_batch(
+        self,
+        context: ContextTypes.DEFAULT_TYPE,
+        message,
+        links: List[str],
+        *,
+        job_id: Optional[int] = None,
+    ) -> None:
+        """Download every link of one message concurrently; send them as one album."""
+        chat_id = message.chat_id
+        thread_id = getattr(message, "message_thread_id", None)
+
+        status = self._job_status(context, message, "\n".join(links))
+        await status.start()
+        self._job_stage(job_id, DOWNLOADING, status)
+        ready_count = 0
+
+        async def fetch(link: str):
+            nonlocal ready_count
+            try:
+                return await self._download_tiktok(link, None)
+            except Exception as e:
+                logger.exception("TikTok download crashed: %s", e)
+                return False, "❌ TikTok download failed unexpectedly.", []
+            finally:
+                ready_count += 1
+                status.progress({"status": "batch", "done": ready_count, "total": len(links)})
+
+        results = await asyncio.gather(*(fetch(link) for link in links))
+
+        ready: List[Dict[str, Any]] = []
+        failures: List[str] = []
+        for link, (ok, detail, media_files) in zip(links, results):
+            if ok and media_files:
+                ready.extend(media_files)
+            else:
+                reason = str(detail) if not ok else "❌ Download finished but no file was produced."
+                failures.append(f"{reason}\n{link}")
+
+        if not ready:
+            await status.fail("\n\n".join(failures)[:3900])
+            return
+
+        await status.stage("✅ Sending videos…")
+        self._job_stage(job_id, SENDING, status)
+        try:
+            with span("tiktok.upload", items=len(ready)):
+                await self._send_tiktok_album(context, chat_id, thread_id, ready)
+            if failures:
+                await context.bot.send_message(
                     chat_id=chat_id,
-                    message_id=status.message_id,
-                    api_kwargs=_forum_topic_api_kwargs(thread_id),
+                    text="\n\n".join(failures)[:3900],
+                    message_thread_id=thread_id,
                 )
-            except Exception:
-                pass
+        except Exception as e:
+            logger.exception("Sending TikTok album failed: %s", e)
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=f"❌ Could not upload the videos: {e}",
+                message_thread_id=thread_id,
+            )
+        finally:
+            await asyncio.to_thread(self.downloader.cleanup_files, ready)
+            await status.finish()
 
     async def error_handler(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         err = context.error
@@ -428,60 +1007,509 @@ class SocialLinksBot:
             exc_info=err,
         )
 
-    def start_web_server(self) -> bool:
-        """Health endpoint for Railway and similar hosts."""
-        try:
-            from flask import Flask, jsonify
-
-            app = Flask(__name__)
-
-            @app.route("/health")
-            def health_check():
-                return jsonify(
-                    {
-                        "status": "healthy",
-                        "service": "social-links-bot",
-                        "mirror": self.mirror_host,
-                        "tiktok": bool(self.downloader),
-                        "timestamp": time.time(),
-                    }
+    def _accepting_updates(self) -> bool:
+        return self.application.running and not (self._ingress and self._ingress.draining)
+
+    def _queue_depths(self) -> Dict[str, Any]:
+        depths: Dict[str, Any] = {
+            "update_queue": self.application.update_queue.qsize(),
+            "downloads_running": self._downloads_running,
+            "downloads_waiting": self.shared.download_slots.waiting(self.profile.name),
+        }
+        processor = self.application.update_processor
+        if isinstance(processor, ChatOrderedUpdateProcessor):
+            depths["updates"] = processor.snapshot()
+        if self._worker_pool:
+            depths["worker_processes_busy"] = self._worker_pool.busy
+        if self.peers or not self.serve_http:
+            depths["download_slots"] = self.shared.download_slots.snapshot()
+        depths["handled_messages"] = self._handled_bodies.snapshot()
+        depths["admission"] = self.admission.snapshot()
+        if self.jobs is not None:
+            depths["jobs_stored"] = len(self.jobs)
+            depths["role"] = self.role
+        limiter = self.application.bot.rate_limiter
+        if isinstance(limiter, PriorityRateLimiter):
+            depths["outbound"] = limiter.snapshot()
+        if self._ingress:
+            depths["webhook"] = {
+                "accepted": self._ingress.accepted,
+                "rejected_busy": self._ingress.rejected_busy,
+                "rejected_auth": self._ingress.rejected_auth,
+                "draining": self._ingress.draining,
+            }
+        return depths
+
+    def _collect_queue_depths(self) -> None:
+        depths = self._queue_depths()
+        # Several bots in one process: "<bot>/<queue>".
+        prefix = f"{self.profile.name}/" if len(BOT_PROFILES) > 1 else ""
+
+        def gauge(value: float, queue: str) -> None:
+            QUEUE_DEPTH.set(value, queue=prefix + queue)
+
+        gauge(depths["update_queue"], "update_queue")
+        gauge(depths["downloads_running"], "downloads_running")
+        gauge(depths["downloads_waiting"], "downloads_waiting")
+        updates = depths.get("updates")
+        if updates:
+            gauge(updates["running"], "updates_running")
+            gauge(updates["waiting"], "updates_waiting")
+        # Shared by every bot of the process.
+        QUEUE_DEPTH.set(depths["admission"]["in_flight"], queue="media_jobs_in_flight")
+        if "worker_processes_busy" in depths:
+            QUEUE_DEPTH.set(depths["worker_processes_busy"], queue="worker_processes_busy")
+
+    def _health_report(self) -> Dict[str, Any]:
+        """This bot's report; when it serves for peers (BotHost), ready/live need every bot."""
+        report = self.health.report()
+        if self._standby:
+            report["reasons"].append("standing by for the ingest lease")
+        if not self.peers:
+            return report
+        bots = {self.profile.name: report}
+        bots.update((peer.profile.name, peer.health.report()) for peer in self.peers)
+        report["live"] = all(r["live"] for r in bots.values())
+        report["ready"] = all(r["ready"] for r in bots.values())
+        report["reasons"] = [
+            f"{name}: {reason}" for name, r in bots.items() for reason in r["reasons"]
+        ]
+        report["bots"] = {
+            name: {"ready": r["ready"], "last_get_updates_ago_s": r["last_get_updates_ago_s"]}
+            for name, r in bots.items()
+        }
+        return report
+
+    def _build_http_server(self) -> HttpServer:
+        """/health, /ready, /metrics and, in webhook mode, the update endpoint."""
+        server = HttpServer(port=self._http_port)
+
+        async def health(_request) -> Response:
+            report = self._health_report()
+            payload = {
+                "status": "healthy" if report["live"] else "lagging",
+                "service": "social-links-bot",
+                "mirror": self.mirror_host,
+                "tiktok": bool(self.downloader),
+                "timestamp": time.time(),
+                "mirror_stats": MIRROR_STATS.snapshot(),
+                "mirror_canary": self.mirror_canary.snapshot() if self.mirror_canary else None,
+                "preview_slo": self.preview_slo.snapshot() if self.preview_slo else None,
+                **report,
+            }
+            return Response.json(payload, 200 if report["live"] else 503)
+
+        async def ready(_request) -> Response:
+            report = self._health_report()
+            return Response.json(report, 200 if report["ready"] else 503)
+
+        async def root(_request) -> Response:
+            return Response.json(
+                {
+                    "status": "running",
+                    "health": "/health",
+                    "ready": "/ready",
+                    "mirror": self.mirror_host,
+                    "tiktok": bool(self.downloader),
+                }
+            )
+
+        async def metrics(_request) -> Response:
+            return Response(body=REGISTRY.render().encode(), content_type=METRICS_CONTENT_TYPE)
+
+        async def traces(request) -> Response:
+            # Off unless ADMIN_TOKEN is set; then it must come as a Bearer token.
+            expected = f"Bearer {ADMIN_TOKEN}" if ADMIN_TOKEN else None
+            if not expected or not hmac.compare_digest(
+                (request.header("authorization") or "").encode(), expected.encode()
+            ):
+                return Response.text("not found", 404)
+            return Response.json(
+                {"threshold_s": TRACE_SLOW_SECONDS, "traces": slow_traces()}
+            )
+
+        server.route("GET", "/health", health)
+        server.route("GET", "/ready", ready)
+        server.route("GET", "/metrics", metrics)
+        server.route("GET", "/debug/traces", traces)
+        server.route("GET", "/", root)
+        if self._ingress:
+            server.route("POST", urlsplit(TELEGRAM_WEBHOOK_URL).path or "/", self._ingress.handle)
+        return server
+
+    def _on_stop_signal(self) -> None:
+        self._begin_drain()
+        # Same as PTB's own handler: run_polling then stops the updater and the application.
+        raise SystemExit
+
+    def _begin_drain(self) -> None:
+        """Stop starting TikTok jobs and give running ones JOB_DRAIN_TIMEOUT to finish."""
+        if self._draining:
+            return
+        self._draining = True
+        self._drain_deadline = time.monotonic() + JOB_DRAIN_TIMEOUT
+        logger.info(
+            "Draining: %s TikTok job(s) get %.0fs to finish",
+            len(self._job_tasks),
+            JOB_DRAIN_TIMEOUT,
+        )
+        # Application.stop waits for every handler; interrupted jobs stay stored and resume.
+        asyncio.get_running_loop().call_later(JOB_DRAIN_TIMEOUT, self._interrupt_jobs)
+
+    def _interrupt_jobs(self) -> None:
+        tasks = [t for t in self._job_tasks if not t.done()]
+        if tasks:
+            logger.warning("Drain window over; interrupting %s TikTok job(s)", len(tasks))
+        for task in tasks:
+            task.cancel()
+
+    async def _drain_jobs(self) -> None:
+        tasks = [t for t in self._job_tasks if not t.done()]
+        if not tasks:
+            return
+        remaining = max(0.0, (self._drain_deadline or time.monotonic()) - time.monotonic())
+        _, pending = await asyncio.wait(tasks, timeout=remaining)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def _stored_job_message(self, job: StoredJob) -> Message:
+        """Stand-in for the user's message so replies and status edits work as before."""
+        message = Message(
+            message_id=job.message_id,
+            date=datetime.fromtimestamp(job.created, tz=timezone.utc),
+            chat=Chat(
+                id=job.chat_id,
+                type=ChatType.PRIVATE if job.chat_id > 0 else ChatType.SUPERGROUP,
+            ),
+            message_thread_id=job.thread_id,
+            # Without it PTB's reply_* leave the thread out and answer in General.
+            is_topic_message=job.thread_id is not None,
+        )
+        message.set_bot(self.application.bot)
+        return message
+
+    async def _abandon_job(self, context: CallbackContext, job: StoredJob) -> None:
+        text = ERROR_MESSAGES["interrupted"] + "\n" + "\n".join(job.links)
+        if job.status_message_id is not None:
+            await self._safe_edit_message(
+                context, job.chat_id, job.status_message_id, job.thread_id, text
+            )
+        elif job.stage != SENDING:
+            try:
+                await context.bot.send_message(
+                    chat_id=job.chat_id,
+                    text=text[:3900],
+                    message_thread_id=job.thread_id,
+                    reply_to_message_id=job.message_id,
+                    allow_sending_without_reply=True,
                 )
+            except TelegramError as exc:
+                logger.warning("Could not report interrupted job %s: %s", job.id, exc)
+        self.jobs.finish(job.id)
+
+    async def _delete_status_message(self, context: CallbackContext, job: StoredJob) -> None:
+        """A restarted job posts a fresh status message; the stale one would stay stuck."""
+        if job.status_message_id is None:
+            return
+        try:
+            await context.bot.delete_message(chat_id=job.chat_id, message_id=job.status_message_id)
+        except TelegramError:
+            pass
 
-            @app.route("/")
-            def root():
-                return jsonify(
-                    {
-                        "status": "running",
-                        "health": "/health",
-                        "mirror": self.mirror_host,
-                        "tiktok": bool(self.downloader),
-                    }
+    async def _resume_job(
+        self, context: CallbackContext, job: StoredJob, ticket, claimed: bool = False
+    ) -> None:
+        with ticket:
+            try:
+                await self._run_tiktok_job(
+                    context, self._stored_job_message(job), job.links, job.id, claimed=claimed
                 )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Stored TikTok job %s failed", job.id)
+
+    async def _resume_jobs(self) -> None:
+        """Restart jobs a previous run left unfinished; clean up those not worth resuming."""
+        context = CallbackContext(self.application)
+        for job in self.jobs.unfinished():
+            too_old = time.time() - job.created > JOB_RESUME_MAX_AGE
+            if job.stage == SENDING or too_old or job.attempts >= JOB_RESUME_MAX_ATTEMPTS:
+                # SENDING: part of it may have arrived already; don't send it twice.
+                logger.info("Abandoning interrupted TikTok job %s (stage=%s)", job.id, job.stage)
+                await self._abandon_job(context, job)
+                continue
+            ticket, reason = self.admission.try_admit(job.user_id, job.chat_id, len(job.links))
+            if ticket is None:
+                logger.info("Abandoning interrupted TikTok job %s (%s)", job.id, reason)
+                await self._abandon_job(context, job)
+                continue
+            logger.info(
+                "Resuming TikTok job %s chat_id=%s stage=%s", job.id, job.chat_id, job.stage
+            )
+            await self._delete_status_message(context, job)
+            task = asyncio.get_running_loop().create_task(self._resume_job(context, job, ticket))
+            self._job_tasks.add(task)
 
-            def run_flask() -> None:
-                port = int(os.environ.get("PORT", "8000"))
-                app.run(host="0.0.0.0", port=port, debug=False, use_reloader=False)
+    async def _warm_up_downloads(self) -> None:
+        """Load yt-dlp in a thread once polling is up, ahead of the first TikTok job."""
+        await asyncio.sleep(TIKTOK_WARMUP_DELAY)
+        started = time.monotonic()
+        try:
+            if await asyncio.to_thread(self.downloader.warm_up):
+                logger.info("yt-dlp warmed up in %.2fs", time.monotonic() - started)
+        except Exception:
+            logger.exception("yt-dlp warm-up failed; it loads with the first TikTok job")
+
+    async def _hold_leases(self) -> None:
+        """Renew this node's job leases and, when ingesting, the ingest lease."""
+        interval = min(WORK_LEASE_SECONDS, INGEST_LEASE_SECONDS) / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.jobs.renew, self.node_id, WORK_LEASE_SECONDS)
+                if self.role == "ingest" and not await asyncio.to_thread(
+                    self.jobs.acquire_lease, INGEST_LEASE, self.node_id, INGEST_LEASE_SECONDS
+                ):
+                    # Another replica took over; two pollers would fight with 409 Conflict.
+                    logger.error("Lost the ingest lease; stopping")
+                    os.kill(os.getpid(), signal.SIGTERM)
+                    return
+            except Exception:
+                logger.exception("Lease renewal failed")
+
+    async def _wait_for_ingest_lease(self) -> None:
+        """
+        Wait until this replica is the one that receives updates. A standby
+        serves /health meanwhile, so platform health checks keep it up; /ready
+        answers 503 until it takes over.
+        """
+        try:
+            while not await asyncio.to_thread(
+                self.jobs.acquire_lease, INGEST_LEASE, self.node_id, INGEST_LEASE_SECONDS
+            ):
+                if not self._standby:
+                    logger.info("Standing by: another replica holds the ingest lease")
+                    self._standby = True
+                    if self.serve_http:
+                        self.http_server = self._build_http_server()
+                        try:
+                            await self.http_server.start()
+                        except OSError as e:
+                            logger.error(
+                                "Failed to start HTTP server on port %s: %s", self._http_port, e
+                            )
+                await asyncio.sleep(INGEST_LEASE_SECONDS / 3)
+        finally:
+            self._standby = False
+            if self.http_server:
+                # post_init serves the port again once this replica runs.
+                await self.http_server.close()
+                self.http_server = None
+        logger.info("Holding the ingest lease as %s", self.node_id)
 
-            threading.Thread(target=run_flask, daemon=True).start()
-            logger.info("Health server on port %s", os.environ.get("PORT", "8000"))
+    async def _start_claimed_job(
+        self, context: CallbackContext, job: StoredJob, running: set
+    ) -> bool:
+        """Start or clean up a job claimed from the queue; False when this worker is too busy."""
+        if job.attempts > 1 and (
+            job.stage == SENDING
+            or time.time() - job.created > JOB_RESUME_MAX_AGE
+            or job.attempts > JOB_RESUME_MAX_ATTEMPTS
+        ):
+            logger.info("Abandoning interrupted TikTok job %s (stage=%s)", job.id, job.stage)
+            await self._abandon_job(context, job)
             return True
-        except ImportError:
-            logger.warning("Flask not installed; skipping /health server")
-            return False
-        except Exception as e:
-            logger.error("Failed to start health server: %s", e)
+        ticket, reason = self.admission.try_admit(job.user_id, job.chat_id, len(job.links))
+        if ticket is None:
+            logger.info("Worker busy (%s); TikTok job %s goes back to the queue", reason, job.id)
+            await asyncio.to_thread(self.jobs.release, job.id, False)
             return False
+        if job.attempts > 1:
+            await self._delete_status_message(context, job)
+        task = asyncio.get_running_loop().create_task(
+            self._resume_job(context, job, ticket, claimed=True)
+        )
+        running.add(task)
+        self._job_tasks.add(task)
+        return True
+
+    async def _run_worker(self, stop: Optional[asyncio.Event] = None) -> None:
+        """
+        Worker role: no updates; claim TikTok jobs from the shared store, up to
+        TIKTOK_MAX_CONCURRENT_DOWNLOADS at a time, until SIGINT/SIGTERM (or
+        ``stop``), then drain like the other roles.
+        """
+        app = self.application
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        await app.initialize()
+        try:
+            await app.post_init(app)
+            await app.start()
+            logger.info("Worker %s waiting for TikTok jobs", self.node_id)
+            context = CallbackContext(app)
+            stopping = loop.create_task(stop.wait())
+            running: set = set()
+            while not stop.is_set():
+                running = {t for t in running if not t.done()}
+                if len(running) >= TIKTOK_MAX_CONCURRENT_DOWNLOADS:
+                    await asyncio.wait(running | {stopping}, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                job = await asyncio.to_thread(
+                    self.jobs.claim_next, self.node_id, WORK_LEASE_SECONDS
+                )
+                if job is None or not await self._start_claimed_job(context, job, running):
+                    await asyncio.wait({stopping}, timeout=WORKER_POLL_INTERVAL)
+            stopping.cancel()
+            logger.info("Stopping worker…")
+            if app.running:
+                await app.stop()
+                await app.post_stop(app)
+        finally:
+            await app.shutdown()
+            await app.post_shutdown(app)
+
+    async def _post_init(self, application: Application) -> None:
+        self._draining = False
+        self._drain_deadline = None
+        if self._owns_signals:
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(sig, self._on_stop_signal)
+                except (NotImplementedError, RuntimeError):
+                    pass
+        if self.jobs is not None:
+            self._lease_task = asyncio.get_running_loop().create_task(self._hold_leases())
+            if self.role == "all":
+                # Ingest queues for workers; workers claim stored jobs as they come.
+                asyncio.get_running_loop().create_task(self._resume_jobs())
+        self.health.loop.start()
+        if self.mirror_canary and self.role != "worker":
+            self.mirror_canary.start()
+        if (
+            self.downloader
+            and not self._worker_pool
+            and self.role != "ingest"
+            and TIKTOK_WARMUP_DELAY >= 0
+        ):
+            # Worker processes load yt-dlp themselves; the ingest node never downloads.
+            self._warmup_task = asyncio.get_running_loop().create_task(self._warm_up_downloads())
+        if not self.serve_http:
+            return
+        self.http_server = self._build_http_server()
+        try:
+            await self.http_server.start()
+            logger.info("HTTP server on port %s", self.http_server.bound_port)
+        except OSError as e:
+            logger.error("Failed to start HTTP server on port %s: %s", self._http_port, e)
+            if self._ingress:
+                raise
+
+    async def _post_stop(self, application: Application) -> None:
+        self._begin_drain()
+        await self._drain_jobs()
+
+    async def _post_shutdown(self, application: Application) -> None:
+        if self._warmup_task:
+            self._warmup_task.cancel()
+            self._warmup_task = None
+        if self._lease_task:
+            self._lease_task.cancel()
+            self._lease_task = None
+            if self.role == "ingest":
+                await asyncio.to_thread(self.jobs.release_lease, INGEST_LEASE, self.node_id)
+        if self.http_server:
+            await self.http_server.close()
+        await self.health.loop.stop()
+        if self.mirror_canary:
+            await self.mirror_canary.stop()
+        await asyncio.to_thread(close_http_client)
+
+    async def _run_webhook(self, port: Optional[int] = None, stop: Optional[asyncio.Event] = None) -> None:
+        """
+        Serve updates from Telegram's webhook until SIGINT/SIGTERM (or ``stop``),
+        then stop accepting, finish what was accepted and shut PTB down.
+        """
+        app = self.application
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        secret = TELEGRAM_WEBHOOK_SECRET or (
+            secrets.token_urlsafe(32) if TELEGRAM_WEBHOOK_REGISTER else None
+        )
+        self._ingress = WebhookIngress(app, secret=secret, max_pending=WEBHOOK_MAX_PENDING)
+        if port is not None:
+            self._http_port = port
+
+        await app.initialize()
+        try:
+            # post_init serves /health and the webhook path on PORT.
+            await app.post_init(app)
+            await app.start()
+            if TELEGRAM_WEBHOOK_REGISTER:
+                await app.bot.set_webhook(
+                    url=TELEGRAM_WEBHOOK_URL,
+                    secret_token=secret,
+                    allowed_updates=Update.ALL_TYPES,
+                    max_connections=WEBHOOK_MAX_CONNECTIONS,
+                )
+            logger.info("Webhook listening on port %s", self.http_server.bound_port)
+            await stop.wait()
+            logger.info("Stopping webhook; draining accepted updates…")
+            self._begin_drain()
+            # Telegram keeps the webhook and redelivers anything we answer 503 to.
+            await self._ingress.drain(WEBHOOK_DRAIN_TIMEOUT)
+            if app.running:
+                await app.stop()
+                await app.post_stop(app)
+        finally:
+            await app.shutdown()
+            await app.post_shutdown(app)
 
     def run(self) -> None:
         logger.info(
-            "Starting bot (IG mirror → %s, TikTok download=%s)",
+            "Starting bot as %s (IG mirror → %s, TikTok download=%s, Bot API=%s%s, "
+            "updates via %s)",
+            self.role,
             self.mirror_host,
             bool(self.downloader),
+            TELEGRAM_API_BASE_URL or "api.telegram.org",
+            " local mode" if TELEGRAM_LOCAL_MODE else "",
+            "webhook" if TELEGRAM_WEBHOOK_URL else "polling",
         )
-        threading.Thread(target=self.start_web_server, daemon=True).start()
-
+        if self.role == "worker":
+            try:
+                asyncio.run(self._run_worker())
+            except KeyboardInterrupt:
+                logger.info("Bot stopped by user")
+            if self._worker_pool:
+                self._worker_pool.close()
+            return
         while True:
             try:
+                if self.role == "ingest":
+                    asyncio.run(self._wait_for_ingest_lease())
+                if TELEGRAM_WEBHOOK_URL:
+                    asyncio.run(self._run_webhook())
+                    if self._worker_pool:
+                        self._worker_pool.close()
+                    return
+                # post_init swaps in _on_stop_signal so SIGTERM drains TikTok jobs first.
+                self._owns_signals = True
                 self.application.run_polling(allowed_updates=Update.ALL_TYPES)
             except KeyboardInterrupt:
                 logger.info("Bot stopped by user")
@@ -498,6 +1526,8 @@ class SocialLinksBot:
                 logger.error("Polling stopped: %s", e, exc_info=True)
 
             if not RESTART_ON_STOP:
+                if self._worker_pool:
+                    self._worker_pool.close()
                 return
 
             logger.warning("Rebuilding application; restarting in 5 seconds...")
@@ -506,7 +1536,10 @@ class SocialLinksBot:
 
 
 def main() -> None:
-    SocialLinksBot().run()
+    if len(BOT_PROFILES) > 1:
+        BotHost(BOT_PROFILES, SocialLinksBot).run()
+    else:
+        SocialLinksBot().run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+"""Several bots (one Application per token) in one process, sharing downloads and mirror state."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import signal
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from telegram import Update
+
+from config import (
+    CHECK_LINK_PREVIEW,
+    MIRROR_CANARY_BUDGET,
+    MIRROR_CANARY_INTERVAL,
+    MIRROR_CANARY_PHOTOS,
+    MIRROR_CANARY_REELS,
+    MIRROR_CANARY_WARM_INTERVAL,
+    PREVIEW_PROBE_TIMEOUT,
+    TIKTOK_EXECUTION_MODE,
+    TIKTOK_JOB_DEADLINE,
+    TIKTOK_MAX_CONCURRENT_DOWNLOADS,
+    TIKTOK_WORKER_MAX_JOBS,
+    TIKTOK_WORKER_PROCESSES,
+    BotProfile,
+)
+from admission import InFlight
+from job_worker import ProcessWorkerPool
+from mirror_canary import MirrorCanary
+
+logger = logging.getLogger(__name__)
+
+
+class FairSlots:
+    """
+    ``size`` download slots shared by several bots. A freed slot goes to the
+    waiting bot with the fewest running downloads per unit of weight (ties:
+    the longest wait), so one busy bot cannot starve the others; within a
+    bot it is first come, first served. Event-loop only.
+    """
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._weights: Dict[str, float] = {}
+        self._running: Dict[str, int] = {}
+        self._waiters: Dict[str, Deque[Tuple[int, asyncio.Future]]] = {}
+        self._arrivals = itertools.count()
+
+    def register(self, tenant: str, weight: float = 1.0) -> None:
+        self._weights[tenant] = max(0.1, weight)
+
+    def _in_use(self) -> int:
+        return sum(self._running.values())
+
+    def running(self, tenant: str) -> int:
+        return self._running.get(tenant, 0)
+
+    def waiting(self, tenant: str) -> int:
+        return sum(1 for _, f in self._waiters.get(tenant, ()) if not f.done())
+
+    async def acquire(self, tenant: str) -> None:
+        if self._in_use() < self.size and not any(self._waiters.values()):
+            self._running[tenant] = self.running(tenant) + 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = (next(self._arrivals), future)
+        queue = self._waiters.setdefault(tenant, deque())
+        queue.append(entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the waiter was cancelled: pass the slot on.
+                self.release(tenant)
+            elif entry in queue:
+                queue.remove(entry)
+            raise
+
+    def release(self, tenant: str) -> None:
+        self._running[tenant] = self.running(tenant) - 1
+        self._grant()
+
+    def _grant(self) -> None:
+        while self._in_use() < self.size:
+            waiting = [t for t, queue in self._waiters.items() if queue]
+            if not waiting:
+                return
+            tenant = min(
+                waiting,
+                key=lambda t: (self.running(t) / self._weights.get(t, 1.0), self._waiters[t][0][0]),
+            )
+            _, future = self._waiters[tenant].popleft()
+            if future.done():
+                continue
+            self._running[tenant] = self.running(tenant) + 1
+            future.set_result(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        tenants = set(self._running) | set(self._waiters)
+        return {
+            "size": self.size,
+            "in_use": self._in_use(),
+            "bots": {
+                t: {"running": self.running(t), "waiting": self.waiting(t)} for t in sorted(tenants)
+            },
+        }
+
+
+class SharedServices:
+    """
+    What the bots of one process share: the TikTok downloader and its worker
+    processes, the download slots, the in-flight job count (admission's
+    global cap; quotas stay per bot) and one mirror canary per host chain.
+    Mirror rankings (MIRROR_STATS), the pooled probe client and metrics are
+    module-level, so they are shared already.
+    """
+
+    def __init__(self, tiktok: bool):
+        self.downloader = None
+        if tiktok:
+            # Not imported at all when TikTok downloads are off.
+            from tiktok_downloader import TikTokDownloader
+
+            self.downloader = TikTokDownloader()
+        self.worker_pool = (
+            ProcessWorkerPool(
+                TIKTOK_WORKER_PROCESSES,
+                deadline=TIKTOK_JOB_DEADLINE,
+                max_jobs=TIKTOK_WORKER_MAX_JOBS,
+            )
+            if self.downloader and TIKTOK_EXECUTION_MODE == "process"
+            else None
+        )
+        self.download_slots = FairSlots(TIKTOK_MAX_CONCURRENT_DOWNLOADS)
+        self.in_flight = InFlight()
+        self._canaries: Dict[Tuple[str, ...], MirrorCanary] = {}
+
+    def canary(self, hosts: Sequence[str]) -> Optional[MirrorCanary]:
+        if not (CHECK_LINK_PREVIEW and MIRROR_CANARY_INTERVAL > 0):
+            return None
+        key = tuple(hosts)
+        if key not in self._canaries:
+            self._canaries[key] = MirrorCanary(
+                hosts,
+                reels=MIRROR_CANARY_REELS,
+                photos=MIRROR_CANARY_PHOTOS,
+                interval=MIRROR_CANARY_INTERVAL,
+                budget=MIRROR_CANARY_BUDGET,
+                timeout=min(PREVIEW_PROBE_TIMEOUT, 6.0),
+                warm_interval=MIRROR_CANARY_WARM_INTERVAL,
+            )
+        return self._canaries[key]
+
+    def close(self) -> None:
+        if self.worker_pool:
+            self.worker_pool.close()
+
+
+class BotHost:
+    """
+    Runs one bot per profile with long polling on a single event loop. The
+    first bot serves /health, /ready and /metrics for all of them. SIGINT /
+    SIGTERM drain every bot's TikTok jobs, then stop them.
+    """
+
+    def __init__(self, profiles: Sequence[BotProfile], factory: Callable[..., Any]):
+        self.shared = SharedServices(any(p.tiktok for p in profiles))
+        self.bots: List[Any] = [factory(profile=p, shared=self.shared) for p in profiles]
+        primary, *others = self.bots
+        primary.peers = others
+        for bot in others:
+            bot.serve_http = False
+
+    async def serve(self, stop: Optional[asyncio.Event] = None) -> None:
+        stop = stop or asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+        started = []
+        try:
+            for bot in self.bots:
+                app = bot.application
+                await app.initialize()
+                started.append(bot)
+                await app.post_init(app)
+                await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                await app.start()
+                logger.info("Bot %s polling", bot.profile.name)
+            await stop.wait()
+        finally:
+            # One drain window for all bots rather than one after the other; shared
+            # resources (probe client, canary) are only closed once every bot stopped.
+            for bot in started:
+                bot._begin_drain()
+            for bot in started:
+                if bot.application.updater.running:
+                    await bot.application.updater.stop()
+            for bot in started:
+                app = bot.application
+                if app.running:
+                    await app.stop()
+                    await app.post_stop(app)
+            for bot in reversed(started):
+                await bot.application.shutdown()
+                await bot.application.post_shutdown(bot.application)
+
+    def run(self) -> None:
+        logger.info(
+            "Hosting %s bots: %s", len(self.bots), ", ".join(b.profile.name for b in self.bots)
+        )
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            logger.info("Bot stopped by user")
+        finally:
+            self.shared.close()
@@ -1,5 +1,7 @@
 import logging
 import os
+import re
+from dataclasses import dataclass
 from typing import FrozenSet, Optional
 
 from dotenv import load_dotenv
@@ -39,7 +41,9 @@ def _parse_allowed_chat_ids(raw: Optional[str]) -> Optional[FrozenSet[int]]:
 
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
-if not BOT_TOKEN:
+# Several bots in one process: comma-separated names, each configured with BOT_<NAME>_* (below).
+_BOT_PROFILE_NAMES = [p.strip() for p in os.getenv("BOT_PROFILES", "").split(",") if p.strip()]
+if not BOT_TOKEN and not _BOT_PROFILE_NAMES:
     raise ValueError("BOT_TOKEN environment variable is required")
 
 # Display / fallback host — probe order always tries instagram7.com first.
@@ -77,6 +81,30 @@ PREVIEW_FALLBACK_UNCHECKED = os.getenv("PREVIEW_FALLBACK_UNCHECKED", "true").low
     "yes",
 )
 
+# Preview verification SLO: when the rolling p95 of verified Instagram replies exceeds
+# PREVIEW_SLO_P95_SECONDS or fewer than PREVIEW_SLO_MIN_SUCCESS of them find a verified mirror,
+# reply unchecked (best-ranked mirror) for PREVIEW_SLO_COOLDOWN s, then ramp probing back up.
+# PREVIEW_SLO_P95_SECONDS=0 disables (always verify when CHECK_LINK_PREVIEW is on).
+PREVIEW_SLO_P95_SECONDS = float(os.getenv("PREVIEW_SLO_P95_SECONDS", "4"))
+PREVIEW_SLO_MIN_SUCCESS = float(os.getenv("PREVIEW_SLO_MIN_SUCCESS", "0.5"))
+PREVIEW_SLO_WINDOW = float(os.getenv("PREVIEW_SLO_WINDOW", "300"))
+PREVIEW_SLO_COOLDOWN = float(os.getenv("PREVIEW_SLO_COOLDOWN", "60"))
+
+# Background mirror canary: every MIRROR_CANARY_INTERVAL seconds probe up to
+# MIRROR_CANARY_BUDGET (host, photo/reel) pairs with known-public posts (comma-separated
+# shortcodes, plus the last few links users sent) to keep mirror rankings current.
+# Hosts that answered get a HEAD every MIRROR_CANARY_WARM_INTERVAL s to keep a connection open.
+# Only runs with CHECK_LINK_PREVIEW; MIRROR_CANARY_INTERVAL=0 disables it.
+MIRROR_CANARY_INTERVAL = float(os.getenv("MIRROR_CANARY_INTERVAL", "300"))
+MIRROR_CANARY_BUDGET = max(1, int(os.getenv("MIRROR_CANARY_BUDGET", "6")))
+MIRROR_CANARY_WARM_INTERVAL = float(os.getenv("MIRROR_CANARY_WARM_INTERVAL", "45"))
+MIRROR_CANARY_REELS = tuple(
+    p.strip() for p in os.getenv("MIRROR_CANARY_REELS", "").split(",") if p.strip()
+)
+MIRROR_CANARY_PHOTOS = tuple(
+    p.strip() for p in os.getenv("MIRROR_CANARY_PHOTOS", "").split(",") if p.strip()
+)
+
 # In-process restart after polling stops. On Railway prefer false — the platform
 # restarts the container; reusing PTB without rebuilding closes the event loop.
 RESTART_ON_STOP = os.getenv("RESTART_ON_STOP", "false").lower() in ("1", "true", "yes")
@@ -91,23 +119,205 @@ TELEGRAM_GET_UPDATES_READ_TIMEOUT = float(
     os.getenv("TELEGRAM_GET_UPDATES_READ_TIMEOUT", "35")
 )
 
+# /ready fails when polling saw no successful getUpdates for this long (seconds)…
+HEALTH_POLL_STALE_AFTER = float(os.getenv("HEALTH_POLL_STALE_AFTER", "90"))
+# …and /health and /ready fail while the event loop lags behind by more than this (seconds).
+HEALTH_MAX_LOOP_LAG = float(os.getenv("HEALTH_MAX_LOOP_LAG", "2"))
+
+# Per-update tracing: updates slower than TRACE_SLOW_SECONDS keep their span tree in a
+# ring buffer of TRACE_BUFFER_SIZE, dumped by GET /debug/traces (needs ADMIN_TOKEN).
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_SLOW_SECONDS = float(os.getenv("TRACE_SLOW_SECONDS", "5"))
+TRACE_BUFFER_SIZE = max(1, int(os.getenv("TRACE_BUFFER_SIZE", "50")))
+# Bearer token for admin HTTP endpoints; unset = those endpoints answer 404.
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "").strip() or None
+
+# Updates handled at once across chats; each chat/forum topic still runs in order. 1 = sequential.
+MAX_CONCURRENT_UPDATES = max(1, int(os.getenv("MAX_CONCURRENT_UPDATES", "16")))
+
+# Outbound pacing of Bot API sends (Telegram flood limits). Replies go before status edits;
+# RetryAfter pauses the chat and requeues the call up to TELEGRAM_RETRY_AFTER_RETRIES times.
+# Status edits and deletes never wait for a chat's budget: they are sent later, latest only.
+TELEGRAM_RATE_LIMIT = os.getenv("TELEGRAM_RATE_LIMIT", "true").lower() in ("1", "true", "yes")
+TELEGRAM_GLOBAL_PER_SECOND = float(os.getenv("TELEGRAM_GLOBAL_PER_SECOND", "30"))
+TELEGRAM_PRIVATE_CHAT_PER_SECOND = float(os.getenv("TELEGRAM_PRIVATE_CHAT_PER_SECOND", "1"))
+TELEGRAM_GROUP_CHAT_PER_MINUTE = float(os.getenv("TELEGRAM_GROUP_CHAT_PER_MINUTE", "20"))
+TELEGRAM_RETRY_AFTER_RETRIES = max(0, int(os.getenv("TELEGRAM_RETRY_AFTER_RETRIES", "3")))
+
+# Webhook mode: public HTTPS URL Telegram posts updates to (unset = long polling). The
+# URL's path is served on PORT next to /health, e.g. https://bot.example.com/telegram.
+TELEGRAM_WEBHOOK_URL = os.getenv("TELEGRAM_WEBHOOK_URL", "").strip() or None
+# Checked against X-Telegram-Bot-Api-Secret-Token; unset = random per start.
+TELEGRAM_WEBHOOK_SECRET = os.getenv("TELEGRAM_WEBHOOK_SECRET", "").strip() or None
+# false = don't call setWebhook (webhook managed elsewhere, or local testing with curl).
+TELEGRAM_WEBHOOK_REGISTER = os.getenv("TELEGRAM_WEBHOOK_REGISTER", "true").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+# Answer 503 (Telegram redelivers later) once this many updates are waiting.
+WEBHOOK_MAX_PENDING = max(1, int(os.getenv("WEBHOOK_MAX_PENDING", "200")))
+# Parallel connections Telegram may open to the webhook (1-100).
+WEBHOOK_MAX_CONNECTIONS = min(100, max(1, int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))))
+# On SIGTERM: seconds to finish accepted updates before shutting down.
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))
+
 ENABLE_TIKTOK_DOWNLOAD = os.getenv(
     "ENABLE_TIKTOK_DOWNLOAD", "true"
 ).lower() in ("1", "true", "yes")
 
+# Self-hosted telegram-bot-api server (e.g. http://telegram-bot-api:8081/bot). Unset = api.telegram.org.
+TELEGRAM_API_BASE_URL = os.getenv("TELEGRAM_API_BASE_URL", "").strip().rstrip("/") or None
+TELEGRAM_API_BASE_FILE_URL = os.getenv("TELEGRAM_API_BASE_FILE_URL", "").strip().rstrip("/") or (
+    TELEGRAM_API_BASE_URL[: -len("/bot")] + "/file/bot"
+    if TELEGRAM_API_BASE_URL and TELEGRAM_API_BASE_URL.endswith("/bot")
+    else None
+)
+
+# Server started with --local: uploads are sent as file:// paths the server reads from disk,
+# so DOWNLOAD_PATH must be mounted at the same absolute path in both containers.
+TELEGRAM_LOCAL_MODE = os.getenv("TELEGRAM_LOCAL_MODE", "false").lower() in (
+    "1",
+    "true",
+    "yes",
+)
+if TELEGRAM_LOCAL_MODE and not TELEGRAM_API_BASE_URL:
+    logger.warning(
+        "TELEGRAM_LOCAL_MODE=true needs TELEGRAM_API_BASE_URL (a local telegram-bot-api "
+        "server); ignoring local mode."
+    )
+    TELEGRAM_LOCAL_MODE = False
+
+# Upload ceilings: public Bot API vs a local server (--local lifts it to 2000 MB).
+PUBLIC_BOT_API_MAX_FILE_SIZE_MB = 50
+LOCAL_BOT_API_MAX_FILE_SIZE_MB = 2000
+
+# TikTok job feedback. "chat_action": "sending video…" indicator only, plus a status message
+# once a job outlives TIKTOK_STATUS_DELAY seconds. "message": status message from the start.
+TIKTOK_STATUS_MODE = os.getenv("TIKTOK_STATUS_MODE", "chat_action").strip().lower()
+TIKTOK_STATUS_DELAY = float(os.getenv("TIKTOK_STATUS_DELAY", "8"))
+# Download progress edits to the status message are coalesced to one per interval (seconds).
+TIKTOK_PROGRESS_EDIT_INTERVAL = float(os.getenv("TIKTOK_PROGRESS_EDIT_INTERVAL", "4"))
+
+# When a TikTok format has no size or bitrate, HEAD/Range-probe its URL before downloading.
+TIKTOK_SIZE_PROBE = os.getenv("TIKTOK_SIZE_PROBE", "true").lower() in ("1", "true", "yes")
+TIKTOK_SIZE_PROBE_TIMEOUT = float(os.getenv("TIKTOK_SIZE_PROBE_TIMEOUT", "5"))
+
+# Large single-file TikTok formats are fetched as parallel Range requests (1 = off).
+TIKTOK_PARALLEL_CHUNKS = max(1, int(os.getenv("TIKTOK_PARALLEL_CHUNKS", "4")))
+TIKTOK_CHUNK_SIZE = int(float(os.getenv("TIKTOK_CHUNK_SIZE_MB", "4")) * 1024 * 1024)
+TIKTOK_RANGED_MIN_SIZE = int(float(os.getenv("TIKTOK_RANGED_MIN_SIZE_MB", "8")) * 1024 * 1024)
+
+# Long-lived yt-dlp sessions reused across TikTok jobs (cookies, keep-alive, TLS).
+TIKTOK_SESSION_POOL_SIZE = max(1, int(os.getenv("TIKTOK_SESSION_POOL_SIZE", "2")))
+# Sessions are rebuilt after this many jobs, or at once after a 403/429.
+TIKTOK_SESSION_MAX_JOBS = max(1, int(os.getenv("TIKTOK_SESSION_MAX_JOBS", "200")))
+# curl-cffi impersonation targets, rotated when a session is rebuilt. Empty = plain client.
+TIKTOK_IMPERSONATE = tuple(
+    t.strip()
+    for t in os.getenv("TIKTOK_IMPERSONATE", "chrome,safari,edge").split(",")
+    if t.strip()
+)
+
+# yt-dlp is imported on first use. This many seconds after polling starts it is loaded
+# (and one session built) in the background, so the first TikTok job does not wait for
+# it. Negative = only on the first job.
+TIKTOK_WARMUP_DELAY = float(os.getenv("TIKTOK_WARMUP_DELAY", "5"))
+
+# TikTok downloads running at once across all chats (several links in one message share it).
+TIKTOK_MAX_CONCURRENT_DOWNLOADS = max(1, int(os.getenv("TIKTOK_MAX_CONCURRENT_DOWNLOADS", "3")))
+
+# Admission control: TikTok jobs beyond these limits get an immediate "busy" reply instead
+# of queueing. In-flight counts admitted jobs (running or waiting for a download slot).
+# The in-flight cap and TIKTOK_MAX_WAITING hold for the whole process (all bots); the
+# per-user and per-chat quotas apply to each bot separately.
+# A message with more links than there is room for gets its first links admitted and
+# the rest answered with "send them again once these arrive".
+TIKTOK_MAX_IN_FLIGHT = max(
+    1, int(os.getenv("TIKTOK_MAX_IN_FLIGHT", str(4 * TIKTOK_MAX_CONCURRENT_DOWNLOADS)))
+)
+TIKTOK_MAX_JOBS_PER_USER = max(1, int(os.getenv("TIKTOK_MAX_JOBS_PER_USER", "5")))
+TIKTOK_MAX_JOBS_PER_CHAT = max(1, int(os.getenv("TIKTOK_MAX_JOBS_PER_CHAT", "10")))
+# Reject while this many jobs already wait for a download slot (0 = no limit).
+TIKTOK_MAX_WAITING = int(os.getenv("TIKTOK_MAX_WAITING", str(2 * TIKTOK_MAX_CONCURRENT_DOWNLOADS)))
+# Resource pressure (0 = check off): free space under DOWNLOAD_PATH, MemAvailable,
+# 1-minute load average per CPU.
+TIKTOK_MIN_FREE_DISK_MB = float(os.getenv("TIKTOK_MIN_FREE_DISK_MB", "500"))
+TIKTOK_MIN_FREE_MEMORY_MB = float(os.getenv("TIKTOK_MIN_FREE_MEMORY_MB", "200"))
+TIKTOK_MAX_LOAD_PER_CPU = float(os.getenv("TIKTOK_MAX_LOAD_PER_CPU", "0"))
+
+# Durable TikTok job record (SQLite). Jobs interrupted by a redeploy / restart are resumed
+# on the next start, or their status message is cleaned up when they are too old, were
+# already sending, or were retried JOB_RESUME_MAX_ATTEMPTS times. Keep it on a volume that
+# survives deploys (e.g. a Railway volume mounted at /app/data). Empty = off.
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "./data/jobs.sqlite3").strip()
+# Where the job queue lives. "sqlite": the local file at JOB_STORE_PATH.
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite").strip().lower()
+JOB_RESUME_MAX_AGE = float(os.getenv("JOB_RESUME_MAX_AGE", "900"))
+JOB_RESUME_MAX_ATTEMPTS = max(1, int(os.getenv("JOB_RESUME_MAX_ATTEMPTS", "2")))
+# On SIGTERM: new TikTok links are only recorded, running jobs get this many seconds to finish.
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "20"))
+
+# Replicas: "all" receives updates and runs TikTok jobs in one process (default).
+# "ingest" receives updates, answers Instagram links and queues TikTok jobs in JOB_STORE_PATH;
+# of several ingest replicas only the one holding the ingest lease polls / serves the webhook.
+# "worker" receives no updates; it claims queued TikTok jobs and sends the results.
+# Ingest and worker share the job queue. With the sqlite backend that means processes on
+# one host: SQLite's WAL mode does not work over network filesystems.
+BOT_ROLE = os.getenv("BOT_ROLE", "all").strip().lower()
+if BOT_ROLE not in ("all", "ingest", "worker"):
+    raise ValueError("BOT_ROLE must be all, ingest or worker")
+# The ingest lease is renewed every third of this; a standby takes over once it lapses.
+INGEST_LEASE_SECONDS = max(3.0, float(os.getenv("INGEST_LEASE_SECONDS", "30")))
+# A claimed job goes back to the queue when its worker stops renewing it for this long.
+WORK_LEASE_SECONDS = max(3.0, float(os.getenv("WORK_LEASE_SECONDS", "120")))
+# Idle workers look for queued jobs this often.
+WORKER_POLL_INTERVAL = max(0.05, float(os.getenv("WORKER_POLL_INTERVAL", "1")))
+
+# "thread": yt-dlp runs via asyncio.to_thread (cannot be interrupted).
+# "process": reusable worker processes, SIGKILLed when a job exceeds TIKTOK_JOB_DEADLINE.
+TIKTOK_EXECUTION_MODE = os.getenv("TIKTOK_EXECUTION_MODE", "thread").strip().lower()
+TIKTOK_JOB_DEADLINE = float(os.getenv("TIKTOK_JOB_DEADLINE", "180"))
+TIKTOK_WORKER_PROCESSES = max(1, int(os.getenv("TIKTOK_WORKER_PROCESSES", "2")))
+# Worker processes are replaced after this many jobs to cap memory growth.
+TIKTOK_WORKER_MAX_JOBS = max(1, int(os.getenv("TIKTOK_WORKER_MAX_JOBS", "50")))
+
+# Token bucket in front of every request to TikTok. 403/429 halve the rate, Retry-After
+# pauses all jobs, and the job is retried with jittered backoff instead of failing. The
+# bot waits out the backoff without a download slot; past TIKTOK_JOB_DEADLINE it gives up.
+TIKTOK_RATE_PER_MINUTE = float(os.getenv("TIKTOK_RATE_PER_MINUTE", "60"))
+TIKTOK_RATE_BURST = max(1, int(os.getenv("TIKTOK_RATE_BURST", "10")))
+TIKTOK_BLOCK_RETRIES = max(0, int(os.getenv("TIKTOK_BLOCK_RETRIES", "2")))
+TIKTOK_BACKOFF_BASE = float(os.getenv("TIKTOK_BACKOFF_BASE", "4"))
+TIKTOK_BACKOFF_MAX = float(os.getenv("TIKTOK_BACKOFF_MAX", "60"))
+
 DOWNLOAD_PATH = os.getenv("DOWNLOAD_PATH", "./downloads")
-MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE_MB", "50")) * 1024 * 1024
+_server_max_file_size_mb = (
+    LOCAL_BOT_API_MAX_FILE_SIZE_MB if TELEGRAM_LOCAL_MODE else PUBLIC_BOT_API_MAX_FILE_SIZE_MB
+)
+# Unset = whatever the Bot API server accepts; a value above that is clamped.
+MAX_FILE_SIZE_MB = min(
+    int(os.getenv("MAX_FILE_SIZE_MB", str(_server_max_file_size_mb))),
+    _server_max_file_size_mb,
+)
+MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024
 
 ERROR_MESSAGES = {
     "invalid_link": "❌ Invalid TikTok link.",
     "download_failed": "❌ Failed to download the video.",
-    "file_too_large": "❌ File is too large to send via Telegram (max 50MB).",
+    "file_too_large": f"❌ File is too large to send via Telegram (max {MAX_FILE_SIZE_MB}MB).",
     "unsupported_type": "❌ This TikTok format is not supported.",
     "rate_limited": "⚠️ Rate limited. Try again later.",
     "private_account": "❌ This video is private, age-restricted, or unavailable.",
     "connection_error": "❌ Connection error.",
     "forbidden": "❌ Access forbidden.",
     "tiktok_unavailable": "❌ TikTok temporarily unavailable.",
+    "interrupted": "⚠️ Interrupted by a restart. Please send the link again.",
+    "busy": "⏳ Too many downloads right now. Please send the link again in a few minutes.",
+    "too_many_links": (
+        "⏳ Too many links at once: downloading the first ones. "
+        "Please send the others again once these arrive."
+    ),
 }
 
 # Comma-separated chat_id list. Unset or empty = allow all chats.
@@ -121,9 +331,91 @@ ALLOW_PRIVATE_CHAT = os.getenv("ALLOW_PRIVATE_CHAT", "true").lower() in (
     "yes",
 )
 
+# Mirror picks skip the preview probe on a host whose recent success rate for that post type
+# (photo / reel) is at least MIRROR_TRUST_SUCCESS_RATE over MIRROR_TRUST_MIN_SAMPLES probes;
+# every MIRROR_TRUST_RECHECK_EVERY-th pick still probes. 0 = always probe.
+MIRROR_TRUST_SUCCESS_RATE = float(os.getenv("MIRROR_TRUST_SUCCESS_RATE", "0.95"))
+MIRROR_TRUST_MIN_SAMPLES = int(os.getenv("MIRROR_TRUST_MIN_SAMPLES", "20"))
+MIRROR_TRUST_RECHECK_EVERY = int(os.getenv("MIRROR_TRUST_RECHECK_EVERY", "10"))
+
+# Edited-message suppression: remember a digest of each handled body for this many messages /
+# hours so Telegram's re-sent edited_message (link preview attached, same text) is ignored.
+HANDLED_MESSAGES_CAPACITY = max(1, int(os.getenv("HANDLED_MESSAGES_CAPACITY", "50000")))
+HANDLED_MESSAGES_TTL_HOURS = float(os.getenv("HANDLED_MESSAGES_TTL_HOURS", "48"))
+
 # When true, INFO-log each Instagram mirror / TikTok job (visible in Railway runtime logs).
 LOG_LINK_ACTIVITY = os.getenv("LOG_LINK_ACTIVITY", "false").lower() in (
     "1",
     "true",
     "yes",
 )
+
+
+@dataclass(frozen=True)
+class BotProfile:
+    """One bot (token) run by this process and the settings that may differ per bot."""
+
+    name: str
+    token: str
+    mirror_host: str
+    allowed_chat_ids: Optional[FrozenSet[int]]
+    allow_private_chat: bool
+    tiktok: bool
+    job_store_path: str
+    # Share of the process-wide TikTok download slots when several bots wait for one.
+    download_weight: float = 1.0
+
+
+def _bot_profile(name: str) -> BotProfile:
+    if not re.fullmatch(r"[A-Za-z0-9_]+", name):
+        raise ValueError(f"BOT_PROFILES: {name!r} must be letters, digits or _")
+    prefix = f"BOT_{name.upper()}_"
+    token = os.getenv(prefix + "TOKEN")
+    if not token:
+        raise ValueError(f"{prefix}TOKEN is required for bot profile {name!r}")
+
+    def flag(key: str, default: bool) -> bool:
+        raw = os.getenv(prefix + key)
+        return default if raw is None else raw.lower() in ("1", "true", "yes")
+
+    allowed = os.getenv(prefix + "ALLOWED_CHAT_IDS")
+    root, ext = os.path.splitext(JOB_STORE_PATH)
+    return BotProfile(
+        name=name,
+        token=token,
+        mirror_host=os.getenv(prefix + "MIRROR_HOST", MIRROR_HOST),
+        allowed_chat_ids=(
+            ALLOWED_CHAT_IDS if allowed is None else _parse_allowed_chat_ids(allowed)
+        ),
+        allow_private_chat=flag("ALLOW_PRIVATE_CHAT", ALLOW_PRIVATE_CHAT),
+        tiktok=flag("ENABLE_TIKTOK_DOWNLOAD", ENABLE_TIKTOK_DOWNLOAD),
+        # A resumed job must be sent by the bot that accepted it: one job file per bot.
+        job_store_path=f"{root}-{name}{ext}" if JOB_STORE_PATH else "",
+        download_weight=max(0.1, float(os.getenv(prefix + "DOWNLOAD_WEIGHT", "1"))),
+    )
+
+
+# Unset BOT_PROFILES: one bot from BOT_TOKEN and the settings above. Otherwise every listed
+# bot polls from this process and they share the download slots and worker processes
+# (TIKTOK_MAX_CONCURRENT_DOWNLOADS, TIKTOK_WORKER_PROCESSES), mirror rankings, probe
+# connections, canary and metrics. Per bot: BOT_<NAME>_TOKEN (required), _MIRROR_HOST,
+# _ALLOWED_CHAT_IDS, _ALLOW_PRIVATE_CHAT, _ENABLE_TIKTOK_DOWNLOAD and _DOWNLOAD_WEIGHT,
+# each defaulting to the setting without the prefix.
+if _BOT_PROFILE_NAMES:
+    if TELEGRAM_WEBHOOK_URL or BOT_ROLE != "all":
+        raise ValueError("BOT_PROFILES needs polling (no TELEGRAM_WEBHOOK_URL) and BOT_ROLE=all")
+    BOT_PROFILES = tuple(_bot_profile(name) for name in _BOT_PROFILE_NAMES)
+    if len({p.name.lower() for p in BOT_PROFILES}) != len(BOT_PROFILES):
+        raise ValueError("BOT_PROFILES lists the same name twice")
+else:
+    BOT_PROFILES = (
+        BotProfile(
+            name="bot",
+            token=BOT_TOKEN,
+            mirror_host=MIRROR_HOST,
+            allowed_chat_ids=ALLOWED_CHAT_IDS,
+            allow_private_chat=ALLOW_PRIVATE_CHAT,
+            tiktok=ENABLE_TIKTOK_DOWNLOAD,
+            job_store_path=JOB_STORE_PATH,
+        ),
+    )
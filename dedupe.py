@@ -0,0 +1,100 @@
+"""Bounded LRU + TTL map of (chat_id, message_id) -> handled body digest and links."""
+
+from __future__ import annotations
+
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+def body_digest(body: str) -> int:
+    """64-bit BLAKE2b of the body; a small int costs the same whatever the text length."""
+    return int.from_bytes(
+        hashlib.blake2b(body.encode("utf-8", "surrogatepass"), digest_size=8).digest(), "big"
+    )
+
+
+@dataclass
+class HandledMessage:
+    """What the bot already did for one message, so an edit only handles new links."""
+
+    instagram: Dict[str, str] = field(default_factory=dict)  # instagram URL -> mirror URL
+    reply_id: Optional[int] = None  # the bot's mirror reply, edited in place
+    tiktok: Set[str] = field(default_factory=set)
+
+
+class DedupeStore:
+    """
+    Remembers which body was last handled per key. Every entry has the same
+    TTL and is moved to the end when written, so the front of the OrderedDict
+    is both least recently used and soonest to expire: eviction is O(1)
+    popitem(last=False) per entry, never a bulk sweep. Each entry may carry a
+    HandledMessage (bounded by the links one message can hold). Not
+    thread-safe; it is only touched from the event loop.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        ttl: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.capacity = max(1, capacity)
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, Optional[HandledMessage]]]" = (
+            OrderedDict()
+        )
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expire(self, now: float) -> None:
+        entries = self._entries
+        while entries:
+            _, expires, _ = next(iter(entries.values()))
+            if expires > now:
+                break
+            entries.popitem(last=False)
+            self.expired += 1
+
+    def remember(
+        self, key: Hashable, body: str, record: Optional[HandledMessage] = None
+    ) -> None:
+        now = self._clock()
+        self._expire(now)
+        entries = self._entries
+        entries[key] = (body_digest(body), now + self.ttl, record)
+        entries.move_to_end(key)
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evicted += 1
+
+    def seen(self, key: Hashable, body: str) -> bool:
+        """True when ``body`` is what was last remembered for ``key`` and it has not expired."""
+        entry = self._live(key)
+        return entry is not None and entry[0] == body_digest(body)
+
+    def record(self, key: Hashable) -> Optional[HandledMessage]:
+        entry = self._live(key)
+        return entry[2] if entry is not None else None
+
+    def _live(self, key: Hashable) -> Optional[Tuple[int, float, Optional[HandledMessage]]]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] <= self._clock():
+            del self._entries[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def snapshot(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "capacity": self.capacity,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
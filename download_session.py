@@ -0,0 +1,240 @@
+"""
+Long-lived yt-dlp sessions shared across TikTok jobs. yt-dlp itself (and its
+extractors) is imported when the first session is built, not with this module.
+"""
+
+from __future__ import annotations
+
+import copy
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+ProgressHook = Callable[[Dict[str, Any]], None]
+
+
+class DownloadSession:
+    """
+    One YoutubeDL instance kept open between jobs, so its cookie jar, keep-alive
+    connections and TLS sessions are reused. Used by one job at a time.
+    """
+
+    def __init__(self, base_opts: Dict[str, Any], impersonate: Optional[str] = None):
+        import yt_dlp
+        from yt_dlp.networking.impersonate import ImpersonateTarget
+
+        opts = {**base_opts, 'progress_hooks': [self._dispatch_progress]}
+        self.impersonate: Optional[str] = None
+        if impersonate:
+            # The impersonated client sends its own matching User-Agent.
+            headers = {
+                k: v for k, v in (opts.get('http_headers') or {}).items()
+                if k.lower() != 'user-agent'
+            }
+            impersonated = {
+                **opts,
+                'http_headers': headers,
+                'impersonate': ImpersonateTarget.from_str(impersonate),
+            }
+            impersonated.pop('user_agent', None)
+            try:
+                self.ydl = yt_dlp.YoutubeDL(impersonated)
+                self.impersonate = impersonate
+            except yt_dlp.utils.YoutubeDLError as exc:
+                logger.warning(
+                    "Impersonation %r unavailable (%s); using plain client", impersonate, exc
+                )
+                self.ydl = yt_dlp.YoutubeDL(opts)
+        else:
+            self.ydl = yt_dlp.YoutubeDL(opts)
+        self._progress_hook: Optional[ProgressHook] = None
+        self.jobs = 0
+        self.retired: Optional[str] = None
+        self.last_extract_seconds: Optional[float] = None
+
+    def _dispatch_progress(self, d: Dict[str, Any]) -> None:
+        hook = self._progress_hook
+        if hook:
+            hook(d)
+
+    def extract_info(self, url: str) -> Optional[Dict[str, Any]]:
+        started = time.monotonic()
+        try:
+            return self.ydl.extract_info(url, download=False)
+        finally:
+            self.last_extract_seconds = time.monotonic() - started
+
+    def download(
+        self, info: Dict[str, Any], format_spec: str, outtmpl: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Download from already-extracted info (no second extraction round-trip),
+        to ``outtmpl`` when given (a per-job path) instead of the session's default.
+        """
+        self.ydl.params['format'] = format_spec
+        if outtmpl:
+            self.ydl.params['outtmpl'] = {**self.ydl.params['outtmpl'], 'default': outtmpl}
+        self.ydl.format_selector = self.ydl.build_format_selector(format_spec)
+        return self.ydl.process_ie_result(copy.deepcopy(info), download=True)
+
+    def retire(self, reason: str) -> None:
+        """Drop this session after the current job (e.g. TikTok answered 403/429)."""
+        self.retired = reason
+
+    def close(self) -> None:
+        try:
+            self.ydl.close()
+        except Exception as exc:
+            logger.debug("Closing yt-dlp session failed: %s", exc)
+
+
+class SessionPool:
+    """
+    Up to ``size`` sessions handed out one job at a time. Sessions are recycled
+    after ``max_jobs`` jobs or when retired, rotating through ``impersonate_targets``.
+    """
+
+    def __init__(
+        self,
+        base_opts: Dict[str, Any],
+        *,
+        size: int = 2,
+        impersonate_targets: Sequence[str] = (),
+        max_jobs: int = 200,
+    ):
+        self._base_opts = base_opts
+        self._size = max(1, size)
+        self._targets: List[str] = [t for t in impersonate_targets if t]
+        self._max_jobs = max(1, max_jobs)
+        # Idle sessions, most recently used last; _available is signalled whenever
+        # one is checked in or a slot frees up, so waiters can take or build one.
+        self._idle: List[DownloadSession] = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._live = 0
+        self._recycled = 0
+        self._reused_jobs = 0
+        self._cold_jobs = 0
+        # Mean extract_info latency on fresh vs reused sessions (what reuse saves).
+        self._cold_seconds = 0.0
+        self._warm_seconds = 0.0
+
+    def _new_session(self) -> DownloadSession:
+        with self._lock:
+            target = self._targets[self._created % len(self._targets)] if self._targets else None
+            self._created += 1
+        return DownloadSession(self._base_opts, impersonate=target)
+
+    def _checkout(self) -> DownloadSession:
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._live < self._size:
+                    self._live += 1
+                    break
+                self._available.wait()
+        return self._build()
+
+    def _build(self) -> DownloadSession:
+        """A new session for a slot already counted in ``_live``."""
+        try:
+            return self._new_session()
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _free_slot(self) -> None:
+        with self._available:
+            self._live -= 1
+            self._available.notify()
+
+    def warm_up(self) -> bool:
+        """
+        Build one idle session ahead of the first job, so that job does not pay
+        for importing yt-dlp. False when a session exists already.
+        """
+        with self._lock:
+            if self._live:
+                return False
+            self._live += 1
+        session = self._build()
+        with self._available:
+            self._idle.append(session)
+            self._available.notify()
+        return True
+
+    def _checkin(self, session: DownloadSession) -> None:
+        if session.retired or session.jobs >= self._max_jobs:
+            reason = session.retired or f"{session.jobs} jobs"
+            logger.info("Recycling yt-dlp session (%s, impersonate=%s)", reason, session.impersonate)
+            session.close()
+            with self._lock:
+                self._recycled += 1
+            # A waiter builds the replacement in the freed slot.
+            self._free_slot()
+            return
+        with self._available:
+            self._idle.append(session)
+            self._available.notify()
+
+    @contextmanager
+    def session(self, progress_hook: Optional[ProgressHook] = None) -> Iterator[DownloadSession]:
+        session = self._checkout()
+        session._progress_hook = progress_hook
+        session.last_extract_seconds = None
+        try:
+            yield session
+        finally:
+            session._progress_hook = None
+            if session.last_extract_seconds is not None:
+                self._record_extract(session.jobs > 0, session.last_extract_seconds)
+            session.jobs += 1
+            self._checkin(session)
+            with self._lock:
+                total = self._cold_jobs + self._reused_jobs
+            if total and total % 50 == 0:
+                logger.info("yt-dlp session reuse: %s", self.stats())
+
+    def _record_extract(self, reused: bool, seconds: float) -> None:
+        with self._lock:
+            if reused:
+                self._reused_jobs += 1
+                self._warm_seconds += seconds
+            else:
+                self._cold_jobs += 1
+                self._cold_seconds += seconds
+
+    def stats(self) -> Dict[str, Any]:
+        """Reuse counters plus the estimated extraction time saved by warm sessions."""
+        with self._lock:
+            cold_avg = self._cold_seconds / self._cold_jobs if self._cold_jobs else None
+            warm_avg = self._warm_seconds / self._reused_jobs if self._reused_jobs else None
+            saved = (
+                max(0.0, cold_avg - warm_avg) * self._reused_jobs
+                if cold_avg is not None and warm_avg is not None
+                else 0.0
+            )
+            return {
+                "sessions_live": self._live,
+                "sessions_created": self._created,
+                "sessions_recycled": self._recycled,
+                "jobs_on_fresh_session": self._cold_jobs,
+                "jobs_on_reused_session": self._reused_jobs,
+                "extract_avg_fresh_s": round(cold_avg, 3) if cold_avg is not None else None,
+                "extract_avg_reused_s": round(warm_avg, 3) if warm_avg is not None else None,
+                "estimated_seconds_saved": round(saved, 1),
+            }
+
+    def close(self) -> None:
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._live -= len(idle)
+            self._available.notify_all()
+        for session in idle:
+            session.close()
@@ -0,0 +1,209 @@
+"""Local stand-ins for Instagram mirror hosts (and instagram.com), used by the load harness."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, fields
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+OK = "ok"
+PLACEHOLDER = "placeholder"
+REDIRECT = "redirect"
+ERROR = "error"
+
+_REEL_PAGE = """<!DOCTYPE html><html><head>
+<meta property="og:title" content="Reel by fake">
+<meta property="og:image" content="https://{host}/thumb{path}.jpg">
+<meta property="og:video" content="https://{host}/video{path}.mp4">
+<meta name="twitter:card" content="player">
+</head><body>reel</body></html>"""
+_PHOTO_PAGE = """<!DOCTYPE html><html><head>
+<meta property="og:title" content="Photo by fake">
+<meta property="og:image" content="https://{host}/image{path}.jpg">
+</head><body>photo</body></html>"""
+_PLACEHOLDER_PAGE = """<!DOCTYPE html><html><head>
+<meta property="og:title" content="Instagram">
+<meta property="og:description" content="Post not found">
+</head><body>Post not found</body></html>"""
+_INSTAGRAM_PAGE = """<!DOCTYPE html><html><head>
+<meta property="og:title" content="Instagram">
+</head><body>Log in to see this post</body></html>"""
+
+
+@dataclass
+class MirrorBehaviour:
+    """
+    How one fake mirror answers: after ``latency`` (+ up to ``jitter``) seconds,
+    a ``placeholder`` share of pages has no usable preview, a ``redirect`` share
+    bounces to instagram.com, an ``error`` share is HTTP 502; the rest carry
+    proper Open Graph tags.
+    """
+
+    latency: float = 0.05
+    jitter: float = 0.0
+    placeholder: float = 0.0
+    redirect: float = 0.0
+    error: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str) -> "MirrorBehaviour":
+        """From ``"latency=0.2,placeholder=0.5"``; unnamed fields keep their defaults."""
+        known = {f.name for f in fields(cls)}
+        values: Dict[str, float] = {}
+        for part in spec.split(","):
+            if not part.strip():
+                continue
+            name, _, value = part.partition("=")
+            name = name.strip()
+            if name not in known:
+                raise ValueError(f"Unknown mirror setting {name!r} (known: {sorted(known)})")
+            values[name] = float(value)
+        return cls(**values)
+
+
+class _LocalTransport(httpx.HTTPTransport):
+    """Sends every request to the fake server, keeping the URL (and Host) the client asked for."""
+
+    def __init__(self, port: int):
+        super().__init__(limits=httpx.Limits(max_connections=64, max_keepalive_connections=32))
+        self._port = port
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        local = httpx.Request(
+            request.method,
+            request.url.copy_with(scheme="http", host="127.0.0.1", port=self._port),
+            headers=request.headers,
+            stream=request.stream,
+            extensions=request.extensions,
+        )
+        return super().handle_request(local)
+
+
+class FakeMirrors:
+    """
+    One HTTP server answering for every mirror host (told apart by the Host
+    header) and for instagram.com, where redirects land. Hosts without a
+    behaviour of their own use ``default``. Route probes here with
+    ``preview_check.use_transport(mirrors.transport())``.
+    """
+
+    def __init__(
+        self,
+        behaviours: Optional[Dict[str, MirrorBehaviour]] = None,
+        default: Optional[MirrorBehaviour] = None,
+        *,
+        seed: int = 0,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.behaviours = {
+            h.lower().removeprefix("www."): b for h, b in (behaviours or {}).items()
+        }
+        self.default = default or MirrorBehaviour()
+        # (host, outcome) -> requests answered.
+        self.hits: Counter = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def transport(self) -> httpx.BaseTransport:
+        return _LocalTransport(self.port)
+
+    def behaviour(self, host: str) -> MirrorBehaviour:
+        return self.behaviours.get(host.lower().removeprefix("www."), self.default)
+
+    def _answer(self, host: str) -> Tuple[str, float]:
+        """(outcome, delay) for one request to ``host``."""
+        b = self.behaviour(host)
+        with self._lock:
+            roll = self._random.random()
+            delay = b.latency + (self._random.random() * b.jitter if b.jitter else 0.0)
+        if roll < b.error:
+            outcome = ERROR
+        elif roll < b.error + b.redirect:
+            outcome = REDIRECT
+        elif roll < b.error + b.redirect + b.placeholder:
+            outcome = PLACEHOLDER
+        else:
+            outcome = OK
+        with self._lock:
+            self.hits[(host, outcome)] += 1
+        return outcome, delay
+
+    def start(self) -> "FakeMirrors":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeMirrors":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _handler_class(self):
+        mirrors = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, status: int, body: str = "", location: str = "") -> None:
+                payload = body.encode("utf-8") if self.command != "HEAD" else b""
+                try:
+                    self.send_response(status)
+                    if location:
+                        self.send_header("Location", location)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body.encode("utf-8"))))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The probe timed out and hung up.
+                    pass
+
+            def do_GET(self) -> None:
+                host = (self.headers.get("Host") or "").split(":")[0].lower()
+                site = host.removeprefix("www.")
+                path = self.path.split("?", 1)[0]
+                if site == "instagram.com" or site.endswith(".instagram.com"):
+                    with mirrors._lock:
+                        mirrors.hits[(site, OK)] += 1
+                    self._reply(200, _INSTAGRAM_PAGE)
+                    return
+                outcome, delay = mirrors._answer(site)
+                if delay > 0:
+                    time.sleep(delay)
+                if outcome == ERROR:
+                    self._reply(502, "bad gateway")
+                elif outcome == REDIRECT:
+                    self._reply(302, location=f"https://www.instagram.com{path}")
+                elif outcome == PLACEHOLDER:
+                    self._reply(200, _PLACEHOLDER_PAGE)
+                else:
+                    page = _PHOTO_PAGE if "/p/" in path else _REEL_PAGE
+                    self._reply(200, page.format(host=host, path=path.rstrip("/")))
+
+            def do_HEAD(self) -> None:
+                # Connection warm-ups (the canary): answered at once, not counted.
+                self._reply(200)
+
+        return Handler
@@ -0,0 +1,178 @@
+"""Minimal stand-in for a (local) telegram-bot-api server, used by the offline tests."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+FAKE_BOT_USER = {
+    "id": 4242,
+    "is_bot": True,
+    "first_name": "Fake",
+    "username": "fake_links_bot",
+}
+
+
+def _decode_params(content_type: str, raw: bytes) -> Dict[str, Any]:
+    """PTB posts form-encoded fields whose non-str values are JSON strings."""
+    if not raw:
+        return {}
+    if content_type.startswith("application/json"):
+        return json.loads(raw.decode("utf-8"))
+    if content_type.startswith("multipart/form-data"):
+        # Only the field names matter to the tests; file bodies are not kept.
+        return {"_multipart": True}
+    out: Dict[str, Any] = {}
+    for key, values in parse_qs(raw.decode("utf-8"), keep_blank_values=True).items():
+        value = values[-1]
+        try:
+            out[key] = json.loads(value)
+        except ValueError:
+            out[key] = value
+    return out
+
+
+class FakeBotAPI:
+    """
+    Records every Bot API call as (method, params) and answers with plausible results.
+    Use ``base_url`` with ``Application.builder().base_url(...)``. ``latency``
+    seconds are added to every call but getUpdates (a slow or distant API).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0):
+        self.latency = latency
+        self.calls: List[Tuple[str, Dict[str, Any]]] = []
+        # Bot token and time.monotonic() of each entry in ``calls``.
+        self.call_tokens: List[str] = []
+        self.call_times: List[float] = []
+        self._lock = threading.Lock()
+        self._updates_ready = threading.Condition(self._lock)
+        self._updates: Dict[str, List[Dict[str, Any]]] = {}
+        self._next_update_id = 1
+        self._next_message_id = 1000
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot"
+
+    def calls_to(self, method: str, token: Optional[str] = None) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                params
+                for (name, params), by in zip(self.calls, self.call_tokens)
+                if name == method and (token is None or by == token)
+            ]
+
+    def calls_since(self, start: int) -> List[Tuple[str, Dict[str, Any], float]]:
+        """(method, params, monotonic time) of the calls from index ``start`` on."""
+        with self._lock:
+            return [
+                (method, params, at)
+                for (method, params), at in zip(self.calls[start:], self.call_times[start:])
+            ]
+
+    def push_update(self, token: str, update: Dict[str, Any]) -> int:
+        """Queue an update (without update_id) for the bot polling with ``token``."""
+        with self._lock:
+            update_id = self._next_update_id
+            self._next_update_id += 1
+            self._updates.setdefault(token, []).append({"update_id": update_id, **update})
+            self._updates_ready.notify_all()
+        return update_id
+
+    def _get_updates(self, token: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Short long-poll: pollers neither spin nor hold shutdown up for long.
+        offset = int(params.get("offset") or 0)
+        deadline = time.monotonic() + min(float(params.get("timeout") or 0), 0.5)
+        with self._lock:
+            while True:
+                pending = self._updates.get(token, [])
+                pending[:] = [u for u in pending if u["update_id"] >= offset]
+                remaining = deadline - time.monotonic()
+                if pending or remaining <= 0:
+                    return pending[: int(params.get("limit") or 100)]
+                self._updates_ready.wait(remaining)
+
+    def start(self) -> "FakeBotAPI":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeBotAPI":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _result_for(self, token: str, method: str, params: Dict[str, Any]) -> Any:
+        name = method.lower()
+        if name == "getme":
+            return FAKE_BOT_USER
+        if name == "getupdates":
+            return self._get_updates(token, params)
+        if name == "sendmediagroup":
+            return [self._message(params) for _ in params.get("media") or []]
+        if name.startswith("send") and name != "sendchataction":
+            return self._message(params)
+        return True
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._next_message_id += 1
+            message_id = self._next_message_id
+        chat_id = params.get("chat_id", 0)
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if int(chat_id) > 0 else "supergroup"},
+            "from": FAKE_BOT_USER,
+        }
+
+    def _handler_class(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                bot, method = self.path.rstrip("/").rsplit("/", 2)[-2:]
+                token = bot[len("bot"):]
+                length = int(self.headers.get("Content-Length") or 0)
+                params = _decode_params(
+                    self.headers.get("Content-Type", ""), self.rfile.read(length)
+                )
+                with api._lock:
+                    api.calls.append((method, params))
+                    api.call_tokens.append(token)
+                    api.call_times.append(time.monotonic())
+                if api.latency > 0 and method.lower() != "getupdates":
+                    time.sleep(api.latency)
+                result = api._result_for(token, method, params)
+                body = json.dumps({"ok": True, "result": result})
+                payload = body.encode("utf-8")
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                except (BrokenPipeError, ConnectionResetError):
+                    # A poller that gave up (shutdown) closed its connection.
+                    pass
+
+            do_GET = do_POST
+
+        return Handler
@@ -0,0 +1,161 @@
+"""Liveness/readiness signals gathered on the bot's event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, Optional
+
+from telegram.request import HTTPXRequest
+
+from metrics import TELEGRAM_API_ERRORS_TOTAL, TELEGRAM_API_SECONDS
+from tracing import span
+
+LAG_SAMPLE_INTERVAL = 0.5
+# max_lag_s covers the current window and the one before it.
+LAG_WINDOW = 60.0
+
+
+class TrackingRequest(HTTPXRequest):
+    """
+    HTTPXRequest that records Bot API latency/errors per method and remembers
+    when getUpdates last succeeded.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.last_success: Optional[float] = None
+        self.last_failure: Optional[float] = None
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1] or "unknown"
+        started = time.perf_counter()
+        try:
+            with span(f"telegram.{api_method}"):
+                code, payload = await super().do_request(url, method, *args, **kwargs)
+        except Exception as exc:
+            TELEGRAM_API_ERRORS_TOTAL.inc(method=api_method, error=type(exc).__name__)
+            self.last_failure = time.time()
+            raise
+        finally:
+            TELEGRAM_API_SECONDS.observe(time.perf_counter() - started, method=api_method)
+        ok = 200 <= code < 300
+        if not ok:
+            TELEGRAM_API_ERRORS_TOTAL.inc(method=api_method, error=str(code))
+        if api_method == "getUpdates":
+            if ok:
+                self.last_success = time.time()
+            else:
+                self.last_failure = time.time()
+        return code, payload
+
+
+class LoopLagMonitor:
+    """
+    Sleeps LAG_SAMPLE_INTERVAL in a loop; any overshoot is time the loop was
+    blocked. The maximum is kept per LAG_WINDOW, so reading it (from /health,
+    /ready and the load test alike) never resets it.
+    """
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL, window: float = LAG_WINDOW):
+        self._interval = interval
+        self._window = window
+        self._task: Optional[asyncio.Task] = None
+        self.lag = 0.0
+        # Highest lag since start, and in the current / previous window.
+        self.peak_lag = 0.0
+        self._window_max = 0.0
+        self._previous_max = 0.0
+        self._window_started = time.monotonic()
+        self.last_tick: Optional[float] = None
+
+    @property
+    def max_lag(self) -> float:
+        return max(self._window_max, self._previous_max)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def record(self, lag: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        if now - self._window_started >= self._window:
+            # A window with no samples at all (a stopped monitor) leaves nothing behind.
+            stale = now - self._window_started >= 2 * self._window
+            self._previous_max = 0.0 if stale else self._window_max
+            self._window_max = 0.0
+            self._window_started = now
+        self.lag = lag
+        self._window_max = max(self._window_max, lag)
+        self.peak_lag = max(self.peak_lag, lag)
+
+    async def _run(self) -> None:
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self._interval)
+            self.record(max(0.0, time.monotonic() - started - self._interval))
+            self.last_tick = time.time()
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"lag_s": round(self.lag, 3), "max_lag_s": round(self.max_lag, 3)}
+
+
+class HealthState:
+    """
+    Liveness = the loop answers (this is served on it) and is not badly lagging.
+    Readiness = updates are flowing: a recent successful getUpdates in polling
+    mode, or a running application in webhook and worker mode.
+    """
+
+    def __init__(
+        self,
+        *,
+        mode: str,
+        poll_request: Optional[TrackingRequest],
+        poll_stale_after: float,
+        max_loop_lag: float,
+        queues: Callable[[], Dict[str, Any]],
+        is_running: Callable[[], bool],
+    ):
+        self.mode = mode
+        self.poll_request = poll_request
+        self.poll_stale_after = poll_stale_after
+        self.max_loop_lag = max_loop_lag
+        self.loop = LoopLagMonitor()
+        self._queues = queues
+        self._is_running = is_running
+        self.started = time.time()
+
+    def report(self) -> Dict[str, Any]:
+        now = time.time()
+        loop = self.loop.snapshot()
+        reasons = []
+        if not self._is_running():
+            reasons.append("application not running")
+        if loop["lag_s"] > self.max_loop_lag:
+            reasons.append(f"event loop lagging {loop['lag_s']}s")
+        last_poll = self.poll_request.last_success if self.poll_request else None
+        if self.mode == "polling":
+            # Allow startup one stale window before the first poll must have landed.
+            since = now - (last_poll or self.started)
+            if since > self.poll_stale_after:
+                reasons.append(f"no successful getUpdates for {since:.0f}s")
+        return {
+            "live": loop["lag_s"] <= self.max_loop_lag,
+            "ready": not reasons,
+            "reasons": reasons,
+            "mode": self.mode,
+            "uptime_s": round(now - self.started),
+            "last_get_updates_ago_s": round(now - last_poll, 1) if last_poll else None,
+            "event_loop": loop,
+            "queues": self._queues(),
+        }
@@ -0,0 +1,267 @@
+"""User-facing progress for TikTok jobs with as few Telegram calls as possible."""
+
+from __future__ import annotations
+
+import asyncio
+import html
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from telegram.error import TelegramError
+
+logger = logging.getLogger(__name__)
+
+# Telegram shows a chat action for ~5 s; refresh slightly earlier.
+CHAT_ACTION_REFRESH = 4.5
+
+# Status texts are HTML (the link in <code>); edits must send them with parse_mode="HTML".
+EditFn = Callable[[int, str], Awaitable[None]]
+DeleteFn = Callable[[int], Awaitable[None]]
+ChatActionFn = Callable[[], Awaitable[Any]]
+
+
+def _human_bytes(n: Optional[float]) -> str:
+    if not n:
+        return "?"
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+
+def progress_text(link: str, d: Dict[str, Any]) -> Optional[str]:
+    """Status text for a yt-dlp progress dict (or our own {'status': 'processing'})."""
+    status = d.get("status")
+    code = f"<code>{html.escape(link)}</code>"
+    if status == "downloading":
+        done = d.get("downloaded_bytes") or 0
+        total = d.get("total_bytes") or d.get("total_bytes_estimate")
+        if total:
+            pct = min(100, int(done * 100 / total))
+            return f"⏳ Downloading TikTok… {pct}% of {_human_bytes(total)}\n{code}"
+        return f"⏳ Downloading TikTok… {_human_bytes(done)}\n{code}"
+    if status in ("finished", "processing"):
+        return f"⚙️ Processing video…\n{code}"
+    if status == "batch":
+        return f"⏳ Downloading TikToks… {d.get('done', 0)}/{d.get('total', 0)} ready\n{code}"
+    if status == "retrying":
+        return f"⏳ TikTok is rate limiting, retrying in {d.get('retry_in', 0):.0f}s…\n{code}"
+    return None
+
+
+class EditCoalescer:
+    """Keeps only the newest text and edits the message at most once per interval."""
+
+    def __init__(self, edit: Callable[[str], Awaitable[None]], interval: float):
+        self._edit = edit
+        self._interval = max(0.0, interval)
+        self._pending: Optional[str] = None
+        self._last_sent: Optional[str] = None
+        self._last_edit = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, text: str) -> None:
+        self._pending = text
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while self._pending is not None:
+            wait = self._last_edit + self._interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            text, self._pending = self._pending, None
+            if text is None or text == self._last_sent:
+                continue
+            self._last_edit = time.monotonic()
+            self._last_sent = text
+            await self._edit(text)
+
+    async def close(self) -> None:
+        """Drop anything not yet sent; the caller writes the final state itself."""
+        self._pending = None
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class MessageJobStatus:
+    """Status message up front, edited per stage and on progress, deleted at the end."""
+
+    def __init__(
+        self,
+        message,
+        link: str,
+        *,
+        edit: EditFn,
+        delete: DeleteFn,
+        edit_interval: float,
+    ):
+        self._message = message
+        self._link = link
+        self._edit = edit
+        self._delete = delete
+        self._edit_interval = edit_interval
+        self.status_message_id: Optional[int] = None
+        self._coalescer: Optional[EditCoalescer] = None
+
+    async def _reply(self, text: str, **kwargs: Any) -> Any:
+        # PTB 20.7's reply_text leaves the forum topic out; name it like every other send.
+        return await self._message.reply_text(
+            text=text, message_thread_id=getattr(self._message, "message_thread_id", None), **kwargs
+        )
+
+    async def _create(self, text: str) -> None:
+        status = await self._reply(text, parse_mode="HTML")
+        self.status_message_id = status.message_id
+        self._coalescer = EditCoalescer(
+            lambda t: self._edit(self.status_message_id, t), self._edit_interval
+        )
+
+    async def start(self) -> None:
+        await self._create(f"⏳ Downloading TikTok…\n<code>{html.escape(self._link)}</code>")
+
+    def progress(self, d: Dict[str, Any]) -> None:
+        text = progress_text(self._link, d)
+        if text and self._coalescer:
+            self._coalescer.push(text)
+
+    async def stage(self, text: str) -> None:
+        """Plain ``text`` (errors may quote anything) replaces the status."""
+        if self._coalescer:
+            await self._coalescer.close()
+        if self.status_message_id is not None:
+            await self._edit(self.status_message_id, html.escape(text[:3900]))
+
+    async def fail(self, text: str) -> None:
+        await self.stage(text)
+
+    async def finish(self) -> None:
+        if self._coalescer:
+            await self._coalescer.close()
+        if self.status_message_id is not None:
+            await self._delete(self.status_message_id)
+
+
+class ChatActionJobStatus(MessageJobStatus):
+    """
+    "sending video…" chat action while the job runs; a status message only appears
+    once the job outlives ``delay`` seconds, so fast jobs cost no extra messages.
+    """
+
+    def __init__(
+        self,
+        message,
+        link: str,
+        *,
+        edit: EditFn,
+        delete: DeleteFn,
+        send_action: ChatActionFn,
+        edit_interval: float,
+        delay: float,
+    ):
+        super().__init__(
+            message, link, edit=edit, delete=delete, edit_interval=edit_interval
+        )
+        self._send_action = send_action
+        self._delay = delay
+        self._latest: Optional[str] = None
+        self._ticker: Optional[asyncio.Task] = None
+        # Shielded from the ticker's cancellation, so a status message sent while
+        # the job ends still gets its id recorded (and is then deleted).
+        self._creating: Optional[asyncio.Task] = None
+        self._done = False
+
+    async def start(self) -> None:
+        self._ticker = asyncio.get_running_loop().create_task(self._tick())
+
+    async def _tick(self) -> None:
+        started = time.monotonic()
+        while not self._done:
+            try:
+                await self._send_action()
+            except TelegramError as exc:
+                logger.debug("send_chat_action failed: %s", exc)
+            if self.status_message_id is None and time.monotonic() - started >= self._delay:
+                text = self._latest or (
+                    f"⏳ Downloading TikTok…\n<code>{html.escape(self._link)}</code>"
+                )
+                self._creating = asyncio.get_running_loop().create_task(self._create(text))
+                try:
+                    await asyncio.shield(self._creating)
+                except TelegramError as exc:
+                    logger.warning("Could not send status message: %s", exc)
+            await asyncio.sleep(min(CHAT_ACTION_REFRESH, max(0.5, self._delay)))
+
+    async def _stop_ticker(self) -> None:
+        self._done = True
+        if self._ticker and not self._ticker.done():
+            self._ticker.cancel()
+            try:
+                await self._ticker
+            except asyncio.CancelledError:
+                pass
+        if self._creating is not None:
+            try:
+                await self._creating
+            except TelegramError:
+                pass  # Logged by the ticker, or nothing was sent.
+
+    def progress(self, d: Dict[str, Any]) -> None:
+        text = progress_text(self._link, d)
+        if not text:
+            return
+        self._latest = text
+        if self._coalescer:
+            self._coalescer.push(text)
+
+    async def stage(self, text: str) -> None:
+        self._latest = text
+        if self.status_message_id is not None:
+            await super().stage(text)
+
+    async def fail(self, text: str) -> None:
+        await self._stop_ticker()
+        if self.status_message_id is not None:
+            await super().stage(text)
+            return
+        try:
+            await self._reply(text[:3900])
+        except TelegramError as exc:
+            logger.warning("Could not report TikTok failure: %s", exc)
+
+    async def finish(self) -> None:
+        await self._stop_ticker()
+        await super().finish()
+
+
+def make_job_status(
+    mode: str,
+    message,
+    link: str,
+    *,
+    edit: EditFn,
+    delete: DeleteFn,
+    send_action: ChatActionFn,
+    edit_interval: float,
+    delay: float,
+) -> MessageJobStatus:
+    if mode == "chat_action":
+        return ChatActionJobStatus(
+            message,
+            link,
+            edit=edit,
+            delete=delete,
+            send_action=send_action,
+            edit_interval=edit_interval,
+            delay=delay,
+        )
+    return MessageJobStatus(
+        message, link, edit=edit, delete=delete, edit_interval=edit_interval
+    )
+
@@ -0,0 +1,312 @@
+"""
+SQLite record of TikTok jobs: resumes what a restart interrupted and, with
+leases, doubles as the work queue between an ingest node and worker processes.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+SENDING = "sending"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    thread_id INTEGER,
+    message_id INTEGER NOT NULL,
+    user_id INTEGER,
+    links TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    status_message_id INTEGER,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT,
+    lease_until REAL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+# Columns added after the first release; ALTERed into older files.
+_LATER_COLUMNS = (("owner", "TEXT"), ("lease_until", "REAL"))
+_COLUMNS = (
+    "id, chat_id, thread_id, message_id, user_id, links, stage,"
+    " status_message_id, attempts, created, updated"
+)
+
+
+@dataclass
+class StoredJob:
+    id: int
+    chat_id: int
+    thread_id: Optional[int]
+    message_id: int
+    user_id: Optional[int]
+    links: List[str]
+    stage: str
+    status_message_id: Optional[int]
+    attempts: int
+    created: float
+    updated: float
+
+
+def _job(row) -> StoredJob:
+    return StoredJob(*row[:5], json.loads(row[5]), *row[6:])  # type: ignore[arg-type]
+
+
+class JobQueue(ABC):
+    """
+    Durable TikTok jobs, one per accepted message (its links), gone when the
+    job ends; what is left belongs to jobs a shutdown or crash interrupted.
+    Jobs are claimed with an owner and a lease, so each is run by one process
+    at a time and goes back to the queue when its owner dies. Named leases
+    elect the single ingest node. Calls are short and synchronous.
+    """
+
+    @abstractmethod
+    def add(
+        self,
+        *,
+        chat_id: int,
+        thread_id: Optional[int],
+        message_id: int,
+        user_id: Optional[int],
+        links: List[str],
+        stage: str = QUEUED,
+    ) -> Optional[int]:
+        """New job id, or None when the same links of the same message are already queued."""
+
+    @abstractmethod
+    def set_stage(self, job_id: int, stage: str, status_message_id: Optional[int] = None) -> None:
+        ...
+
+    @abstractmethod
+    def claim(self, job_id: int, owner: str, lease: float) -> None:
+        """Take ``job_id`` for ``owner`` (a known job started locally) and count the attempt."""
+
+    @abstractmethod
+    def claim_next(self, owner: str, lease: float) -> Optional[StoredJob]:
+        """Oldest job nobody holds a live lease on, now held by ``owner``; None when idle."""
+
+    @abstractmethod
+    def renew(self, owner: str, lease: float) -> None:
+        """Extend the lease on every job ``owner`` holds (its heartbeat)."""
+
+    @abstractmethod
+    def release(self, job_id: int, started: bool = True) -> None:
+        """Put a job back for anyone to claim; ``started=False`` also takes back the attempt."""
+
+    @abstractmethod
+    def load(self, user_id: Optional[int], chat_id: int) -> Tuple[int, int, int]:
+        """Links queued or running: (for ``user_id``, for ``chat_id``, in total)."""
+
+    @abstractmethod
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the named lease; False while another owner holds it."""
+
+    @abstractmethod
+    def release_lease(self, name: str, owner: str) -> None:
+        ...
+
+    @abstractmethod
+    def finish(self, job_id: int) -> None:
+        ...
+
+    @abstractmethod
+    def unfinished(self) -> List[StoredJob]:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    @abstractmethod
+    def close(self) -> None:
+        ...
+
+
+class JobStore(JobQueue):
+    """
+    JobQueue in a local SQLite file. Writes are single-row statements on a WAL
+    database, cheap enough for the event loop.
+
+    Processes on the same host can share the file. WAL relies on shared memory
+    and file locks that network filesystems (NFS, SMB, most network volumes) do
+    not provide, so replicas on different hosts need another backend.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(_SCHEMA)
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for name, kind in _LATER_COLUMNS:
+            if name not in existing:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+
+    def add(
+        self,
+        *,
+        chat_id: int,
+        thread_id: Optional[int],
+        message_id: int,
+        user_id: Optional[int],
+        links: List[str],
+        stage: str = QUEUED,
+    ) -> Optional[int]:
+        """New job id, or None when the same links of the same message are already queued."""
+        now = time.time()
+        with self._lock:
+            duplicate = self._db.execute(
+                "SELECT 1 FROM jobs WHERE chat_id = ? AND message_id = ? AND links = ?",
+                (chat_id, message_id, json.dumps(links)),
+            ).fetchone()
+            if duplicate:
+                return None
+            cur = self._db.execute(
+                "INSERT INTO jobs (chat_id, thread_id, message_id, user_id, links, stage,"
+                " created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chat_id, thread_id, message_id, user_id, json.dumps(links), stage, now, now),
+            )
+            return int(cur.lastrowid)
+
+    def set_stage(self, job_id: int, stage: str, status_message_id: Optional[int] = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET stage = ?, status_message_id = COALESCE(?, status_message_id),"
+                " updated = ? WHERE id = ?",
+                (stage, status_message_id, time.time(), job_id),
+            )
+
+    def claim(self, job_id: int, owner: str, lease: float) -> None:
+        """Take ``job_id`` for ``owner`` (a known job started locally) and count the attempt."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET attempts = attempts + 1, owner = ?, lease_until = ?,"
+                " updated = ? WHERE id = ?",
+                (owner, now + lease, now, job_id),
+            )
+
+    def claim_next(self, owner: str, lease: float) -> Optional[StoredJob]:
+        """Oldest job nobody holds a live lease on, now held by ``owner``; None when idle."""
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    f"SELECT {_COLUMNS} FROM jobs"
+                    " WHERE owner IS NULL OR lease_until < ? ORDER BY id LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET attempts = attempts + 1, owner = ?, lease_until = ?,"
+                        " updated = ? WHERE id = ?",
+                        (owner, now + lease, now, row[0]),
+                    )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job = _job(row)
+        job.attempts += 1
+        return job
+
+    def renew(self, owner: str, lease: float) -> None:
+        """Extend the lease on every job ``owner`` holds (its heartbeat)."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ?", (time.time() + lease, owner)
+            )
+
+    def release(self, job_id: int, started: bool = True) -> None:
+        """Put a job back for anyone to claim; ``started=False`` also takes back the attempt."""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET owner = NULL, lease_until = NULL,"
+                " attempts = attempts - ? WHERE id = ?",
+                (0 if started else 1, job_id),
+            )
+
+    def load(self, user_id: Optional[int], chat_id: int) -> Tuple[int, int, int]:
+        """Links queued or running: (for ``user_id``, for ``chat_id``, in total)."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT TOTAL(CASE WHEN user_id = ? THEN n END),"
+                " TOTAL(CASE WHEN chat_id = ? THEN n END), TOTAL(n)"
+                " FROM (SELECT user_id, chat_id, json_array_length(links) AS n FROM jobs)",
+                (user_id, chat_id),
+            ).fetchone()
+        return int(row[0]), int(row[1]), int(row[2])
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the named lease; False while another owner holds it."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?)"
+                " ON CONFLICT(name) DO UPDATE SET owner = excluded.owner,"
+                " expires = excluded.expires WHERE leases.owner = excluded.owner"
+                " OR leases.expires < ?",
+                (name, owner, now + ttl, now),
+            )
+            row = self._db.execute("SELECT owner FROM leases WHERE name = ?", (name,)).fetchone()
+        return bool(row) and row[0] == owner
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def finish(self, job_id: int) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def unfinished(self) -> List[StoredJob]:
+        with self._lock:
+            rows = self._db.execute(f"SELECT {_COLUMNS} FROM jobs ORDER BY id").fetchall()
+        return [_job(row) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+# JOB_QUEUE_BACKEND -> factory taking the location (JOB_STORE_PATH).
+BACKENDS: Dict[str, Callable[[str], JobQueue]] = {"sqlite": JobStore}
+
+
+def open_job_queue(backend: str, location: str) -> JobQueue:
+    try:
+        factory = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(
+            f"Unknown JOB_QUEUE_BACKEND {backend!r} (known: {', '.join(sorted(BACKENDS))})"
+        ) from None
+    return factory(location)
@@ -0,0 +1,228 @@
+"""Run TikTok downloads in reusable worker processes with a hard per-job deadline."""
+
+from __future__ import annotations
+
+import asyncio
+import importlib
+import itertools
+import logging
+import multiprocessing
+import shutil
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DownloadResult = Tuple[bool, str, List[Dict]]
+ProgressHook = Callable[[Dict[str, Any]], None]
+
+_PROGRESS_KEYS = (
+    "status",
+    "downloaded_bytes",
+    "total_bytes",
+    "total_bytes_estimate",
+    "retry_in",
+    "job_dir",
+)
+# Progress status a download reports with each directory it creates: the parent
+# removes them when it has to kill the worker (the child cannot clean up then).
+JOB_DIR_STATUS = "job_dir"
+TIMED_OUT_MESSAGE = "❌ TikTok download took too long and was stopped. Try again later."
+CRASHED_MESSAGE = "❌ TikTok download failed unexpectedly."
+
+
+def _worker_main(conn, factory: str) -> None:
+    """Child process: one downloader (and its warm sessions) serving jobs from the pipe."""
+    send_lock = threading.Lock()
+
+    def send(msg) -> None:
+        with send_lock:
+            conn.send(msg)
+
+    # Metrics recorded here would die with the process; the parent records them.
+    metrics.set_sink(lambda event: send(("metric", 0, event)))
+    module_name, _, attr = factory.partition(":")
+    downloader = getattr(importlib.import_module(module_name), attr)()
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            return
+        if job is None:
+            return
+        job_id, url, attempt = job
+
+        def hook(d: Dict[str, Any], job_id=job_id) -> None:
+            # yt-dlp progress dicts carry the whole info_dict; only ship what the bot shows.
+            send(("progress", job_id, {k: d.get(k) for k in _PROGRESS_KEYS if k in d}))
+
+        try:
+            result = downloader.download_video(url, hook, attempt)
+        except Exception as exc:
+            logger.exception("Worker job crashed: %s", exc)
+            result = (False, CRASHED_MESSAGE, [])
+        send(("result", job_id, result))
+
+
+class _Worker:
+    def __init__(self, ctx, factory: str) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, factory), daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(timeout=5)
+        self.conn.close()
+
+
+class ProcessWorkerPool:
+    """
+    Up to ``size`` spawned workers, each running one job at a time. A job that
+    outlives ``deadline`` seconds gets its worker SIGKILLed; workers are replaced
+    after ``max_jobs`` jobs to cap memory growth. ``factory`` ("module:callable")
+    builds the object whose download_video(url, hook, attempt) each worker serves.
+    """
+
+    def __init__(
+        self,
+        size: int = 2,
+        *,
+        deadline: float = 180.0,
+        max_jobs: int = 50,
+        factory: str = "tiktok_downloader:TikTokDownloader",
+    ):
+        self._ctx = multiprocessing.get_context("spawn")
+        self._factory = factory
+        self._size = max(1, size)
+        self._deadline = deadline
+        self._max_jobs = max(1, max_jobs)
+        self._idle: List[_Worker] = []
+        self._live = 0
+        self._available: Optional[asyncio.Condition] = None
+        self._available_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ids = itertools.count(1)
+        self.killed = 0
+        self.recycled = 0
+
+    @property
+    def busy(self) -> int:
+        return self._live - len(self._idle)
+
+    def _condition(self) -> asyncio.Condition:
+        # Bound to the loop it is first used on; a rebuilt application runs on a new loop.
+        loop = asyncio.get_running_loop()
+        if self._available is None or self._available_loop is not loop:
+            self._available = asyncio.Condition()
+            self._available_loop = loop
+        return self._available
+
+    async def _acquire(self) -> _Worker:
+        async with self._condition():
+            while not self._idle and self._live >= self._size:
+                await self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._live += 1
+        try:
+            return await asyncio.to_thread(_Worker, self._ctx, self._factory)
+        except Exception:
+            await self._release(None)
+            raise
+
+    async def _release(self, worker: Optional[_Worker]) -> None:
+        async with self._condition():
+            if worker is None:
+                self._live -= 1
+            else:
+                self._idle.append(worker)
+            self._available.notify()
+
+    async def run(
+        self, url: str, progress_hook: Optional[ProgressHook] = None, attempt: int = 0
+    ) -> Any:
+        """What download_video returned, or a failed DownloadResult for a killed or lost worker."""
+        worker = await self._acquire()
+        job_id = next(self._ids)
+        loop = asyncio.get_running_loop()
+        done: asyncio.Future = loop.create_future()
+        job_dirs: List[str] = []
+
+        def on_readable() -> None:
+            try:
+                kind, msg_job, payload = worker.conn.recv()
+            except (EOFError, OSError) as exc:
+                if not done.done():
+                    done.set_exception(exc)
+                return
+            if kind == "metric":
+                metrics.REGISTRY.apply(payload)
+                return
+            if msg_job != job_id:
+                return
+            if kind == "progress":
+                if payload.get("status") == JOB_DIR_STATUS:
+                    job_dirs.append(payload["job_dir"])
+                elif progress_hook:
+                    progress_hook(payload)
+            elif not done.done():
+                done.set_result(payload)
+
+        keep = False
+        fd = worker.conn.fileno()
+        loop.add_reader(fd, on_readable)
+        try:
+            worker.conn.send((job_id, url, attempt))
+            result = await asyncio.wait_for(done, timeout=self._deadline)
+            worker.jobs += 1
+            keep = True
+            return result
+        except asyncio.TimeoutError:
+            logger.error(
+                "TikTok job exceeded %.0fs deadline; killing worker pid=%s",
+                self._deadline,
+                worker.process.pid,
+            )
+            self.killed += 1
+            return False, TIMED_OUT_MESSAGE, []
+        except (EOFError, OSError) as exc:
+            logger.error("TikTok worker pid=%s died: %s", worker.process.pid, exc)
+            return False, CRASHED_MESSAGE, []
+        finally:
+            loop.remove_reader(fd)
+            if keep and worker.jobs < self._max_jobs:
+                await self._release(worker)
+            else:
+                if keep:
+                    self.recycled += 1
+                    await asyncio.to_thread(worker.stop)
+                else:
+                    await asyncio.to_thread(worker.kill)
+                    # Partial media of the killed job would otherwise stay on disk.
+                    for path in job_dirs:
+                        await asyncio.to_thread(shutil.rmtree, path, True)
+                await self._release(None)
+
+    def close(self) -> None:
+        for worker in self._idle:
+            worker.stop()
+        self._idle.clear()
+        self._available = None
+        self._available_loop = None
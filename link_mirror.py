@@ -3,7 +3,7 @@
 from __future__ import annotations
 
 import re
-from typing import List, Optional, Sequence, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urlparse, urlunparse
 
 _TRAILING = frozenset(".,);:!?\"]'\u00bb")
@@ -107,11 +107,19 @@ def replace_instagram_hosts_checked(
     verify_preview: bool = True,
     preview_timeout: float = 8.0,
     fallback_unchecked: bool = True,
+    known: Optional[Dict[str, str]] = None,
+    picks: Optional[List[bool]] = None,
+    rank_unverified: bool = False,
 ) -> Tuple[str, bool]:
     """
     Rewrite instagram.com URLs using mirror_hosts in order.
     When verify_preview is True, probe each candidate URL before using it.
     URLs with no working mirror are left unchanged.
+    ``known`` maps URLs (as extract_instagram_urls returns them) to mirrors picked
+    earlier; those are reused without probing and new picks are added to it.
+    ``picks`` gets one bool per probed URL: whether a verified mirror was found.
+    With ``rank_unverified``, unverified URLs go to the best-ranked host for their
+    post type (see preview_check._hosts_for_instagram_url) instead of mirror_hosts[0].
     """
     if not mirror_hosts:
         return text, False
@@ -126,23 +134,39 @@ def replace_instagram_hosts_checked(
         nl = urlparse(u).netloc.lower().removeprefix("www.")
         if not u or not nl.endswith("instagram.com"):
             return raw_full
+        if known is not None and u in known:
+            changed = True
+            return known[u] + trailing
+
+        from preview_check import _hosts_for_instagram_url, pick_working_mirror
 
         if not verify_preview:
-            out = instagram_url_to_mirror(u, mirror_hosts[0]) + trailing
+            host = (
+                _hosts_for_instagram_url(u, mirror_hosts)[0]
+                if rank_unverified
+                else mirror_hosts[0]
+            )
+            out = instagram_url_to_mirror(u, host)
             changed = True
-            return out
-
-        from preview_check import pick_working_mirror
+            if known is not None:
+                known[u] = out
+            return out + trailing
 
         picked = pick_working_mirror(u, mirror_hosts, timeout=preview_timeout)
+        if picks is not None:
+            picks.append(picked is not None)
         if not picked:
             if fallback_unchecked:
                 mirrored = instagram_url_to_mirror(u, _unchecked_fallback_host(mirror_hosts))
                 changed = True
+                if known is not None:
+                    known[u] = mirrored
                 return mirrored + trailing
             return raw_full
         mirrored, _host = picked
         changed = True
+        if known is not None:
+            known[u] = mirrored
         return mirrored + trailing
 
     out = _INSTAGRAM_RE.sub(repl, text)
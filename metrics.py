@@ -0,0 +1,254 @@
+"""In-process Prometheus-style metrics (text exposition format) for /metrics."""
+
+from __future__ import annotations
+
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+MetricEvent = Tuple[str, str, LabelKey, float]
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SCORE_BUCKETS = (0, 1, 2, 5, 10, 15, 20, 30)
+
+# Set in worker processes: events go to the parent instead of the local registry.
+_sink: Optional[Callable[[MetricEvent], None]] = None
+
+
+def set_sink(sink: Optional[Callable[[MetricEvent], None]]) -> None:
+    global _sink
+    _sink = sink
+
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> LabelKey:
+    if set(labels) != set(labelnames):
+        raise ValueError(f"expected labels {tuple(labelnames)}, got {tuple(labels)}")
+    return tuple((name, str(labels[name])) for name in labelnames)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: LabelKey = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _emit(self, op: str, value: float, labels: Dict[str, Any]) -> None:
+        key = _label_key(self.labelnames, labels)
+        if _sink is not None:
+            _sink((self.name, op, key, value))
+        else:
+            self.apply(op, key, value)
+
+    @abstractmethod
+    def apply(self, op: str, key: LabelKey, value: float) -> None:
+        """Apply one recorded event locally (or one forwarded from a worker process)."""
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        """Exposition lines for this metric, without the HELP/TYPE header."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        self._emit("inc", amount, labels)
+
+    def apply(self, op: str, key: LabelKey, value: float) -> None:
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self._values.items()
+            ]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: Any) -> None:
+        self._emit("set", value, labels)
+
+    def apply(self, op: str, key: LabelKey, value: float) -> None:
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            return [
+                f"{self.name}{_fmt_labels(k)} {_fmt_value(v)}" for k, v in self._values.items()
+            ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series: Dict[LabelKey, List[float]] = {}
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        self._emit("observe", value, labels)
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[Dict[str, Any]]:
+        """Observe the block's duration; the yielded dict can still change labels."""
+        started = time.perf_counter()
+        labels = dict(labels)
+        try:
+            yield labels
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def apply(self, op: str, key: LabelKey, value: float) -> None:
+        with self._lock:
+            # Per-bucket counts, then sum and count.
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels: Any) -> float:
+        with self._lock:
+            series = self._series.get(_label_key(self.labelnames, labels))
+            return series[-1] if series else 0.0
+
+    def samples(self) -> List[str]:
+        lines: List[str] = []
+        with self._lock:
+            for key, series in self._series.items():
+                cumulative = 0.0
+                for bound, n in zip(self.buckets, series):
+                    cumulative += n
+                    le = (("le", _fmt_value(bound)),)
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, le)} {_fmt_value(cumulative)}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(series[-2])}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {_fmt_value(series[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Callable[[], None]] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self._metrics[metric.name] = metric
+
+    def on_collect(self, name: str, fn: Callable[[], None]) -> None:
+        """Run ``fn`` before each render (e.g. to refresh queue-depth gauges); replaces ``name``."""
+        self._collectors[name] = fn
+
+    def apply(self, event: MetricEvent) -> None:
+        """Record an event forwarded from a worker process."""
+        name, op, key, value = event
+        metric = self._metrics.get(name)
+        if metric is not None:
+            metric.apply(op, tuple(tuple(p) for p in key), value)
+
+    def render(self) -> str:
+        for fn in list(self._collectors.values()):
+            fn()
+        out: List[str] = []
+        for metric in self._metrics.values():
+            out.append(f"# HELP {metric.name} {metric.documentation}")
+            out.append(f"# TYPE {metric.name} {metric.kind}")
+            out.extend(metric.samples())
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+PREVIEW_FETCH_SECONDS = Histogram(
+    "preview_fetch_seconds", "Mirror preview fetch + score latency", ["mirror"]
+)
+PREVIEW_SCORE = Histogram(
+    "preview_score", "Preview score per mirror probe (0 = unusable)", ["mirror"], SCORE_BUCKETS
+)
+PREVIEW_SLO_TRANSITIONS_TOTAL = Counter(
+    "preview_slo_transitions_total", "Preview verification mode changes", ["to"]
+)
+MIRROR_PICK_SECONDS = Histogram(
+    "mirror_pick_seconds", "pick_working_mirror end-to-end time", ["result"]
+)
+TIKTOK_EXTRACT_SECONDS = Histogram("tiktok_extract_seconds", "yt-dlp extract_info time")
+TIKTOK_DOWNLOAD_SECONDS = Histogram(
+    "tiktok_download_seconds", "Media download time", ["method"]
+)
+TIKTOK_JOBS_TOTAL = Counter("tiktok_jobs_total", "Finished TikTok download jobs", ["result"])
+FFMPEG_NORMALIZE_SECONDS = Histogram(
+    "ffmpeg_normalize_seconds", "ffmpeg normalize time", ["mode"]
+)
+UPLOAD_SECONDS = Histogram("telegram_upload_seconds", "Media upload time", ["kind"])
+UPLOAD_BYTES_TOTAL = Counter("telegram_upload_bytes_total", "Media bytes uploaded", ["kind"])
+TELEGRAM_API_SECONDS = Histogram(
+    "telegram_api_seconds", "Bot API call latency", ["method"]
+)
+TELEGRAM_API_ERRORS_TOTAL = Counter(
+    "telegram_api_errors_total", "Failed Bot API calls", ["method", "error"]
+)
+TELEGRAM_RATE_LIMIT_WAIT_SECONDS = Histogram(
+    "telegram_rate_limit_wait_seconds", "Time a Bot API call waited for send budget", ["priority"]
+)
+TELEGRAM_RETRY_AFTER_TOTAL = Counter(
+    "telegram_retry_after_total", "RetryAfter (flood control) answers by method", ["method"]
+)
+ADMISSION_REJECTED_TOTAL = Counter(
+    "admission_rejected_total", "Media jobs refused by admission control", ["reason"]
+)
+UPDATE_HANDLE_SECONDS = Histogram("update_handle_seconds", "Update handler run time")
+UPDATE_WAIT_SECONDS = Histogram(
+    "update_wait_seconds", "Time an update waited for its chat and a free slot"
+)
+QUEUE_DEPTH = Gauge("queue_depth", "Items waiting or running per queue", ["queue"])
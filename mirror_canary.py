@@ -0,0 +1,139 @@
+"""Background mirror probes that keep host rankings and connections warm off the hot path."""
+
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
+from link_mirror import instagram_url_to_mirror
+from mirror_stats import MIRROR_STATS
+from preview_check import fetch_preview_score, post_kind, warm_connection
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("reel", "photo")
+
+
+def _canary_urls(shortcodes: Sequence[str], kind: str) -> List[str]:
+    path = "p" if kind == "photo" else "reel"
+    return [f"https://www.instagram.com/{path}/{code.strip()}/" for code in shortcodes if code.strip()]
+
+
+class MirrorCanary:
+    """
+    Every ``interval`` seconds probe up to ``budget`` (host, post type) pairs
+    with fetch_preview_score and feed MIRROR_STATS, so a broken mirror is
+    usually found here rather than on a user's link. Canary posts are the
+    configured shortcodes plus the last few Instagram links users sent. Pairs
+    rotate across cycles when the budget is smaller than hosts x types.
+    Between cycles, hosts whose last probe worked get a HEAD every
+    ``warm_interval`` seconds to keep a pooled connection open.
+    """
+
+    def __init__(
+        self,
+        hosts: Sequence[str],
+        *,
+        reels: Sequence[str] = (),
+        photos: Sequence[str] = (),
+        interval: float = 300.0,
+        budget: int = 6,
+        timeout: float = 6.0,
+        warm_interval: float = 45.0,
+        recent: int = 5,
+    ):
+        self.hosts = list(hosts)
+        self.interval = max(1.0, interval)
+        self.budget = max(1, budget)
+        self.timeout = timeout
+        self.warm_interval = warm_interval
+        self._configured = {"reel": _canary_urls(reels, "reel"), "photo": _canary_urls(photos, "photo")}
+        self._recent: Dict[str, Deque[str]] = {kind: deque(maxlen=recent) for kind in KINDS}
+        self._pairs = itertools.cycle([(h, k) for h in self.hosts for k in KINDS])
+        self._samples = {kind: itertools.count() for kind in KINDS}
+        self._task: Optional[asyncio.Task] = None
+        self.last: Dict[str, Dict[str, Any]] = {}
+        self.cycles = 0
+
+    def observe(self, instagram_url: str) -> None:
+        """Remember a real post a user linked as a canary candidate."""
+        recent = self._recent[post_kind(instagram_url)]
+        if instagram_url not in recent:
+            recent.append(instagram_url)
+
+    def _sample(self, kind: str) -> Optional[str]:
+        urls = self._configured[kind] + list(self._recent[kind])
+        if not urls:
+            return None
+        return urls[next(self._samples[kind]) % len(urls)]
+
+    def start(self) -> None:
+        if self.hosts and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _run(self) -> None:
+        next_cycle = time.monotonic()
+        while True:
+            if time.monotonic() >= next_cycle:
+                try:
+                    await self.run_cycle()
+                except Exception:
+                    logger.exception("Mirror canary cycle failed")
+                next_cycle = time.monotonic() + self.interval
+            elif self.warm_interval > 0:
+                await self.warm()
+            pause = next_cycle - time.monotonic()
+            if self.warm_interval > 0:
+                pause = min(pause, self.warm_interval)
+            await asyncio.sleep(max(0.0, pause))
+
+    async def run_cycle(self) -> List[Tuple[str, str, int]]:
+        """Probe up to ``budget`` pairs; returns (host, kind, score) for each probe made."""
+        results = []
+        pairs = [next(self._pairs) for _ in range(min(self.budget, len(self.hosts) * len(KINDS)))]
+        for host, kind in pairs:
+            url = self._sample(kind)
+            if url is None:
+                continue
+            score = await asyncio.to_thread(
+                fetch_preview_score,
+                instagram_url_to_mirror(url, host),
+                self.timeout,
+                instagram_url=url,
+            )
+            MIRROR_STATS.record(host, kind, score > 0)
+            self.last[f"{host}/{kind}"] = {"score": score, "at": round(time.time())}
+            results.append((host, kind, score))
+        self.cycles += 1
+        return results
+
+    def healthy_hosts(self) -> List[str]:
+        return [
+            host
+            for host in self.hosts
+            if any(self.last.get(f"{host}/{kind}", {}).get("score", 0) > 0 for kind in KINDS)
+        ]
+
+    async def warm(self) -> None:
+        for host in self.healthy_hosts():
+            await asyncio.to_thread(warm_connection, host, self.timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "cycles": self.cycles,
+            "canaries": {kind: len(self._configured[kind]) + len(self._recent[kind]) for kind in KINDS},
+            "last": dict(self.last),
+        }
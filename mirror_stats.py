@@ -0,0 +1,101 @@
+"""Per-host, per-post-type preview success model used to rank Instagram mirrors."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+# Until a host has this many outcomes for a post type, it ranks on the prior.
+MIN_SAMPLES = 3
+PRIOR = 0.75
+ALPHA = 0.2
+
+
+class _HostStat:
+    __slots__ = ("rate", "samples", "since_check", "updated")
+
+    def __init__(self) -> None:
+        self.rate = PRIOR
+        self.samples = 0
+        self.since_check = 0
+        self.updated = 0.0
+
+
+class MirrorStats:
+    """
+    EWMA of preview outcomes (usable / not) per (host, kind), kind being
+    "photo" or "reel". rank() orders hosts by expected success, keeping the
+    given order among equals. A host that has succeeded often enough for a
+    kind is "trusted": picks skip the HTML probe, except every
+    ``recheck_every``-th pick, which probes anyway so the model stays current.
+    Shared by worker threads, hence the lock.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._stats: Dict[Tuple[str, str], _HostStat] = {}
+        self.trust_rate = 0.0
+        self.trust_min_samples = 20
+        self.recheck_every = 10
+
+    def configure(self, *, trust_rate: float, trust_min_samples: int, recheck_every: int) -> None:
+        """``trust_rate`` <= 0 disables skipping probes."""
+        self.trust_rate = trust_rate
+        self.trust_min_samples = max(1, trust_min_samples)
+        self.recheck_every = max(1, recheck_every)
+
+    def _stat(self, host: str, kind: str) -> _HostStat:
+        key = (host, kind)
+        stat = self._stats.get(key)
+        if stat is None:
+            stat = self._stats[key] = _HostStat()
+        return stat
+
+    def record(self, host: str, kind: str, ok: bool) -> None:
+        with self._lock:
+            stat = self._stat(host, kind)
+            stat.rate += ALPHA * ((1.0 if ok else 0.0) - stat.rate)
+            stat.samples += 1
+            stat.since_check = 0
+            stat.updated = time.time()
+
+    def expected(self, host: str, kind: str) -> float:
+        with self._lock:
+            stat = self._stats.get((host, kind))
+            if stat is None or stat.samples < MIN_SAMPLES:
+                return PRIOR
+            return stat.rate
+
+    def rank(self, hosts: Sequence[str], kind: str) -> List[str]:
+        scores = {h: self.expected(h, kind) for h in hosts}
+        return sorted(hosts, key=lambda h: -scores[h])
+
+    def trusted(self, host: str, kind: str) -> bool:
+        """True when this pick may skip probing ``host`` (counts towards the next recheck)."""
+        if self.trust_rate <= 0:
+            return False
+        with self._lock:
+            stat = self._stats.get((host, kind))
+            if (
+                stat is None
+                or stat.samples < self.trust_min_samples
+                or stat.rate < self.trust_rate
+            ):
+                return False
+            stat.since_check += 1
+            return stat.since_check < self.recheck_every
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                f"{host}/{kind}": {"rate": round(s.rate, 3), "samples": s.samples}
+                for (host, kind), s in sorted(self._stats.items())
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+
+MIRROR_STATS = MirrorStats()
@@ -4,12 +4,16 @@ from __future__ import annotations
 
 import logging
 import re
+import threading
 from typing import List, Optional, Sequence, Tuple
 from urllib.parse import urlparse
 
 import httpx
 
 from link_mirror import instagram_url_to_mirror
+from metrics import MIRROR_PICK_SECONDS, PREVIEW_FETCH_SECONDS, PREVIEW_SCORE
+from mirror_stats import MIRROR_STATS
+from tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -69,6 +73,11 @@ def is_photo_post(instagram_url: str) -> bool:
     return "/p/" in path
 
 
+def post_kind(instagram_url: str) -> str:
+    """Bucket for MIRROR_STATS: mirrors succeed very differently on photos and reels."""
+    return "photo" if is_photo_post(instagram_url) else "reel"
+
+
 def _normalize_og_url(raw: str, page_url: str) -> str:
     u = raw.strip().replace("&amp;", "&")
     if u.startswith("//"):
@@ -153,15 +162,57 @@ def preview_score(html: str, *, photo_post: bool = False, page_url: str = "") ->
     return score
 
 
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+# Set by use_transport (load tests against local fake mirrors); None = the network.
+_transport: Optional[httpx.BaseTransport] = None
+
+
+def _http_client() -> httpx.Client:
+    """One pooled client for all probes, so mirrors keep warm TLS connections between picks."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = httpx.Client(
+                follow_redirects=True,
+                headers=_FETCH_HEADERS,
+                limits=httpx.Limits(
+                    max_connections=64, max_keepalive_connections=32, keepalive_expiry=90
+                ),
+                transport=_transport,
+            )
+        return _client
+
+
+def close_http_client() -> None:
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+def use_transport(transport: Optional[httpx.BaseTransport]) -> None:
+    """Send every probe through ``transport`` from now on (None: back to the network)."""
+    global _transport
+    close_http_client()
+    _transport = transport
+
+
+def warm_connection(host: str, timeout: float = 5.0) -> bool:
+    """HEAD the mirror's front page so the next probe reuses an open connection."""
+    try:
+        _http_client().head(f"https://www.{host}/", timeout=timeout, follow_redirects=False)
+        return True
+    except httpx.HTTPError as exc:
+        logger.debug("Warm-up of %s failed: %s", host, exc)
+        return False
+
+
 def _fetch_preview_html(url: str, timeout: float) -> Tuple[Optional[str], Optional[str], int]:
     """Return (html, final_url, http_status) or (None, None, 0) on failure."""
     try:
-        with httpx.Client(
-            follow_redirects=True,
-            timeout=timeout,
-            headers=_FETCH_HEADERS,
-        ) as client:
-            resp = client.get(url)
+        resp = _http_client().get(url, timeout=timeout)
         return resp.text, str(resp.url), resp.status_code
     except Exception as exc:
         logger.warning("Preview probe failed for %s: %s", url, exc)
@@ -178,6 +229,14 @@ def fetch_preview_score(
     *,
     instagram_url: Optional[str] = None,
 ) -> int:
+    mirror = urlparse(url).netloc or "unknown"
+    with span("preview.probe", mirror=mirror), PREVIEW_FETCH_SECONDS.time(mirror=mirror):
+        score = _fetch_preview_score(url, timeout, instagram_url)
+    PREVIEW_SCORE.observe(score, mirror=mirror)
+    return score
+
+
+def _fetch_preview_score(url: str, timeout: float, instagram_url: Optional[str]) -> int:
     html, final, status = _fetch_preview_html(url, timeout)
     if not html or not final:
         return 0
@@ -209,20 +268,34 @@ def pick_working_mirror(
     mirror_hosts: Sequence[str],
     *,
     timeout: float = 8.0,
+) -> Optional[Tuple[str, str]]:
+    with MIRROR_PICK_SECONDS.time(result="error") as labels:
+        picked = _pick_working_mirror(instagram_url, mirror_hosts, timeout)
+        labels["result"] = "found" if picked else "none"
+    return picked
+
+
+def _pick_working_mirror(
+    instagram_url: str, mirror_hosts: Sequence[str], timeout: float
 ) -> Optional[Tuple[str, str]]:
     best: Optional[Tuple[str, str]] = None
     best_score = 0
     per_host = min(timeout, 6.0)
     photo = is_photo_post(instagram_url)
+    kind = post_kind(instagram_url)
     hosts = _hosts_for_instagram_url(instagram_url, mirror_hosts)
     for host in hosts:
         host = host.strip()
         if not host:
             continue
         mirrored = instagram_url_to_mirror(instagram_url, host)
+        if MIRROR_STATS.trusted(host, kind):
+            logger.info("Preview probe skipped for %s (%s reliable for %ss)", mirrored, host, kind)
+            return mirrored, host
         score = fetch_preview_score(
             mirrored, timeout=per_host, instagram_url=instagram_url
         )
+        MIRROR_STATS.record(host, kind, score > 0)
         if score > best_score:
             best_score = score
             best = (mirrored, host)
@@ -239,7 +312,10 @@ PREFERRED_MIRROR_HOSTS = ("instagram7.com", "eeinstagram.com")
 def _hosts_for_instagram_url(
     instagram_url: str, mirror_hosts: Sequence[str]
 ) -> List[str]:
-    """Reels: ee first. Photo posts (/p/): instagram7 first."""
+    """
+    Reels: ee first. Photo posts (/p/): instagram7 first. Then reordered by the
+    observed preview success rate for that post type (stable among equals).
+    """
     preferred = (
         ("instagram7.com", "eeinstagram.com")
         if is_photo_post(instagram_url)
@@ -257,7 +333,7 @@ def _hosts_for_instagram_url(
     for n in normalized:
         if n not in ranked:
             ranked.append(n)
-    return ranked
+    return MIRROR_STATS.rank(ranked, post_kind(instagram_url))
 
 
 def mirror_host_chain(primary: str, fallbacks: Sequence[str]) -> List[str]:
@@ -0,0 +1,130 @@
+"""Latency/success SLO for verified Instagram mirror picks, with automatic degradation."""
+
+from __future__ import annotations
+
+import logging
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from metrics import PREVIEW_SLO_TRANSITIONS_TOTAL
+
+logger = logging.getLogger(__name__)
+
+VERIFIED = "verified"
+DEGRADED = "degraded"
+RECOVERING = "recovering"
+
+# Below 20 samples the rolling p95 is simply the slowest call; judge nothing on it.
+_MIN_SAMPLES = 20
+_RECOVERY_START = 0.1
+
+
+class PreviewSLO:
+    """
+    Verified: every message is probed. When the rolling p95 of verified calls
+    exceeds ``p95_budget`` or their success rate drops below ``min_success``,
+    switch to degraded: replies go out unchecked on the best-ranked mirror.
+    After ``cooldown`` seconds, recovering: a growing share of messages is
+    verified again (10%, doubling after each call within budget); one call
+    over budget goes back to degraded, reaching 100% returns to verified.
+    """
+
+    def __init__(
+        self,
+        *,
+        p95_budget: float,
+        min_success: float,
+        window: float = 300.0,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.p95_budget = p95_budget
+        self.min_success = min_success
+        self.window = window
+        self.cooldown = cooldown
+        self._clock = clock
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=500)
+        self.state = VERIFIED
+        self._since = clock()
+        self._share = 1.0
+        self._skip = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    def _set_state(self, state: str, reason: str) -> None:
+        if state == self.state:
+            return
+        logger.warning("Preview verification %s -> %s (%s)", self.state, state, reason)
+        self.transitions.append(
+            {"from": self.state, "to": state, "reason": reason, "at": round(time.time())}
+        )
+        PREVIEW_SLO_TRANSITIONS_TOTAL.inc(to=state)
+        self.state = state
+        self._since = self._clock()
+        # Recovery starts with a probe right away, then one per 1/share messages.
+        self._skip = 0
+        self._share = _RECOVERY_START if state == RECOVERING else 1.0
+        if state != VERIFIED:
+            # Judge the recovered mirrors on fresh samples only.
+            self._samples.clear()
+
+    def should_verify(self) -> bool:
+        """Whether this message's links should be probed; call once per message."""
+        if self.state == DEGRADED:
+            if self._clock() - self._since < self.cooldown:
+                return False
+            self._set_state(RECOVERING, f"{self.cooldown:.0f}s cooldown over")
+        if self.state == VERIFIED:
+            return True
+        if self._skip > 0:
+            self._skip -= 1
+            return False
+        self._skip = round(1 / self._share) - 1
+        return True
+
+    def _stats(self, now: float) -> Tuple[Optional[float], Optional[float], int]:
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+        n = len(self._samples)
+        if not n:
+            return None, None, 0
+        durations: List[float] = sorted(d for _, d, _ in self._samples)
+        p95 = durations[min(n - 1, int(0.95 * n))]
+        success = sum(1 for *_, ok in self._samples if ok) / n
+        return p95, success, n
+
+    def observe(self, duration: float, ok: bool) -> None:
+        """Record one verified call: its latency and whether every link got a verified mirror."""
+        now = self._clock()
+        self._samples.append((now, duration, ok))
+        if self.state == RECOVERING:
+            if duration > self.p95_budget or not ok:
+                self._set_state(
+                    DEGRADED, f"recovery probe took {duration:.1f}s ok={ok}"
+                )
+                return
+            self._share = min(1.0, self._share * 2)
+            if self._share >= 1.0:
+                self._set_state(VERIFIED, "recovery probes within budget")
+            return
+        if self.state != VERIFIED:
+            return
+        p95, success, n = self._stats(now)
+        if n < _MIN_SAMPLES:
+            return
+        if p95 > self.p95_budget:
+            self._set_state(DEGRADED, f"p95 {p95:.1f}s > {self.p95_budget:.1f}s")
+        elif success < self.min_success:
+            self._set_state(DEGRADED, f"success {success:.0%} < {self.min_success:.0%}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95, success, n = self._stats(self._clock())
+        return {
+            "state": self.state,
+            "for_s": round(self._clock() - self._since),
+            "verify_share": round(self._share, 2) if self.state != DEGRADED else 0.0,
+            "p95_s": round(p95, 3) if p95 is not None else None,
+            "success": round(success, 3) if success is not None else None,
+            "samples": n,
+            "transitions": list(self.transitions),
+        }
@@ -0,0 +1,139 @@
+"""Parallel byte-range download of one media file over a pooled keep-alive client."""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class RangedDownloadError(Exception):
+    """The server does not support ranges or a chunk kept failing."""
+
+
+def make_pooled_client(concurrency: int, timeout: float = 30.0) -> httpx.Client:
+    """One keep-alive connection per chunk worker, reused across downloads."""
+    return httpx.Client(
+        follow_redirects=True,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=max(1, concurrency) * 2,
+            max_keepalive_connections=max(1, concurrency) * 2,
+        ),
+    )
+
+
+def probe_range_support(
+    client: httpx.Client, url: str, headers: Optional[Dict[str, str]] = None
+) -> Optional[int]:
+    """Total size when the server answers a one-byte Range GET with 206, else None."""
+    try:
+        with client.stream("GET", url, headers={**(headers or {}), "Range": "bytes=0-0"}) as resp:
+            total = resp.headers.get("content-range", "").rpartition("/")[2]
+            if resp.status_code == 206 and total.isdigit():
+                return int(total)
+    except httpx.HTTPError as exc:
+        logger.warning("Range probe failed for %s: %s", url[:80], exc)
+    return None
+
+
+def split_ranges(size: int, chunk_size: int) -> List[Tuple[int, int]]:
+    """Inclusive (start, end) byte ranges covering ``size`` bytes."""
+    chunk_size = max(1, chunk_size)
+    return [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+
+
+def download_ranged(
+    url: str,
+    dest: str,
+    *,
+    client: httpx.Client,
+    headers: Optional[Dict[str, str]] = None,
+    size: Optional[int] = None,
+    concurrency: int = 4,
+    chunk_size: int = 4 * 1024 * 1024,
+    retries: int = 3,
+    progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> int:
+    """
+    Fetch ``url`` into ``dest`` with ``concurrency`` parallel Range requests.
+    The file is preallocated and each chunk is written in place; a failed chunk
+    resumes from its last written byte. Returns the file size.
+    """
+    headers = dict(headers or {})
+    if size is None:
+        size = probe_range_support(client, url, headers)
+    if not size:
+        raise RangedDownloadError("server did not report a size for ranged download")
+
+    part = dest + ".part"
+    with open(part, "wb") as f:
+        f.truncate(size)
+
+    lock = threading.Lock()
+    done = 0
+
+    def add_progress(n: int) -> None:
+        nonlocal done
+        with lock:
+            done += n
+            current = done
+        if progress_hook:
+            progress_hook(
+                {"status": "downloading", "downloaded_bytes": current, "total_bytes": size}
+            )
+
+    def fetch(byte_range: Tuple[int, int]) -> None:
+        start, end = byte_range
+        offset = start
+        for attempt in range(retries + 1):
+            try:
+                req_headers = {**headers, "Range": f"bytes={offset}-{end}"}
+                with client.stream("GET", url, headers=req_headers) as resp:
+                    if resp.status_code != 206:
+                        raise RangedDownloadError(
+                            f"HTTP {resp.status_code} for range {offset}-{end}"
+                        )
+                    with open(part, "r+b") as f:
+                        f.seek(offset)
+                        for block in resp.iter_bytes(64 * 1024):
+                            block = block[: end + 1 - offset]
+                            if not block:
+                                break
+                            f.write(block)
+                            offset += len(block)
+                            add_progress(len(block))
+                if offset > end:
+                    return
+                raise RangedDownloadError(f"short read at {offset} for range {start}-{end}")
+            except (httpx.HTTPError, RangedDownloadError, OSError) as exc:
+                if attempt >= retries:
+                    raise RangedDownloadError(
+                        f"range {start}-{end} failed after {retries + 1} attempts: {exc}"
+                    ) from exc
+                logger.info("Retrying range %s-%s from %s: %s", start, end, offset, exc)
+                time.sleep(min(2.0, 0.25 * (2 ** attempt)))
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=max(1, concurrency), thread_name_prefix="ranged"
+        ) as pool:
+            for _ in pool.map(fetch, split_ranges(size, chunk_size)):
+                pass
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+    os.replace(part, dest)
+    if progress_hook:
+        progress_hook({"status": "finished", "downloaded_bytes": size, "total_bytes": size})
+    return size
@@ -0,0 +1,153 @@
+"""Adaptive token bucket for requests to TikTok (AIMD on 403/429, honours Retry-After)."""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class RetryLater:
+    """
+    A throttled job's answer instead of a result: run it again after ``delay``
+    seconds, or report ``message`` when giving up. The caller waits, so it can
+    free the job's download slot meanwhile.
+    """
+
+    delay: float
+    message: str
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _error_chain(exc: BaseException) -> Iterator[BaseException]:
+    """``exc`` and every error it wraps (causes, context, yt-dlp's exc_info)."""
+    stack = [exc]
+    seen = set()
+    while stack:
+        err = stack.pop()
+        if err is None or id(err) in seen:
+            continue
+        seen.add(id(err))
+        yield err
+        stack += [getattr(err, "cause", None), err.__cause__, err.__context__]
+        exc_info = getattr(err, "exc_info", None)
+        if exc_info and len(exc_info) > 1:
+            stack.append(exc_info[1])
+
+
+def retry_after_from_error(exc: BaseException) -> Optional[float]:
+    """Walk a yt-dlp/httpx error chain for an HTTP response carrying Retry-After."""
+    for err in _error_chain(exc):
+        headers = getattr(getattr(err, "response", None), "headers", None)
+        if headers is not None:
+            delay = parse_retry_after(headers.get("Retry-After"))
+            if delay is not None:
+                return delay
+    return None
+
+
+def http_status_from_error(exc: BaseException) -> Optional[int]:
+    """HTTP status carried by an error in a yt-dlp/httpx/urllib chain, if any."""
+    for err in _error_chain(exc):
+        response = getattr(err, "response", None)
+        for status in (
+            getattr(err, "status", None),
+            getattr(response, "status", None),
+            getattr(response, "status_code", None),
+        ):
+            if isinstance(status, int) and 100 <= status < 600:
+                return status
+    return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full-jitter exponential backoff for retry number ``attempt`` (0-based)."""
+    return random.uniform(base / 2, min(cap, base * (2 ** attempt)))
+
+
+class AdaptiveTokenBucket:
+    """
+    Thread-safe token bucket. A 403/429 halves the refill rate (down to ``min_rate``)
+    and pauses everyone until Retry-After; each success adds back a little rate.
+    """
+
+    def __init__(
+        self,
+        rate_per_minute: float,
+        burst: int = 5,
+        *,
+        min_rate_per_minute: Optional[float] = None,
+    ):
+        self._base_rate = max(0.01, rate_per_minute / 60.0)
+        self._min_rate = (
+            max(0.01, min_rate_per_minute / 60.0)
+            if min_rate_per_minute
+            else self._base_rate / 8
+        )
+        self._rate = self._base_rate
+        self._burst = max(1, burst)
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.penalties = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a token is available; returns the seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.waited_seconds += waited
+                    return waited
+                wait = max(self._blocked_until - now, (1 - self._tokens) / self._rate)
+            time.sleep(wait)
+            waited += wait
+
+    def penalize(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._rate = max(self._min_rate, self._rate / 2)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self.penalties += 1
+
+    def reward(self) -> None:
+        with self._lock:
+            self._rate = min(self._base_rate, self._rate + self._base_rate / 10)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rate_per_minute": round(self._rate * 60, 2),
+                "base_rate_per_minute": round(self._base_rate * 60, 2),
+                "blocked_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 1),
+                "penalties": self.penalties,
+                "waited_s": round(self.waited_seconds, 1),
+            }
@@ -0,0 +1,309 @@
+"""Outbound Bot API pacing: global + per-chat budgets, priorities, RetryAfter requeue."""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Tuple, Union
+
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+from metrics import TELEGRAM_RATE_LIMIT_WAIT_SECONDS, TELEGRAM_RETRY_AFTER_TOTAL
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_REPLY = 0
+PRIORITY_DEFAULT = 1
+PRIORITY_COSMETIC = 2
+
+# Status edits, cleanup and typing indicators may wait; replies users asked for may not.
+ENDPOINT_PRIORITY = {
+    "editMessageText": PRIORITY_COSMETIC,
+    "deleteMessage": PRIORITY_COSMETIC,
+    "sendChatAction": PRIORITY_COSMETIC,
+    "sendMessage": PRIORITY_REPLY,
+    "sendVideo": PRIORITY_REPLY,
+    "sendDocument": PRIORITY_REPLY,
+    "sendMediaGroup": PRIORITY_REPLY,
+}
+# Typing indicators don't count as messages; they only use the global budget.
+CHAT_BUDGET_EXEMPT = frozenset({"sendChatAction"})
+# Cosmetic calls on one message that don't wait for the chat's budget: with none left they
+# are sent later in the background, only the latest per message (an edit superseded by a
+# newer edit or a delete is skipped). The caller gets True at once.
+DEFERRABLE = frozenset({"editMessageText", "deleteMessage"})
+_PRIORITY_NAMES = {
+    PRIORITY_REPLY: "reply",
+    PRIORITY_DEFAULT: "default",
+    PRIORITY_COSMETIC: "cosmetic",
+}
+_IDLE_CHAT_TTL = 600.0
+
+
+class _Bucket:
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def wait(self, now: float) -> float:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        need = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(need, self.blocked_until - now)
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+
+def request_priority(endpoint: str, rate_limit_args: Any) -> int:
+    """``rate_limit_args`` may be an int or {"priority": int}; otherwise by endpoint."""
+    if isinstance(rate_limit_args, int):
+        return rate_limit_args
+    if isinstance(rate_limit_args, dict) and "priority" in rate_limit_args:
+        return int(rate_limit_args["priority"])
+    return ENDPOINT_PRIORITY.get(endpoint, PRIORITY_DEFAULT)
+
+
+class PriorityRateLimiter(BaseRateLimiter):
+    """
+    Requests that target a chat wait for a global token and a per-chat token
+    (Telegram: ~30 msg/s overall, ~1/s per private chat, ~20/min per group).
+    Waiters are granted lowest priority value first, FIFO within a priority;
+    a chat that is out of budget never holds up other chats. On RetryAfter the
+    chat (or everyone, for chat-less calls) is paused and the request requeued.
+    Cosmetic edits and deletes (DEFERRABLE) never wait: without budget they
+    are coalesced per message and sent once the chat has a token again.
+    """
+
+    def __init__(
+        self,
+        *,
+        global_per_second: float = 30.0,
+        private_per_second: float = 1.0,
+        group_per_minute: float = 20.0,
+        max_retries: int = 3,
+    ):
+        self._global = _Bucket(global_per_second, global_per_second)
+        self._private_rate = private_per_second
+        self._group_rate = group_per_minute / 60.0
+        self._max_retries = max(0, max_retries)
+        self._chats: Dict[Any, _Bucket] = {}
+        self._waiters: List[Tuple[int, int, Any, asyncio.Future]] = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._last_prune = time.monotonic()
+        # (chat_id, message_id) -> latest deferred call, and the task that sends it.
+        self._deferred: Dict[Tuple[Any, Any], Tuple[str, Callable, Any, Dict[str, Any]]] = {}
+        self._flushing: Dict[Tuple[Any, Any], asyncio.Task] = {}
+        self.retry_after_hits = 0
+        self.coalesced = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for task in self._flushing.values():
+            task.cancel()
+        self._flushing.clear()
+        self._deferred.clear()
+        for *_, fut in self._waiters:
+            if not fut.done():
+                fut.cancel()
+        self._waiters.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        waiting: Dict[str, int] = {}
+        for prio, _, _, fut in self._waiters:
+            if not fut.done():
+                name = _PRIORITY_NAMES.get(prio, str(prio))
+                waiting[name] = waiting.get(name, 0) + 1
+        return {
+            "waiting": waiting,
+            "chats": len(self._chats),
+            "deferred": len(self._deferred),
+            "coalesced": self.coalesced,
+            "retry_after": self.retry_after_hits,
+        }
+
+    def _chat_bucket(self, chat_id: Any) -> _Bucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            group = isinstance(chat_id, str) or int(chat_id) < 0
+            # Groups: 20/min with a little burst; private chats: ~1/s.
+            bucket = (
+                _Bucket(self._group_rate, 3) if group else _Bucket(self._private_rate, 3)
+            )
+            self._chats[chat_id] = bucket
+        return bucket
+
+    def _prune(self, now: float) -> None:
+        if now - self._last_prune < 60:
+            return
+        self._last_prune = now
+        busy = {key for _, _, key, _ in self._waiters}
+        for key, bucket in list(self._chats.items()):
+            if key not in busy and now - bucket.updated > _IDLE_CHAT_TTL:
+                del self._chats[key]
+
+    def _pump(self) -> None:
+        self._timer = None
+        now = time.monotonic()
+        self._prune(now)
+        next_wake: Optional[float] = None
+        held: set = set()
+        remaining = []
+        pending = sorted(self._waiters)
+        for i, entry in enumerate(pending):
+            _, _, chat_id, fut = entry
+            if fut.done():
+                continue
+            global_wait = self._global.wait(now)
+            if global_wait > 0:
+                # Nobody can send; keep the rest in order and wake when a token is back.
+                remaining.extend(e for e in pending[i:] if not e[3].done())
+                next_wake = global_wait if next_wake is None else min(next_wake, global_wait)
+                break
+            if chat_id is None:
+                self._global.take()
+                fut.set_result(None)
+                continue
+            if chat_id in held:
+                remaining.append(entry)
+                continue
+            chat = self._chat_bucket(chat_id)
+            wait = chat.wait(now)
+            if wait <= 0:
+                self._global.take()
+                chat.take()
+                fut.set_result(None)
+                continue
+            # Later requests for this chat stay behind this one.
+            held.add(chat_id)
+            remaining.append(entry)
+            next_wake = wait if next_wake is None else min(next_wake, wait)
+        heapq.heapify(remaining)
+        self._waiters = remaining
+        if remaining and next_wake is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_wake, self._pump)
+
+    async def _acquire(self, chat_id: Any, priority: int) -> None:
+        """Wait for a global token and, unless ``chat_id`` is None, a token for that chat."""
+        started = time.perf_counter()
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), chat_id, fut))
+        if self._timer:
+            self._timer.cancel()
+        self._pump()
+        await fut
+        TELEGRAM_RATE_LIMIT_WAIT_SECONDS.observe(
+            time.perf_counter() - started, priority=_PRIORITY_NAMES.get(priority, str(priority))
+        )
+
+    def _out_of_budget(self, chat_id: Any) -> bool:
+        now = time.monotonic()
+        if self._global.wait(now) > 0 or self._chat_bucket(chat_id).wait(now) > 0:
+            return True
+        return any(key == chat_id and not fut.done() for _, _, key, fut in self._waiters)
+
+    def _defer(
+        self, key: Tuple[Any, Any], endpoint: str, callback: Callable, args: Any, kwargs: Any
+    ) -> None:
+        if key in self._deferred:
+            self.coalesced += 1
+        self._deferred[key] = (endpoint, callback, args, kwargs)
+        if key not in self._flushing:
+            self._flushing[key] = asyncio.get_running_loop().create_task(self._flush(key))
+
+    async def _flush(self, key: Tuple[Any, Any]) -> None:
+        """Send the latest deferred call for ``key`` (and any that arrive meanwhile)."""
+        chat_id = key[0]
+        attempt = 0
+        try:
+            while key in self._deferred:
+                await self._acquire(chat_id, PRIORITY_COSMETIC)
+                call = self._deferred.pop(key, None)
+                if call is None:
+                    continue
+                endpoint, callback, args, kwargs = call
+                try:
+                    await callback(*args, **kwargs)
+                    attempt = 0
+                except RetryAfter as exc:
+                    self.retry_after_hits += 1
+                    TELEGRAM_RETRY_AFTER_TOTAL.inc(method=endpoint)
+                    self._pause(chat_id, float(exc.retry_after) + 0.1)
+                    if attempt < self._max_retries:
+                        attempt += 1
+                        # Unless something newer replaced it meanwhile.
+                        self._deferred.setdefault(key, call)
+                except TelegramError as exc:
+                    logger.warning("Deferred %s failed chat_id=%s: %s", endpoint, chat_id, exc)
+        finally:
+            self._flushing.pop(key, None)
+
+    def _pause(self, chat_id: Any, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        bucket = self._global if chat_id is None else self._chat_bucket(chat_id)
+        bucket.blocked_until = max(bucket.blocked_until, until)
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Any]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[Any],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        chat_id = data.get("chat_id")
+        budget_chat = None if endpoint in CHAT_BUDGET_EXEMPT else chat_id
+        priority = request_priority(endpoint, rate_limit_args)
+        message_id = data.get("message_id")
+        if (
+            endpoint in DEFERRABLE
+            and priority >= PRIORITY_COSMETIC
+            and chat_id is not None
+            and message_id is not None
+        ):
+            key = (chat_id, message_id)
+            # Behind a deferred call for the same message, or no budget: don't block the caller.
+            if key in self._flushing or self._out_of_budget(chat_id):
+                self._defer(key, endpoint, callback, args, kwargs)
+                return True
+        attempt = 0
+        while True:
+            if chat_id is not None:
+                await self._acquire(budget_chat, priority)
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as exc:
+                self.retry_after_hits += 1
+                TELEGRAM_RETRY_AFTER_TOTAL.inc(method=endpoint)
+                delay = float(exc.retry_after) + 0.1
+                self._pause(chat_id, delay)
+                if attempt >= self._max_retries:
+                    raise
+                attempt += 1
+                logger.warning(
+                    "RetryAfter %.0fs on %s chat_id=%s; requeued (%s/%s)",
+                    delay,
+                    endpoint,
+                    chat_id,
+                    attempt,
+                    self._max_retries,
+                )
+                if budget_chat is None:
+                    # Not gated by the chat bucket the pause went into.
+                    await asyncio.sleep(delay)
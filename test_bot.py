@@ -3,6 +3,48 @@
 
 import os
 import sys
+from contextlib import contextmanager
+
+# Smoke tests build the bot many times; keep its job store out of the working tree.
+os.environ.setdefault("JOB_STORE_PATH", "")
+
+
+@contextmanager
+def bot_env(*modules, **env):
+    """
+    Set ``env`` (None unsets a variable), reload config, then ``modules`` and
+    bot, and yield the bot module. On exit the variables get their old values
+    back and config and bot are reloaded, so later tests see the usual setup.
+    """
+    import importlib
+
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    import config
+
+    saved = {k: os.environ.get(k) for k in env}
+    try:
+        for k, v in env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        importlib.reload(config)
+        for name in modules:
+            importlib.reload(importlib.import_module(name))
+        import bot as bot_mod
+
+        importlib.reload(bot_mod)
+        yield bot_mod
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        importlib.reload(config)
+        import bot as bot_mod
+
+        importlib.reload(bot_mod)
 
 
 def test_link_mirror():
@@ -85,6 +127,1531 @@ def test_bot_import():
     print("   OK")
 
 
+def test_local_bot_api_mode():
+    print("\nTesting local Bot API mode…")
+    import asyncio
+    import tempfile
+
+    from fake_telegram import FakeBotAPI
+
+    with FakeBotAPI() as server, tempfile.NamedTemporaryFile(suffix=".mp4") as clip:
+        with bot_env(
+            BOT_TOKEN="123:local",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_LOCAL_MODE="true",
+            MAX_FILE_SIZE_MB=None,
+        ) as bot_mod:
+            import config
+
+            assert config.MAX_FILE_SIZE_MB == config.LOCAL_BOT_API_MAX_FILE_SIZE_MB
+            assert config.TELEGRAM_API_BASE_FILE_URL.endswith("/file/bot")
+            app = bot_mod.SocialLinksBot().application
+
+            async def send() -> None:
+                async with app.bot:
+                    await app.bot.send_video(chat_id=7, video=clip.name)
+
+            asyncio.run(send())
+
+        sent = server.calls_to("sendVideo")
+        assert sent and sent[0]["video"].startswith("file://"), sent
+        assert sent[0]["video"].endswith(clip.name), sent
+    print("   OK")
+
+
+def test_job_status():
+    print("\nTesting TikTok job status…")
+    import asyncio
+
+    from job_status import ChatActionJobStatus, EditCoalescer, MessageJobStatus
+
+    class FakeMessage:
+        def __init__(self):
+            self.replies = []
+
+        async def reply_text(self, text, **kwargs):
+            self.replies.append(text)
+
+            class Sent:
+                message_id = len(self.replies)
+
+            return Sent()
+
+    async def scenario() -> None:
+        edits = []
+
+        async def edit(text):
+            edits.append(text)
+
+        coalescer = EditCoalescer(edit, interval=0.2)
+        for i in range(50):
+            coalescer.push(f"{i}%")
+        await asyncio.sleep(0.05)
+        coalescer.push("99%")
+        await asyncio.sleep(0.3)
+        assert edits == ["49%", "99%"], edits
+
+        actions = []
+
+        async def send_action():
+            actions.append(1)
+
+        async def noop(*args):
+            pass
+
+        msg = FakeMessage()
+        fast = ChatActionJobStatus(
+            msg, "https://vm.tiktok.com/x/", edit=noop, delete=noop,
+            send_action=send_action, edit_interval=1, delay=5,
+        )
+        await fast.start()
+        await asyncio.sleep(0.05)
+        await fast.stage("✅ Sending video…")
+        await fast.finish()
+        assert actions and not msg.replies, msg.replies
+
+        slow = ChatActionJobStatus(
+            msg, "https://vm.tiktok.com/x/", edit=noop, delete=noop,
+            send_action=send_action, edit_interval=1, delay=0,
+        )
+        await slow.start()
+        await asyncio.sleep(0.05)
+        await slow.fail("❌ nope")
+        assert len(msg.replies) == 1 and slow.status_message_id == 1
+
+        # Plain stage / failure texts are escaped for the HTML edit.
+        edited = []
+
+        async def record(message_id, text):
+            edited.append(text)
+
+        shown = MessageJobStatus(
+            FakeMessage(), "https://vm.tiktok.com/x/", edit=record, delete=noop, edit_interval=1
+        )
+        await shown.start()
+        await shown.fail("❌ HTTP <403> & co")
+        assert edited == ["❌ HTTP &lt;403&gt; &amp; co"], edited
+
+        # Finished while the status message is still being sent: it is deleted anyway.
+        class SlowMessage(FakeMessage):
+            async def reply_text(self, text, **kwargs):
+                await asyncio.sleep(0.1)
+                return await super().reply_text(text, **kwargs)
+
+        deleted = []
+
+        async def delete(message_id):
+            deleted.append(message_id)
+
+        racing = ChatActionJobStatus(
+            SlowMessage(), "https://vm.tiktok.com/x/", edit=noop, delete=delete,
+            send_action=send_action, edit_interval=1, delay=0,
+        )
+        await racing.start()
+        await asyncio.sleep(0.03)
+        await racing.finish()
+        assert deleted == [1], deleted
+
+    asyncio.run(scenario())
+    print("   OK")
+
+
+def test_tiktok_format_cap():
+    print("\nTesting TikTok size-aware format pick…")
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    from tiktok_downloader import (
+        estimate_format_size,
+        format_request_headers,
+        muxed_format_spec,
+        pick_format_under_cap,
+    )
+
+    mb = 1024 * 1024
+    formats = [
+        {"format_id": "bytevc1_1080p", "url": "u1", "vcodec": "h265", "acodec": "aac",
+         "ext": "mp4", "height": 1080, "filesize": 30 * mb},
+        {"format_id": "h264_720p", "url": "u2", "vcodec": "h264", "acodec": "aac",
+         "ext": "mp4", "height": 720, "tbr": 8000},
+        {"format_id": "h264_540p", "url": "u3", "vcodec": "h264", "acodec": "aac",
+         "ext": "mp4", "height": 540, "tbr": 2000},
+        {"format_id": "audio", "url": "u4", "vcodec": "none", "acodec": "aac"},
+    ]
+    assert estimate_format_size(formats[1], 60) == 60 * 1_000_000
+    fmt, size = pick_format_under_cap(formats, 60, 50 * mb)
+    assert fmt["format_id"] == "h264_540p" and size == 15_000_000, (fmt, size)
+    fmt, size = pick_format_under_cap(formats, 600, 50 * mb)
+    assert fmt["format_id"] == "bytevc1_1080p", (fmt, size)
+    fmt, size = pick_format_under_cap(formats, 600, 20 * mb)
+    assert fmt is None and size == 30 * mb, (fmt, size)
+    # A small video-only rendition never beats a muxed one that fits.
+    silent = {"format_id": "bytevc1_540p_silent", "url": "u5", "vcodec": "h264",
+              "acodec": "none", "ext": "mp4", "height": 1080, "filesize": 5 * mb}
+    fmt, size = pick_format_under_cap([silent] + formats, 60, 50 * mb)
+    assert fmt["format_id"] == "h264_540p", (fmt, size)
+    assert "[filesize<?1000]" in muxed_format_spec(1000)
+    assert not muxed_format_spec(1000).endswith("/b")
+    fmt, _ = pick_format_under_cap(
+        [{"format_id": "download", "url": "u", "vcodec": "h264"}], None, 50 * mb,
+        probe=lambda f: 10 * mb,
+    )
+    assert fmt["format_id"] == "download"
+
+    headers = format_request_headers(
+        {"http_headers": {"Referer": "r"}, "cookies": "tt=1; Domain=.tiktok.com; Path=/; Secure"}
+    )
+    assert headers == {"Referer": "r", "Cookie": "tt=1"}, headers
+    print("   OK")
+
+
+def test_ranged_download():
+    print("\nTesting parallel ranged download…")
+    import tempfile
+    import threading
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from ranged_download import download_ranged, make_pooled_client
+
+    payload = os.urandom(300_000)
+    failed_once = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            start, _, end = self.headers["Range"].removeprefix("bytes=").partition("-")
+            start, end = int(start), int(end)
+            body = payload[start : end + 1]
+            if start not in failed_once and start > 0:
+                failed_once.add(start)
+                body = body[: len(body) // 2]  # drop the connection mid-chunk
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(payload)}")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            self.wfile.write(body)
+            if len(body) < end - start + 1:
+                self.close_connection = True
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/clip.mp4"
+        with tempfile.TemporaryDirectory() as tmp, make_pooled_client(4, timeout=5) as client:
+            dest = os.path.join(tmp, "clip.mp4")
+            size = download_ranged(url, dest, client=client, concurrency=4, chunk_size=64_000)
+            assert size == len(payload)
+            with open(dest, "rb") as f:
+                assert f.read() == payload
+            assert failed_once
+    finally:
+        server.shutdown()
+        server.server_close()
+    print("   OK")
+
+
+def test_download_session_pool():
+    print("\nTesting yt-dlp session reuse…")
+    from download_session import SessionPool
+
+    pool = SessionPool({"quiet": True}, size=1, impersonate_targets=("chrome", "safari"))
+    with pool.session() as first:
+        first.last_extract_seconds = 2.0
+    with pool.session() as second:
+        second.last_extract_seconds = 0.5
+        second.retire("HTTP Error 429")
+    assert second is first
+    with pool.session() as third:
+        pass
+    assert third is not first
+    stats = pool.stats()
+    assert stats["sessions_created"] == 2 and stats["sessions_recycled"] == 1, stats
+    assert stats["estimated_seconds_saved"] == 1.5, stats
+    if first.impersonate:
+        assert (first.impersonate, third.impersonate) == ("chrome", "safari")
+    pool.close()
+
+    # A job waiting on a full pool gets a fresh session when the busy one is retired.
+    import threading
+
+    pool = SessionPool({"quiet": True}, size=1)
+    got = []
+    with pool.session() as busy:
+        waiter = threading.Thread(target=lambda: got.append(pool._checkout()), daemon=True)
+        waiter.start()
+        waiter.join(0.1)
+        assert not got
+        busy.retire("HTTP Error 403")
+    waiter.join(5)
+    assert got and got[0] is not busy, got
+    assert pool.stats()["sessions_live"] == 1, pool.stats()
+    pool._checkin(got[0])
+    pool.close()
+    print("   OK")
+
+
+def test_tiktok_rate_limit():
+    print("\nTesting TikTok rate limiter…")
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    import time
+
+    import tiktok_downloader
+    from rate_limit import AdaptiveTokenBucket, RetryLater, retry_after_from_error
+
+    bucket = AdaptiveTokenBucket(600, burst=2)
+    t0 = time.monotonic()
+    for _ in range(3):
+        bucket.acquire()
+    assert 0.05 <= time.monotonic() - t0 < 0.5
+    bucket.penalize(retry_after=0.2)
+    assert bucket.snapshot()["rate_per_minute"] == 300
+    t0 = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - t0 >= 0.2
+
+    class Resp:
+        headers = {"Retry-After": "7"}
+
+    class HTTPErr(Exception):
+        response = Resp()
+
+    class Wrapped(Exception):
+        exc_info = (HTTPErr, HTTPErr(), None)
+
+    assert retry_after_from_error(Wrapped()) == 7.0
+
+    Resp.status = 429
+    assert tiktok_downloader.is_blocked_error("Unable to download webpage", Wrapped())
+    assert tiktok_downloader.is_blocked_error("ERROR: [TikTok] 1: HTTP Error 403: Forbidden")
+    # Digits in ids, URLs and byte counts are not statuses.
+    assert not tiktok_downloader.is_blocked_error(
+        "ERROR: [TikTok] 7340294291234034293: fragment 403 of 4290 failed (14290375 bytes)"
+    )
+
+    class Flaky(tiktok_downloader.TikTokDownloader):
+        calls = 0
+
+        def _download_with_session(self, session, url, progress_hook):
+            Flaky.calls += 1
+            if Flaky.calls == 1:
+                raise tiktok_downloader.TikTokBlocked("HTTP Error 429", retry_after=0.05)
+            return True, "ok", []
+
+    # Throttled: no sleeping on the download thread, the caller is told when to retry.
+    url = "https://www.tiktok.com/@u/video/1"
+    retry = Flaky().download_video(url)
+    assert isinstance(retry, RetryLater) and retry.delay >= 0.05, retry
+    assert Flaky().download_video(url, attempt=1) == (True, "ok", [])
+
+    import asyncio
+
+    import bot as bot_mod
+
+    instance = bot_mod.SocialLinksBot()
+    slots = instance.shared.download_slots
+    attempts = []
+
+    class Throttled:
+        def download_video(self, link, hook=None, attempt=0):
+            attempts.append((attempt, slots.running(instance.profile.name)))
+            if attempt < 2:
+                return RetryLater(0.05, "❌ rate limited")
+            return True, "ok", []
+
+    class Hopeless:
+        def download_video(self, link, hook=None, attempt=0):
+            return RetryLater(bot_mod.TIKTOK_JOB_DEADLINE, "❌ rate limited")
+
+    async def backoff() -> tuple:
+        events = []
+        instance.downloader = Throttled()
+        instance._worker_pool = None
+        task = asyncio.create_task(instance._download_tiktok(url, events.append))
+        await asyncio.sleep(0.02)
+        # Backing off: the slot is free for other jobs.
+        idle = slots.running(instance.profile.name)
+        result = await task
+        instance.downloader = Hopeless()
+        started = time.monotonic()
+        gave_up = await instance._download_tiktok(url, None)
+        return idle, result, events, gave_up, time.monotonic() - started
+
+    idle, result, events, gave_up, elapsed = asyncio.run(backoff())
+    assert result == (True, "ok", []) and idle == 0, (result, idle)
+    assert attempts == [(0, 1), (1, 1), (2, 1)], attempts
+    assert [e["status"] for e in events] == ["retrying", "retrying"], events
+    # A backoff that would outlast the job deadline fails at once.
+    assert gave_up == (False, "❌ rate limited", []) and elapsed < 1, (gave_up, elapsed)
+    print("   OK")
+
+
+class _SleepyDownloader:
+    """Stand-in for TikTokDownloader inside job_worker processes."""
+
+    def download_video(self, url, progress_hook=None, attempt=0):
+        import shutil
+        import tempfile
+        import time
+
+        import metrics
+
+        metrics.TIKTOK_JOBS_TOTAL.inc(result="sleepy")
+        job_dir = tempfile.mkdtemp(prefix="job-", dir=os.environ.get("SLEEPY_JOB_ROOT"))
+        hook = progress_hook or (lambda d: None)
+        hook({"status": "job_dir", "job_dir": job_dir})
+        with open(os.path.join(job_dir, "partial.mp4"), "wb") as f:
+            f.write(b"\0")
+        hook({"status": "downloading", "downloaded_bytes": 1, "info_dict": object()})
+        time.sleep(float(url))
+        shutil.rmtree(job_dir)
+        return True, str(os.getpid()), []
+
+
+def test_process_worker_pool():
+    print("\nTesting killable worker processes…")
+    import asyncio
+    import tempfile
+
+    import metrics
+    from job_worker import TIMED_OUT_MESSAGE, ProcessWorkerPool
+
+    before = metrics.TIKTOK_JOBS_TOTAL.value(result="sleepy")
+    root = tempfile.mkdtemp()
+    os.environ["SLEEPY_JOB_ROOT"] = root
+
+    pool = ProcessWorkerPool(1, deadline=3, max_jobs=2, factory="test_bot:_SleepyDownloader")
+
+    async def scenario() -> None:
+        seen = []
+        ok, pid1, _ = await pool.run("0", seen.append)
+        assert ok and seen == [{"status": "downloading", "downloaded_bytes": 1}], seen
+        ok, pid2, _ = await pool.run("0")
+        assert pid1 == pid2
+        # Metrics recorded in the worker land in this process's registry.
+        assert metrics.TIKTOK_JOBS_TOTAL.value(result="sleepy") == before + 2
+        ok, pid3, _ = await pool.run("0")
+        assert pid3 != pid2 and pool.recycled == 1
+        ok, detail, _ = await pool.run("30")
+        assert not ok and detail == TIMED_OUT_MESSAGE and pool.killed == 1
+        # The killed job's directory (and its partial file) went with it.
+        assert os.listdir(root) == [], os.listdir(root)
+        ok, _, _ = await pool.run("0")
+        assert ok
+
+    try:
+        asyncio.run(scenario())
+        # The same pool keeps working when the application is rebuilt on a new loop.
+        async def again() -> bool:
+            ok, _, _ = await pool.run("0")
+            return ok
+
+        assert asyncio.run(again())
+    finally:
+        pool.close()
+        os.environ.pop("SLEEPY_JOB_ROOT", None)
+        os.rmdir(root)
+    print("   OK")
+
+
+def test_tiktok_batch_album():
+    print("\nTesting multi-link TikTok album…")
+    import asyncio
+    import tempfile
+    import time
+    from types import SimpleNamespace
+
+    from fake_telegram import FakeBotAPI
+
+    with FakeBotAPI() as server, tempfile.TemporaryDirectory() as tmp:
+        with bot_env(
+            BOT_TOKEN="123:batch",
+            # Timing below is about download overlap, not per-chat send pacing.
+            TELEGRAM_RATE_LIMIT="false",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_LOCAL_MODE="true",
+            TIKTOK_STATUS_MODE="message",
+        ) as bot_mod:
+            instance = bot_mod.SocialLinksBot()
+            links = [f"https://vm.tiktok.com/Z{i}/" for i in range(4)]
+            delays = {links[0]: 0.4, links[1]: 0.1, links[2]: 0.3, links[3]: 0.2}
+
+            class Downloader:
+                def download_video(self, link, hook=None, attempt=0):
+                    time.sleep(delays[link])
+                    if link == links[3]:
+                        return False, "❌ private video", []
+                    path = os.path.join(tmp, link.rstrip("/")[-2:] + ".mp4")
+                    with open(path, "wb") as f:
+                        f.write(b"\0")
+                    return True, "ok", [{"file_path": path, "title": link}]
+
+                def cleanup_files(self, media_files):
+                    for media in media_files:
+                        os.remove(media["file_path"])
+
+            instance.downloader = Downloader()
+            app = instance.application
+
+            async def scenario() -> float:
+                async with app.bot:
+                    sent = await app.bot.send_message(chat_id=7, text="links")
+                    sent.set_bot(app.bot)
+                    context = SimpleNamespace(bot=app.bot)
+                    started = time.monotonic()
+                    await instance._process_tiktok_batch(context, sent, links)
+                    return time.monotonic() - started
+
+            elapsed = asyncio.run(scenario())
+
+        # Downloads overlap, but the album keeps the order of the links in the message.
+        assert elapsed < sum(delays.values()), elapsed
+        albums = server.calls_to("sendMediaGroup")
+        assert len(albums) == 1, albums
+        sent_media = [m["media"] for m in albums[0]["media"]]
+        assert [p.rsplit("/", 1)[-1] for p in sent_media] == ["Z0.mp4", "Z1.mp4", "Z2.mp4"]
+        assert any("private video" in c.get("text", "") for c in server.calls_to("sendMessage"))
+        # Status texts are HTML: every edit must say so, or users see the tags.
+        edits = server.calls_to("editMessageText")
+        assert edits and all(c.get("parse_mode") == "HTML" for c in edits), edits
+        assert any("<code>" in c["text"] for c in edits), edits
+        assert not os.listdir(tmp)
+    print("   OK")
+
+
+def test_chat_ordered_updates():
+    print("\nTesting per-chat ordered concurrent updates…")
+    import asyncio
+
+    from telegram import Update
+
+    from update_processor import ChatOrderedUpdateProcessor
+
+    def update(update_id, chat_id, thread_id=None):
+        message = {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "supergroup"},
+            "text": "x",
+        }
+        if thread_id is not None:
+            message.update(message_thread_id=thread_id, is_topic_message=True)
+        return Update.de_json({"update_id": update_id, "message": message}, None)
+
+    async def scenario() -> None:
+        processor = ChatOrderedUpdateProcessor(max_running=2)
+        await processor.initialize()
+        log = []
+        peak = 0
+
+        async def handler(name, delay):
+            nonlocal peak
+            peak = max(peak, processor.active)
+            log.append(("start", name))
+            await asyncio.sleep(delay)
+            log.append(("end", name))
+
+        jobs = [
+            (update(1, -1), "a1", 0.2),
+            (update(2, -1), "a2", 0.0),
+            (update(3, -2), "b1", 0.05),
+            (update(4, -1, thread_id=9), "t1", 0.05),
+            (update(5, -2), "b2", 0.0),
+        ]
+        await asyncio.gather(
+            *(processor.process_update(u, handler(n, d)) for u, n, d in jobs)
+        )
+        assert log.index(("start", "a2")) > log.index(("end", "a1")), log
+        assert log.index(("start", "b2")) > log.index(("end", "b1")), log
+        # Chat -2 and the forum topic finish while a1 is still running.
+        assert log.index(("end", "b2")) < log.index(("end", "a1")), log
+        assert peak <= 2, peak
+        assert processor.snapshot()["ordered_keys"] == 0
+        await processor.shutdown()
+
+    asyncio.run(scenario())
+    print("   OK")
+
+
+def test_webhook_ingress():
+    print("\nTesting webhook ingestion…")
+    import asyncio
+
+    import httpx
+
+    from fake_telegram import FakeBotAPI
+
+    recorded = {
+        "update_id": 1001,
+        "message": {
+            "message_id": 5,
+            "date": 0,
+            "chat": {"id": 42, "type": "private"},
+            "from": {"id": 42, "is_bot": False, "first_name": "T"},
+            "text": "/chatid",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 7}],
+        },
+    }
+    with FakeBotAPI() as server:
+        with bot_env(
+            "webhook",
+            BOT_TOKEN="123:hook",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_WEBHOOK_URL="https://bot.example.com/telegram",
+            TELEGRAM_WEBHOOK_SECRET="s3cret",
+            TELEGRAM_WEBHOOK_REGISTER="false",
+        ) as bot_mod:
+            instance = bot_mod.SocialLinksBot()
+
+            async def scenario():
+                stop = asyncio.Event()
+                runner = asyncio.create_task(instance._run_webhook(port=0, stop=stop))
+                while instance.http_server is None or instance.http_server._server is None:
+                    await asyncio.sleep(0.01)
+                base = f"http://127.0.0.1:{instance.http_server.bound_port}"
+                async with httpx.AsyncClient(base_url=base) as client:
+                    denied = await client.post("/telegram", json=recorded)
+                    ok = await client.post(
+                        "/telegram",
+                        json=recorded,
+                        headers={"X-Telegram-Bot-Api-Secret-Token": "s3cret"},
+                    )
+                    health = (await client.get("/health")).json()
+                stop.set()
+                await runner
+                return denied.status_code, ok.status_code, health
+
+            denied, ok, health = asyncio.run(scenario())
+
+        assert (denied, ok) == (403, 200), (denied, ok)
+        assert health["queues"]["webhook"]["accepted"] == 1, health
+        # Drained before shutdown: the /chatid reply went out.
+        assert any(c.get("chat_id") == 42 for c in server.calls_to("sendMessage"))
+        assert not server.calls_to("setWebhook")
+
+    from http_server import Request
+    from webhook import WebhookIngress
+
+    class App:
+        bot = None
+        update_queue = asyncio.Queue()
+
+    busy = WebhookIngress(App(), secret=None, max_pending=2, backlog=lambda: 2)
+    resp = asyncio.run(busy.handle(Request("POST", "/telegram", "", {}, b"{}")))
+    assert resp.status == 503 and resp.headers["Retry_After"] == "5"
+    print("   OK")
+
+
+def test_metrics():
+    print("\nTesting metrics…")
+    from metrics import Counter, Histogram, REGISTRY, _Metric, set_sink
+
+    hist = Histogram("test_latency_seconds", "t", ["op"], buckets=(0.1, 1))
+    hist.observe(0.05, op="a")
+    hist.observe(0.5, op="a")
+    with hist.time(op="b") as labels:
+        labels["op"] = "c"
+    errors = Counter("test_errors_total", "t", ["method"])
+    forwarded = []
+    set_sink(forwarded.append)
+    try:
+        errors.inc(method='send"Video')
+    finally:
+        set_sink(None)
+    assert errors.value(method='send"Video') == 0 and len(forwarded) == 1
+    REGISTRY.apply(forwarded[0])
+
+    text = REGISTRY.render()
+    assert 'test_latency_seconds_bucket{op="a",le="0.1"} 1' in text, text
+    assert 'test_latency_seconds_bucket{op="a",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{op="c"} 1' in text
+    assert 'test_errors_total{method="send\\"Video"} 1' in text
+    assert "# TYPE telegram_api_seconds histogram" in text
+    try:
+        _Metric("test_abstract", "t")
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("_Metric must stay abstract")
+    print("   OK")
+
+
+def test_tracing():
+    print("\nTesting per-update tracing…")
+    import asyncio
+    import time
+
+    import tracing
+
+    def blocking_stage():
+        with tracing.span("thread.stage"):
+            time.sleep(0.02)
+
+    async def handle(slow: bool):
+        with tracing.trace("update", chat_id=1):
+            with tracing.span("collect_links"):
+                pass
+            await asyncio.to_thread(blocking_stage)
+            if slow:
+                await asyncio.sleep(0.06)
+
+    tracing.configure(enabled=True, slow_threshold=0.05, buffer_size=2)
+    try:
+        assert tracing.span("outside") is tracing._NOOP
+        asyncio.run(handle(slow=False))
+        assert tracing.slow_traces() == []
+        for _ in range(3):
+            asyncio.run(handle(slow=True))
+        traces = tracing.slow_traces()
+        assert len(traces) == 2, traces
+        names = [c["name"] for c in traces[0]["children"]]
+        assert names == ["collect_links", "thread.stage"], traces[0]
+        assert traces[0]["ms"] >= 50
+    finally:
+        tracing.configure(enabled=False, slow_threshold=5, buffer_size=50)
+    print("   OK")
+
+
+def test_telegram_rate_limiter():
+    print("\nTesting outbound Bot API pacing…")
+    import asyncio
+
+    from telegram.error import RetryAfter
+
+    from telegram_rate_limit import PRIORITY_COSMETIC, PRIORITY_REPLY, PriorityRateLimiter
+
+    async def scenario() -> None:
+        limiter = PriorityRateLimiter(
+            global_per_second=1000, private_per_second=5, group_per_minute=60, max_retries=2
+        )
+        order = []
+
+        async def call(name):
+            order.append(name)
+            return name
+
+        def send(name, chat_id, endpoint, priority=None):
+            return limiter.process_request(
+                call, (name,), {}, endpoint, {"chat_id": chat_id}, priority
+            )
+
+        # Burst of 3 for chat 1 is spent first; later calls queue on the chat budget.
+        await asyncio.gather(*(send(f"warm{i}", 1, "sendMessage") for i in range(3)))
+        started = asyncio.get_running_loop().time()
+        cosmetic = [
+            asyncio.create_task(send(f"edit{i}", 1, "editMessageText")) for i in range(2)
+        ]
+        await asyncio.sleep(0)
+        reply = asyncio.create_task(send("reply", 1, "sendVideo"))
+        other = asyncio.create_task(send("other", 2, "sendMessage"))
+        typing = asyncio.create_task(send("typing", 1, "sendChatAction"))
+        await other
+        await typing
+        # Another chat and chat actions don't wait behind chat 1's budget.
+        assert asyncio.get_running_loop().time() - started < 0.1
+        await asyncio.gather(reply, *cosmetic)
+        assert order.index("reply") < order.index("edit0") < order.index("edit1"), order
+        assert limiter.snapshot()["waiting"] == {}
+
+        attempts = 0
+
+        async def flaky():
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise RetryAfter(0.05)
+            return "sent"
+
+        result = await limiter.process_request(
+            flaky, (), {}, "sendMessage", {"chat_id": 3}, PRIORITY_REPLY
+        )
+        assert result == "sent" and attempts == 2
+        assert limiter.retry_after_hits == 1
+
+        async def always_limited():
+            raise RetryAfter(0.01)
+
+        try:
+            await limiter.process_request(
+                always_limited, (), {}, "editMessageText", {"chat_id": 4}, PRIORITY_COSMETIC
+            )
+        except RetryAfter:
+            pass
+        else:
+            raise AssertionError("RetryAfter should surface after max_retries")
+        assert limiter.retry_after_hits == 4
+        await limiter.shutdown()
+
+        # Out of budget, status edits and deletes don't wait: the latest per message goes later.
+        limiter = PriorityRateLimiter(global_per_second=1000, group_per_minute=600)
+        order.clear()
+
+        def status(name, endpoint, message_id):
+            data = {"chat_id": -5, "message_id": message_id}
+            return limiter.process_request(call, (name,), {}, endpoint, data, None)
+
+        await asyncio.gather(*(send(f"warm{i}", -5, "sendMessage") for i in range(3)))
+        started = asyncio.get_running_loop().time()
+        for name in ("progress1", "progress2", "failed"):
+            assert await status(name, "editMessageText", 10) is True
+        assert await status("cleanup", "deleteMessage", 11) is True
+        assert asyncio.get_running_loop().time() - started < 0.05
+        assert limiter.snapshot()["deferred"] == 2 and limiter.coalesced == 2
+        await send("reply", -5, "sendMessage")
+        for _ in range(50):
+            if not limiter._flushing:
+                break
+            await asyncio.sleep(0.05)
+        assert order[3:] == ["reply", "failed", "cleanup"], order
+        await limiter.shutdown()
+
+    asyncio.run(scenario())
+    print("   OK")
+
+
+def test_dedupe_store():
+    print("\nTesting edited-message dedupe store…")
+    from dedupe import DedupeStore
+
+    now = [0.0]
+    store = DedupeStore(capacity=3, ttl=10, clock=lambda: now[0])
+    store.remember((1, 1), "hello https://instagram.com/p/x")
+    assert store.seen((1, 1), "hello https://instagram.com/p/x")
+    assert not store.seen((1, 1), "hello, edited")
+    assert not store.seen((1, 2), "hello https://instagram.com/p/x")
+    store.remember((1, 2), "b")
+    store.remember((1, 3), "c")
+    store.remember((1, 1), "a")  # rewrite makes (1, 1) most recent
+    store.remember((1, 4), "d")
+    assert len(store) == 3 and not store.seen((1, 2), "b") and store.seen((1, 1), "a")
+    now[0] = 10.5
+    assert not store.seen((1, 3), "c")
+    store.remember((2, 1), "e")
+    assert len(store) == 1, store.snapshot()
+    assert store.snapshot()["evicted"] == 1
+    print("   OK")
+
+
+def test_edit_handles_new_links_only():
+    print("\nTesting incremental edited-message handling…")
+    import asyncio
+    from types import SimpleNamespace
+
+    from telegram import Update
+
+    from fake_telegram import FakeBotAPI
+
+    with FakeBotAPI() as server:
+        with bot_env(
+            BOT_TOKEN="123:edits",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_LOCAL_MODE="true",
+            CHECK_LINK_PREVIEW="false",
+            TELEGRAM_RATE_LIMIT="false",
+        ) as bot_mod:
+            instance = bot_mod.SocialLinksBot()
+            app = instance.application
+            downloads = []
+
+            class Downloader:
+                def is_valid_tiktok_url(self, link):
+                    return True
+
+            async def process_tiktok(context, message, link, **kwargs):
+                downloads.append(link)
+
+            async def process_batch(context, message, links, **kwargs):
+                downloads.extend(links)
+
+            instance.downloader = Downloader()
+            instance._process_tiktok = process_tiktok
+            instance._process_tiktok_batch = process_batch
+
+            def update(update_id, text, edited=False):
+                message = {
+                    "message_id": 50,
+                    "date": 0,
+                    "chat": {"id": 7, "type": "private"},
+                    "from": {"id": 7, "is_bot": False, "first_name": "u"},
+                    "text": text,
+                }
+                field = "edited_message" if edited else "message"
+                return Update.de_json({"update_id": update_id, field: message}, app.bot)
+
+            first = "https://instagram.com/p/A and https://vm.tiktok.com/T1/"
+            second = first + " plus https://instagram.com/p/B https://vm.tiktok.com/T2/"
+
+            async def scenario() -> None:
+                async with app.bot:
+                    context = SimpleNamespace(bot=app.bot)
+                    for u in (
+                        update(1, first),
+                        update(2, first, edited=True),  # preview attached, same text
+                        update(3, second, edited=True),
+                    ):
+                        await instance._handle_message(u, context, u.effective_message)
+
+            asyncio.run(scenario())
+
+        replies = server.calls_to("sendMessage")
+        assert len(replies) == 1 and "/p/A" in replies[0]["text"], replies
+        edits = server.calls_to("editMessageText")
+        assert len(edits) == 1, edits
+        assert "/p/A" in edits[0]["text"] and "/p/B" in edits[0]["text"]
+        assert downloads == ["https://vm.tiktok.com/T1/", "https://vm.tiktok.com/T2/"], downloads
+        record = instance._handled_bodies.record((7, 50))
+        assert set(record.instagram) == {"https://instagram.com/p/A", "https://instagram.com/p/B"}
+    print("   OK")
+
+
+def test_mirror_stats():
+    print("\nTesting mirror success model…")
+    import preview_check
+    from mirror_stats import MIRROR_STATS
+
+    reel = "https://www.instagram.com/reel/abc/"
+    hosts = ["instagram7.com", "eeinstagram.com", "kkinstagram.com"]
+    probes = []
+    good = {"kkinstagram.com"}
+
+    def fake_score(url, timeout=8.0, *, instagram_url=None):
+        probes.append(url)
+        return 12 if any(h in url for h in good) else 0
+
+    real = preview_check.fetch_preview_score
+    preview_check.fetch_preview_score = fake_score
+    MIRROR_STATS.reset()
+    MIRROR_STATS.configure(trust_rate=0.9, trust_min_samples=5, recheck_every=4)
+    try:
+        assert preview_check._hosts_for_instagram_url(reel, hosts)[0] == "instagram7.com"
+        for _ in range(8):
+            picked = preview_check.pick_working_mirror(reel, hosts)
+            assert picked and picked[1] == "kkinstagram.com"
+        # Failing hosts sink for reels only; photo posts keep the preferred order.
+        assert preview_check._hosts_for_instagram_url(reel, hosts)[0] == "kkinstagram.com"
+        assert preview_check._hosts_for_instagram_url(
+            "https://instagram.com/p/x/", hosts
+        )[0] == "instagram7.com"
+        probes.clear()
+        for _ in range(8):
+            assert preview_check.pick_working_mirror(reel, hosts)[1] == "kkinstagram.com"
+        # Trusted: most picks skip the probe, every 4th still checks.
+        assert len(probes) == 2, probes
+    finally:
+        preview_check.fetch_preview_score = real
+        MIRROR_STATS.reset()
+        MIRROR_STATS.configure(trust_rate=0, trust_min_samples=20, recheck_every=10)
+    print("   OK")
+
+
+def test_mirror_canary():
+    print("\nTesting background mirror canary…")
+    import asyncio
+
+    import mirror_canary
+    from mirror_stats import MIRROR_STATS
+
+    probed = []
+
+    def fake_score(url, timeout=8.0, *, instagram_url=None):
+        probed.append((url, instagram_url))
+        return 0 if "broken" in url else 11
+
+    real = mirror_canary.fetch_preview_score
+    mirror_canary.fetch_preview_score = fake_score
+    MIRROR_STATS.reset()
+    try:
+        canary = mirror_canary.MirrorCanary(
+            ["good.example", "broken.example"], reels=["R1"], budget=3
+        )
+        first = asyncio.run(canary.run_cycle())
+        # No photo canary yet: that pair is skipped, not probed with a made-up post.
+        assert [(h, k) for h, k, _ in first] == [
+            ("good.example", "reel"),
+            ("broken.example", "reel"),
+        ], first
+        canary.observe("https://www.instagram.com/p/USER1/?igsh=x")
+        second = asyncio.run(canary.run_cycle())
+        # Budget 3 of 4 pairs: the rotation continues where the last cycle stopped.
+        assert [(h, k) for h, k, _ in second] == [
+            ("broken.example", "photo"),
+            ("good.example", "reel"),
+            ("good.example", "photo"),
+        ], second
+        assert probed[0][0] == "https://www.good.example/reel/R1/"
+        assert any(url == "https://www.broken.example/p/USER1/" for url, _ in probed)
+        assert MIRROR_STATS.snapshot()["broken.example/reel"]["rate"] < 0.75
+        assert canary.healthy_hosts() == ["good.example"]
+        assert canary.snapshot()["cycles"] == 2
+    finally:
+        mirror_canary.fetch_preview_score = real
+        MIRROR_STATS.reset()
+    print("   OK")
+
+
+def test_preview_slo():
+    print("\nTesting preview verification SLO…")
+    from preview_slo import DEGRADED, RECOVERING, VERIFIED, PreviewSLO
+
+    now = [0.0]
+    slo = PreviewSLO(p95_budget=2.0, min_success=0.5, cooldown=30, clock=lambda: now[0])
+    for _ in range(16):
+        assert slo.should_verify()
+        slo.observe(0.5, True)
+    slo.observe(6.0, True)  # one slow call is the max of too few samples, not a p95
+    assert slo.state == VERIFIED
+    for _ in range(3):
+        slo.observe(6.0, True)  # mirror outage: 4 of 20 calls far over budget
+    assert slo.state == DEGRADED, slo.snapshot()
+    assert not slo.should_verify()
+    now[0] = 31
+    verified = [slo.should_verify() for _ in range(10)]
+    assert slo.state == RECOVERING and verified.count(True) == 1, verified
+    slo.observe(5.0, False)  # still broken: back off again
+    assert slo.state == DEGRADED
+    now[0] = 62
+    rounds = 0
+    while slo.state != VERIFIED:
+        rounds += 1
+        assert rounds < 50
+        if slo.should_verify():
+            slo.observe(0.3, True)
+    snap = slo.snapshot()
+    assert [t["to"] for t in snap["transitions"]] == [
+        DEGRADED,
+        RECOVERING,
+        DEGRADED,
+        RECOVERING,
+        VERIFIED,
+    ], snap
+    print("   OK")
+
+
+def test_admission_control():
+    print("\nTesting media job admission control…")
+    import admission as admission_mod
+
+    waiting = [0]
+    adm = admission_mod.Admission(
+        max_in_flight=4, per_user=2, per_chat=3, max_waiting=2, waiting=lambda: waiting[0]
+    )
+    assert adm.room(1, -10) == 2 and adm.room(None, -10) == 3
+    a1, _ = adm.try_admit(1, -10)
+    a2, _ = adm.try_admit(1, -10)
+    assert a1 and a2
+    assert adm.room(1, -10) == 0 and adm.room(2, -10) == 1
+    assert adm.try_admit(1, -20) == (None, "user_quota")
+    b1, _ = adm.try_admit(2, -10)
+    assert adm.try_admit(3, -10) == (None, "chat_quota")
+    assert adm.try_admit(3, -30, jobs=2) == (None, "in_flight")
+    a1.release()
+    a1.release()  # idempotent
+    assert adm.in_flight == 2
+    waiting[0] = 2
+    assert adm.try_admit(3, -30) == (None, "queue")
+    waiting[0] = 0
+    with adm.try_admit(None, -30, jobs=2)[0]:
+        assert adm.in_flight == 4
+    a2.release()
+    b1.release()
+    assert adm.in_flight == 0 and not adm._by_user and not adm._by_chat
+
+    # Two bots on one host: their own quotas, one in-flight count and slot queue.
+    host = admission_mod.InFlight()
+    first, second = (
+        admission_mod.Admission(max_in_flight=3, per_user=2, per_chat=2, max_waiting=1, shared=host)
+        for _ in range(2)
+    )
+    t1, _ = first.try_admit(1, -10, jobs=2)
+    assert second.room(1, -10) == 1 and second.in_flight == 2
+    assert second.try_admit(1, -10, jobs=2) == (None, "in_flight")
+    host.waiting = 1
+    assert second.try_admit(1, -10) == (None, "queue")
+    host.waiting = 0
+    t1.release()
+    assert second.in_flight == 0
+
+    real = admission_mod.free_disk_mb
+    admission_mod.free_disk_mb = lambda path: 100.0
+    try:
+        tight = admission_mod.Admission(
+            max_in_flight=4, per_user=2, per_chat=3, max_waiting=0, min_free_disk_mb=500
+        )
+        assert tight.try_admit(1, 1) == (None, "disk")
+    finally:
+        admission_mod.free_disk_mb = real
+    assert adm.snapshot()["rejected"] == {
+        "user_quota": 1,
+        "chat_quota": 1,
+        "in_flight": 1,
+        "queue": 1,
+    }
+    # More links than the quota: admit what fits instead of refusing the message every time.
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    from bot import _split_at_room
+
+    links = ["a", "b", "c", "d", "e", "f", "g"]
+    assert _split_at_room(links, adm.room(5, -50)) == (links[:2], links[2:])
+    assert _split_at_room(links, 0) == (["a"], links[1:])
+    assert adm.queued_room(1, 0, 0, user_id=5) == 1
+    assert adm.queued_room(0, 0, 5, user_id=None) == 1
+    assert adm.check_queued(0, 0, 0, len(links[:2]), user_id=5) is None
+    print("   OK")
+
+
+def test_job_store_resume():
+    print("\nTesting durable TikTok jobs across restarts…")
+    import asyncio
+    import tempfile
+    import time
+
+    from telegram import Update
+
+    from fake_telegram import FakeBotAPI
+    from job_store import DOWNLOADING, SENDING, JobStore
+
+    with FakeBotAPI() as server, tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "state", "jobs.sqlite3")
+        store = JobStore(path)
+        common = dict(chat_id=7, thread_id=None, user_id=7)
+        resumable = store.add(message_id=1, links=["https://vm.tiktok.com/A/"], **common)
+        store.set_stage(resumable, DOWNLOADING, 90)
+        sending = store.add(message_id=2, links=["https://vm.tiktok.com/B/"], **common)
+        store.set_stage(sending, SENDING, 91)
+        queued = store.add(message_id=3, links=["https://vm.tiktok.com/C/"], **common)
+        jobs = store.unfinished()
+        assert [j.stage for j in jobs] == [DOWNLOADING, SENDING, "queued"]
+        assert jobs[0].links == ["https://vm.tiktok.com/A/"] and jobs[0].status_message_id == 90
+        # A job from a forum topic resumes in that topic.
+        store.add(
+            chat_id=-100, thread_id=9, user_id=7, message_id=6, links=["https://vm.tiktok.com/T/"]
+        )
+        store.close()
+
+        with bot_env(
+            BOT_TOKEN="123:jobs",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_LOCAL_MODE="true",
+            TELEGRAM_RATE_LIMIT="false",
+            JOB_STORE_PATH=path,
+            JOB_DRAIN_TIMEOUT="0.2",
+        ) as bot_mod:
+            instance = bot_mod.SocialLinksBot()
+            app = instance.application
+            ran = []
+            rows = []
+
+            async def process_tiktok(context, message, link, *, job_id=None):
+                ran.append((message.chat_id, message.message_id, link))
+                if message.chat_id == -100:
+                    assert message.is_topic_message and message.message_thread_id == 9
+                    await real_process_tiktok(context, message, link, job_id=job_id)
+                rows.append((job_id, [j.links for j in instance.jobs.unfinished()]))
+                if link.endswith("/SLOW/"):
+                    await asyncio.sleep(5)
+
+            def gone(link, hook=None, attempt=0):
+                return False, "❌ video removed", []
+
+            instance.downloader.download_video = gone
+            instance._worker_pool = None
+            real_process_tiktok = instance._process_tiktok
+            instance._process_tiktok = process_tiktok
+
+            async def scenario() -> None:
+                async with app.bot:
+                    await instance._resume_jobs()
+                    await asyncio.gather(*instance._job_tasks)
+                    assert len(instance.jobs) == 0
+                    # An empty store is still a store: a new link gets its row.
+                    context = bot_mod.CallbackContext(app)
+                    new = "https://vm.tiktok.com/NEW/"
+                    update = Update.de_json(
+                        {
+                            "update_id": 1,
+                            "message": {
+                                "message_id": 5,
+                                "date": int(time.time()),
+                                "chat": {"id": 7, "type": "private"},
+                                "from": {"id": 7, "is_bot": False, "first_name": "u"},
+                                "text": new,
+                            },
+                        },
+                        app.bot,
+                    )
+                    rows.clear()
+                    await instance._handle_incoming(update, context)
+                    assert ran[-1] == (7, 5, new), ran
+                    assert rows[0][0] is not None and rows[0][1] == [[new]], rows
+                    assert len(instance.jobs) == 0
+                    # SIGTERM mid-job: the drain window runs out, the row stays for next start.
+                    message = instance._stored_job_message(jobs[0])
+                    job_id = instance.jobs.add(
+                        message_id=4, links=["https://vm.tiktok.com/SLOW/"], **common
+                    )
+                    task = asyncio.create_task(
+                        instance._run_tiktok_job(
+                            context, message, ["https://vm.tiktok.com/SLOW/"], job_id
+                        )
+                    )
+                    await asyncio.sleep(0.05)
+                    started = time.monotonic()
+                    instance._begin_drain()
+                    await asyncio.gather(task, return_exceptions=True)
+                    assert time.monotonic() - started < 1
+                    assert [j.id for j in instance.jobs.unfinished()] == [job_id]
+
+            asyncio.run(scenario())
+
+        assert (7, 1, "https://vm.tiktok.com/A/") in ran
+        assert (7, 3, "https://vm.tiktok.com/C/") in ran
+        assert not any(link.endswith("/B/") for *_, link in ran)
+        assert (-100, 6, "https://vm.tiktok.com/T/") in ran
+        topic = [(m, p) for m, p in server.calls if p.get("chat_id") == -100]
+        assert topic and all(p.get("message_thread_id") == 9 for m, p in topic), topic
+        # The stale status of the resumed job is removed; the half-sent one is marked.
+        assert any(c.get("message_id") == 90 for c in server.calls_to("deleteMessage"))
+        edits = server.calls_to("editMessageText")
+        assert any(c.get("message_id") == 91 and "restart" in c["text"] for c in edits), edits
+    print("   OK")
+
+
+def test_replica_roles():
+    print("\nTesting ingest / worker replicas over a shared job store…")
+    import asyncio
+    import importlib
+    import tempfile
+    import time
+    from datetime import datetime, timezone
+
+    import httpx
+    from telegram import Chat, Message
+
+    from dedupe import HandledMessage
+    from fake_telegram import FakeBotAPI
+    from job_store import JobQueue, JobStore, open_job_queue
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+        a, b = open_job_queue("sqlite", path), JobStore(path)
+        assert isinstance(a, JobQueue)
+        try:
+            open_job_queue("nfs", path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError("unknown JOB_QUEUE_BACKEND accepted")
+        common = dict(chat_id=-100, thread_id=None)
+        first = a.add(message_id=1, user_id=5, links=["https://vm.tiktok.com/A/"], **common)
+        second = a.add(message_id=2, user_id=6, links=["https://vm.tiktok.com/B/", "x"], **common)
+        assert a.add(message_id=1, user_id=5, links=["https://vm.tiktok.com/A/"], **common) is None
+        assert a.load(5, -100) == (1, 3, 3)
+        # Each job goes to one replica; an expired lease puts it back in the queue.
+        assert a.claim_next("a", 0.2).id == first
+        job = b.claim_next("b", 60)
+        assert job.id == second and job.attempts == 1
+        assert b.claim_next("b", 60) is None
+        time.sleep(0.3)
+        retry = b.claim_next("b", 60)
+        assert retry.id == first and retry.attempts == 2
+        b.release(second, started=False)
+        assert a.claim_next("a", 60).attempts == 1
+        # One ingest node at a time; a standby takes over once the lease lapses.
+        assert a.acquire_lease("ingest", "a", 0.2)
+        assert not b.acquire_lease("ingest", "b", 60)
+        assert a.acquire_lease("ingest", "a", 0.2)
+        time.sleep(0.3)
+        assert b.acquire_lease("ingest", "b", 60)
+        b.release_lease("ingest", "b")
+        assert a.acquire_lease("ingest", "a", 60)
+        a.close()
+        b.close()
+
+    with FakeBotAPI() as server, tempfile.TemporaryDirectory() as tmp:
+        with bot_env(
+            BOT_TOKEN="123:replicas",
+            BOT_ROLE="ingest",
+            PORT="0",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_LOCAL_MODE="true",
+            TELEGRAM_RATE_LIMIT="false",
+            JOB_STORE_PATH=os.path.join(tmp, "jobs.sqlite3"),
+            WORKER_POLL_INTERVAL="0.05",
+            INGEST_LEASE_SECONDS="3",
+        ) as bot_mod:
+            import config
+
+            ingest = bot_mod.SocialLinksBot()
+            os.environ["BOT_ROLE"] = "worker"
+            importlib.reload(config)
+            importlib.reload(bot_mod)
+            worker = bot_mod.SocialLinksBot()
+            ran = []
+
+            async def refuse(*args, **kwargs):
+                raise AssertionError("the ingest node must not download")
+
+            async def process_tiktok(context, message, link, *, job_id=None):
+                ran.append((message.chat_id, message.message_id, link))
+
+            ingest._process_tiktok = refuse
+            worker._process_tiktok = process_tiktok
+
+            async def standby() -> tuple:
+                # Another replica is ingesting: this one stays up for health checks.
+                assert ingest.jobs.acquire_lease("ingest", "elsewhere", 60)
+                waiting = asyncio.create_task(ingest._wait_for_ingest_lease())
+                for _ in range(200):
+                    if ingest.http_server is not None and ingest.http_server._server:
+                        break
+                    await asyncio.sleep(0.01)
+                base = f"http://127.0.0.1:{ingest.http_server.bound_port}"
+                async with httpx.AsyncClient(base_url=base) as client:
+                    health = await client.get("/health")
+                    ready = await client.get("/ready")
+                ingest.jobs.release_lease("ingest", "elsewhere")
+                await asyncio.wait_for(waiting, 5)
+                ingest.jobs.release_lease("ingest", ingest.node_id)
+                return health.status_code, ready.status_code, ready.json()["reasons"]
+
+            health, ready, reasons = asyncio.run(standby())
+            assert (health, ready) == (200, 503), (health, ready)
+            assert "standing by for the ingest lease" in reasons, reasons
+            assert ingest.http_server is None and not ingest._standby
+
+            async def scenario() -> None:
+                async with ingest.application.bot:
+                    message = Message(
+                        message_id=11,
+                        date=datetime.now(timezone.utc),
+                        chat=Chat(id=-100, type="supergroup"),
+                    )
+                    message.set_bot(ingest.application.bot)
+                    await ingest._queue_tiktok_job(
+                        message, ["https://vm.tiktok.com/Q/"], HandledMessage()
+                    )
+                    # Redelivered after an ingest failover: not queued twice.
+                    await ingest._queue_tiktok_job(
+                        message, ["https://vm.tiktok.com/Q/"], HandledMessage()
+                    )
+                    assert len(ingest.jobs) == 1
+                stop = asyncio.Event()
+                run = asyncio.create_task(worker._run_worker(stop))
+                for _ in range(100):
+                    if not len(worker.jobs):
+                        break
+                    await asyncio.sleep(0.05)
+                stop.set()
+                await asyncio.wait_for(run, 10)
+
+            asyncio.run(scenario())
+
+        assert ran == [(-100, 11, "https://vm.tiktok.com/Q/")], ran
+        assert len(worker.jobs) == 0
+    print("   OK")
+
+
+def test_bot_host():
+    print("\nTesting several bots in one process…")
+    import asyncio
+    import time
+
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    from bot_host import FairSlots
+    from fake_telegram import FakeBotAPI
+
+    async def fairness() -> list:
+        slots = FairSlots(2)
+        slots.register("busy")
+        slots.register("quiet")
+        order = []
+
+        async def job(tenant: str, n: int) -> None:
+            await slots.acquire(tenant)
+            order.append(f"{tenant}{n}")
+            await asyncio.sleep(0.01)
+            slots.release(tenant)
+
+        tasks = [asyncio.create_task(job("busy", n)) for n in range(4)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("quiet", 0)))
+        await asyncio.gather(*tasks)
+        return order
+
+    # The quiet bot gets the first freed slot instead of queueing behind the busy one.
+    assert asyncio.run(fairness())[:3] == ["busy0", "busy1", "quiet0"]
+
+    with FakeBotAPI() as server:
+        with bot_env(
+            BOT_PROFILES="alpha,beta",
+            BOT_ALPHA_TOKEN="1:alpha",
+            BOT_BETA_TOKEN="2:beta",
+            BOT_BETA_MIRROR_HOST="kkclip.com",
+            CHECK_LINK_PREVIEW="false",
+            PORT="0",
+            TELEGRAM_API_BASE_URL=server.base_url,
+            TELEGRAM_RATE_LIMIT="false",
+        ) as bot_mod:
+            import config
+
+            host = bot_mod.BotHost(config.BOT_PROFILES, bot_mod.SocialLinksBot)
+            alpha, beta = host.bots
+            assert alpha.downloader is beta.downloader
+            assert beta.mirror_host == "kkclip.com" and "kkclip.com" in beta._mirror_hosts
+            assert alpha.mirror_host != "kkclip.com"
+            assert alpha.serve_http and not beta.serve_http and alpha.peers == [beta]
+            # One in-flight cap for the host; quotas stay per bot.
+            cap = alpha.admission.max_in_flight
+            held = [alpha.admission.try_admit(None, n)[0] for n in range(cap - 1)]
+            assert beta.admission.in_flight == cap - 1
+            assert beta.admission.try_admit(None, -1, jobs=2) == (None, "in_flight")
+            held.append(beta.admission.try_admit(None, -1)[0])
+            assert all(held) and -1 not in alpha.admission._by_chat
+            for ticket in held:
+                ticket.release()
+            assert alpha.admission.in_flight == 0
+
+            async def scenario() -> None:
+                stop = asyncio.Event()
+                serving = asyncio.create_task(host.serve(stop))
+                server.push_update(
+                    "2:beta",
+                    {
+                        "message": {
+                            "message_id": 1,
+                            "date": int(time.time()),
+                            "chat": {"id": 77, "type": "private"},
+                            "from": {"id": 77, "is_bot": False, "first_name": "U"},
+                            "text": "https://www.instagram.com/reel/AbCdE/",
+                        }
+                    },
+                )
+                for _ in range(100):
+                    if server.calls_to("sendMessage"):
+                        break
+                    await asyncio.sleep(0.05)
+                report = alpha._health_report()
+                assert set(report["bots"]) == {"alpha", "beta"}, report
+                stop.set()
+                await asyncio.wait_for(serving, 15)
+
+            asyncio.run(scenario())
+
+    replies = server.calls_to("sendMessage", token="2:beta")
+    assert len(replies) == 1 and "/reel/AbCdE/" in replies[0]["text"], replies
+    assert "www.instagram.com" not in replies[0]["text"]
+    assert not server.calls_to("sendMessage", token="1:alpha")
+    print("   OK")
+
+
+def test_lazy_yt_dlp():
+    print("\nTesting lazy yt-dlp loading…")
+    import subprocess
+
+    probe = (
+        "import sys, bot, bot_host; bot_host.SharedServices(True);"
+        " print('yt_dlp' in sys.modules)"
+    )
+    env = {**os.environ, "BOT_TOKEN": "dummy", "BOT_PROFILES": "", "JOB_STORE_PATH": ""}
+    out = subprocess.run(
+        [sys.executable, "-c", probe], env=env, capture_output=True, text=True, timeout=60
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip().splitlines()[-1] == "False", out.stdout
+
+    from download_session import SessionPool
+
+    pool = SessionPool({"quiet": True}, size=2)
+    assert pool.warm_up() and not pool.warm_up()
+    with pool.session():
+        pass
+    assert pool.stats()["sessions_created"] == 1, pool.stats()
+    pool.close()
+    print("   OK")
+
+
+def test_load_harness():
+    print("\nTesting offline load harness…")
+    import json
+    import subprocess
+
+    skip = ("BOT_PROFILES", "MIRROR_FALLBACK_HOSTS")
+    env = {k: v for k, v in os.environ.items() if k not in skip}
+    out = subprocess.run(
+        [
+            sys.executable,
+            "bench_load.py",
+            "--messages", "24",
+            "--chats", "4",
+            "--rate", "0",
+            "--timeout", "20",
+            "--mirror", "instagram7.com=placeholder=1",
+            "--mirror", "eeinstagram.com=redirect=1",
+            "--default-mirror", "latency=0.01",
+            "--json",
+        ],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=90,
+    )
+    assert out.returncode == 0, out.stdout + out.stderr
+    report = json.loads(out.stdout.strip().splitlines()[-1])
+    assert report["replied"] == 24 and report["unanswered"] == 0, report
+    # Placeholder pages and redirects to instagram.com are never picked.
+    assert report["replies_by_mirror"] == {"vxinstagram.com": 24}, report
+    assert report["mirror_hits"].get("eeinstagram.com/redirect"), report
+    assert report["latency_s"]["p99"] is not None and report["cpu_s"] > 0, report
+    print("   OK")
+
+
+def test_tiktok_job_dirs():
+    print("\nTesting per-job TikTok download directories…")
+    os.environ.setdefault("BOT_TOKEN", "dummy")
+    import tempfile
+
+    import tiktok_downloader
+    from tiktok_downloader import JOB_DIR_PREFIX, TikTokDownloader
+
+    root = tiktok_downloader.DOWNLOAD_PATH
+    dl = TikTokDownloader()
+    url = "https://www.tiktok.com/@u/video/123"
+    other = tempfile.mkdtemp(prefix=JOB_DIR_PREFIX, dir=root)
+    mine = tempfile.mkdtemp(prefix=JOB_DIR_PREFIX, dir=root)
+    try:
+        with open(os.path.join(other, "123.mp4"), "wb") as f:
+            f.write(b"theirs")
+        # Another job's newer file of the same video is never picked up.
+        assert dl._find_downloaded_file({"id": "123"}, url, mine) is None
+        with open(os.path.join(mine, "123.mp4.part"), "wb") as f:
+            f.write(b"partial")
+        assert dl._find_downloaded_file({"id": "123"}, url, mine) is None
+        with open(os.path.join(mine, "123.mp4"), "wb") as f:
+            f.write(b"mine")
+        found = dl._find_downloaded_file({"id": "123"}, url, mine)
+        assert found == os.path.join(mine, "123.mp4"), found
+        dl.cleanup_files([{"file_path": found}])
+        assert not os.path.exists(mine)
+    finally:
+        import shutil
+
+        shutil.rmtree(other, ignore_errors=True)
+        shutil.rmtree(mine, ignore_errors=True)
+
+    class Broken:
+        def extract_info(self, url):
+            raise RuntimeError("boom")
+
+    before = set(os.listdir(root))
+    ok, _, files = dl._download_with_session(Broken(), url, None)
+    assert not ok and not files
+    assert set(os.listdir(root)) == before, "failed job left its directory behind"
+    dl.sessions.close()
+    print("   OK")
+
+
 def test_tiktok_urls():
     print("\nTesting TikTok URL extract…")
     from tiktok_urls import extract_tiktok_urls
@@ -100,7 +1667,37 @@ def test_tiktok_urls():
 
 def main() -> int:
     print("Social links bot — smoke tests")
-    tests = [test_link_mirror, test_preview_parse, test_tiktok_urls, test_bot_import]
+    tests = [
+        test_link_mirror,
+        test_preview_parse,
+        test_tiktok_urls,
+        test_bot_import,
+        test_local_bot_api_mode,
+        test_job_status,
+        test_tiktok_format_cap,
+        test_ranged_download,
+        test_download_session_pool,
+        test_process_worker_pool,
+        test_tiktok_rate_limit,
+        test_tiktok_batch_album,
+        test_chat_ordered_updates,
+        test_webhook_ingress,
+        test_metrics,
+        test_tracing,
+        test_telegram_rate_limiter,
+        test_dedupe_store,
+        test_edit_handles_new_links_only,
+        test_mirror_stats,
+        test_mirror_canary,
+        test_preview_slo,
+        test_admission_control,
+        test_job_store_resume,
+        test_replica_roles,
+        test_bot_host,
+        test_lazy_yt_dlp,
+        test_load_harness,
+        test_tiktok_job_dirs,
+    ]
     ok = True
     for t in tests:
         try:
@@ -3,65 +3,87 @@
 Test script for web server functionality
 """
 
+import asyncio
 import os
 import sys
-import time
-import threading
-import requests
+
+import httpx
 
 # Set test token for testing
-os.environ['BOT_TOKEN'] = 'test_token_for_testing'
+os.environ.setdefault('BOT_TOKEN', 'test_token_for_testing')
+os.environ.setdefault('JOB_STORE_PATH', '')
+
 
 def test_web_server():
     """Test the web server functionality."""
     print("🧪 Testing web server functionality...")
-    
-    try:
-        from bot import TikTokDownloadBot
-        
-        # Create bot instance
-        bot = TikTokDownloadBot()
-        
-        # Start web server in background
-        web_thread = threading.Thread(target=bot.start_web_server, daemon=True)
-        web_thread.start()
-        
-        # Wait for server to start
-        time.sleep(3)
-        
-        # Test health endpoint
-        try:
-            response = requests.get('http://localhost:8000/health', timeout=5)
-            if response.status_code == 200:
-                print("✅ Health endpoint working correctly")
-                print(f"   Response: {response.json()}")
-            else:
-                print(f"❌ Health endpoint returned status {response.status_code}")
-                return False
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to connect to health endpoint: {e}")
-            return False
-        
-        # Test root endpoint
+
+    from bot import SocialLinksBot
+
+    # Create bot instance; serve on a free port without contacting Telegram
+    bot = SocialLinksBot()
+    bot._http_port = 0
+
+    async def scenario():
+        app = bot.application
+        await bot._post_init(app)
         try:
-            response = requests.get('http://localhost:8000/', timeout=5)
-            if response.status_code == 200:
-                print("✅ Root endpoint working correctly")
-                print(f"   Response: {response.text}")
-            else:
-                print(f"❌ Root endpoint returned status {response.status_code}")
-                return False
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Failed to connect to root endpoint: {e}")
-            return False
-        
-        print("🎉 Web server test passed!")
-        return True
-        
-    except Exception as e:
-        print(f"❌ Web server test failed: {e}")
-        return False
+            base = f"http://127.0.0.1:{bot.http_server.bound_port}"
+            async with httpx.AsyncClient(base_url=base) as client:
+                health = await client.get('/health')
+                root = await client.get('/')
+                ready = await client.get('/ready')
+                metrics = await client.get('/metrics')
+                missing = await client.get('/nope')
+                traces = await client.get('/debug/traces')
+        finally:
+            await bot._post_shutdown(app)
+        return health, root, ready, metrics, missing, traces
+
+    health, root, ready, metrics, missing, traces = asyncio.run(scenario())
+
+    # Test health endpoint
+    assert health.status_code == 200, health.text
+    body = health.json()
+    print("✅ Health endpoint working correctly")
+    print(f"   Response: {body}")
+    assert body["live"] and "event_loop" in body and "queues" in body
+
+    # Reading the loop lag does not reset its maximum; the window does
+    from health import LoopLagMonitor
+
+    monitor = LoopLagMonitor(window=10)
+    start = monitor._window_started
+    monitor.record(1.5, now=start + 1)
+    monitor.record(0.1, now=start + 2)
+    assert monitor.snapshot() == monitor.snapshot() == {"lag_s": 0.1, "max_lag_s": 1.5}
+    monitor.record(0.2, now=start + 12)
+    assert monitor.snapshot()["max_lag_s"] == 1.5
+    monitor.record(0.3, now=start + 23)
+    assert monitor.snapshot()["max_lag_s"] == 0.3 and monitor.peak_lag == 1.5
+
+    # Test root endpoint
+    assert root.status_code == 200, root.text
+    print("✅ Root endpoint working correctly")
+    print(f"   Response: {root.text}")
+
+    # Not polling yet, so not ready
+    assert ready.status_code == 503 and ready.json()["reasons"], ready.text
+    print("✅ Ready endpoint reports not ready before polling starts")
+    assert metrics.status_code == 200 and 'queue_depth{queue="update_queue"} 0' in metrics.text
+    print("✅ Metrics endpoint working correctly")
+    assert missing.status_code == 404
+    # Admin endpoints stay hidden without ADMIN_TOKEN
+    assert traces.status_code == 404
+
+    print("🎉 Web server test passed!")
+    return True
+
 
 if __name__ == "__main__":
-    success = test_web_server()
+    try:
+        success = test_web_server()
+    except Exception as e:
+        print(f"❌ Web server test failed: {e}")
+        success = False
     sys.exit(0 if success else 1)
@@ -2,18 +2,58 @@ import json
 import logging
 import os
 import re
+import shutil
 import subprocess
+import tempfile
 import time
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
-import yt_dlp
+import httpx
 
-from config import DOWNLOAD_PATH, MAX_FILE_SIZE, ERROR_MESSAGES
+from config import (
+    DOWNLOAD_PATH,
+    ERROR_MESSAGES,
+    MAX_FILE_SIZE,
+    TIKTOK_BACKOFF_BASE,
+    TIKTOK_BACKOFF_MAX,
+    TIKTOK_BLOCK_RETRIES,
+    TIKTOK_CHUNK_SIZE,
+    TIKTOK_EXECUTION_MODE,
+    TIKTOK_IMPERSONATE,
+    TIKTOK_PARALLEL_CHUNKS,
+    TIKTOK_RANGED_MIN_SIZE,
+    TIKTOK_RATE_BURST,
+    TIKTOK_RATE_PER_MINUTE,
+    TIKTOK_SESSION_MAX_JOBS,
+    TIKTOK_SESSION_POOL_SIZE,
+    TIKTOK_SIZE_PROBE,
+    TIKTOK_SIZE_PROBE_TIMEOUT,
+    TIKTOK_WORKER_PROCESSES,
+)
+from download_session import DownloadSession, SessionPool
+from metrics import (
+    FFMPEG_NORMALIZE_SECONDS,
+    TIKTOK_DOWNLOAD_SECONDS,
+    TIKTOK_EXTRACT_SECONDS,
+    TIKTOK_JOBS_TOTAL,
+)
+from ranged_download import download_ranged, make_pooled_client
+from rate_limit import (
+    AdaptiveTokenBucket,
+    RetryLater,
+    backoff_delay,
+    http_status_from_error,
+    retry_after_from_error,
+)
+from tracing import span
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Per-job download directories under DOWNLOAD_PATH.
+JOB_DIR_PREFIX = "job-"
+
 
 def probe_video_file(path: str) -> Dict[str, Any]:
     """
@@ -100,6 +140,14 @@ def normalize_for_telegram(src: str) -> str:
     Remux to h264/aac with square pixels — mobile Telegram mis-renders some TikTok HEVC files.
     Returns path to use (original if normalize skipped or failed).
     """
+    with span("ffmpeg.normalize"), FFMPEG_NORMALIZE_SECONDS.time(mode="transcode") as labels:
+        out = _run_normalize(src)
+        if out == src:
+            labels["mode"] = "transcode_failed"
+    return out
+
+
+def _run_normalize(src: str) -> str:
     base, _ = os.path.splitext(src)
     dst = f"{base}_tg.mp4"
     has_audio = probe_has_audio(src)
@@ -165,11 +213,177 @@ def normalize_for_telegram(src: str) -> str:
         return src
 
 
+_COOKIE_ATTRS = frozenset(
+    ("domain", "path", "secure", "expires", "version", "httponly", "max-age", "samesite")
+)
+
+
+def format_request_headers(fmt: Dict[str, Any]) -> Dict[str, str]:
+    """HTTP headers yt-dlp would send for this format, including its scoped cookies."""
+    headers = {k: v for k, v in (fmt.get('http_headers') or {}).items() if v is not None}
+    pairs = []
+    for part in (fmt.get('cookies') or '').split(';'):
+        name, sep, value = part.strip().partition('=')
+        if sep and name and name.lower() not in _COOKIE_ATTRS:
+            pairs.append(f"{name}={value}")
+    if pairs:
+        headers['Cookie'] = '; '.join(pairs)
+    return headers
+
+
+def estimate_format_size(fmt: Dict[str, Any], duration: Optional[float]) -> Optional[int]:
+    """Bytes from filesize/filesize_approx, else total bitrate (kbps) × duration."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return int(size)
+    tbr = fmt.get('tbr') or ((fmt.get('vbr') or 0) + (fmt.get('abr') or 0)) or None
+    if tbr and duration:
+        return int(float(tbr) * 1000 / 8 * float(duration))
+    return None
+
+
+def probe_content_length(
+    url: str, headers: Optional[Dict[str, str]] = None, timeout: float = 5.0
+) -> Optional[int]:
+    """HEAD the media URL; fall back to a one-byte Range GET when HEAD has no length."""
+    try:
+        with httpx.Client(follow_redirects=True, timeout=timeout, headers=headers) as client:
+            resp = client.head(url)
+            length = resp.headers.get('content-length')
+            if resp.status_code < 400 and length and length.isdigit() and int(length) > 0:
+                return int(length)
+            with client.stream('GET', url, headers={'Range': 'bytes=0-0'}) as resp:
+                total = resp.headers.get('content-range', '').rpartition('/')[2]
+                if resp.status_code == 206 and total.isdigit():
+                    return int(total)
+    except Exception as exc:
+        logger.warning("Size probe failed for %s: %s", url[:80], exc)
+    return None
+
+
+def _format_rank(fmt: Dict[str, Any]) -> Tuple[int, int, float]:
+    """Mirrors the ydl_opts ladder: h264 muxes with audio first, then 'download', then the rest."""
+    vcodec = (fmt.get('vcodec') or '').lower()
+    has_audio = (fmt.get('acodec') or '').lower() not in ('', 'none')
+    is_avc = vcodec.startswith('avc') or vcodec == 'h264'
+    if is_avc and has_audio and fmt.get('ext') == 'mp4':
+        tier = 0
+    elif is_avc and has_audio:
+        tier = 1
+    elif fmt.get('format_id') == 'download':
+        tier = 2
+    elif has_audio:
+        tier = 3
+    else:
+        tier = 4
+    return tier, -(fmt.get('height') or 0), -(fmt.get('tbr') or 0)
+
+
+def pick_format_under_cap(
+    formats: List[Dict[str, Any]],
+    duration: Optional[float],
+    cap: int,
+    probe: Optional[Callable[[Dict[str, Any]], Optional[int]]] = None,
+) -> Tuple[Optional[Dict[str, Any]], Optional[int]]:
+    """
+    Best-ranked video format with audio whose estimated (or probed) size fits
+    ``cap``. Video-only formats never win (the upload would be silent); formats
+    whose audio codec is unknown stay in, their audio is checked after download.
+    Falls back to the best format of unknown size; (None, smallest_estimate) means
+    every candidate is known to be too large.
+    """
+    candidates = [
+        f for f in formats
+        if (f.get('vcodec') or '').lower() not in ('none', 'bytevc2')
+        and (f.get('acodec') or '').lower() != 'none'
+        and f.get('url')
+        and (f.get('preference') or 0) > -100
+    ]
+    candidates.sort(key=_format_rank)
+    unknown: Optional[Dict[str, Any]] = None
+    smallest: Optional[int] = None
+    for fmt in candidates:
+        size = estimate_format_size(fmt, duration)
+        if size is None and probe is not None:
+            size = probe(fmt)
+        if size is None:
+            if unknown is None:
+                unknown = fmt
+            continue
+        if size <= cap:
+            return fmt, size
+        smallest = size if smallest is None else min(smallest, size)
+    if unknown is not None:
+        return unknown, None
+    return None, smallest
+
+
+def muxed_format_spec(cap: int) -> str:
+    """yt-dlp spec for formats with audio no larger than ``cap`` (size unknown allowed)."""
+    size = f"[filesize<?{cap}][filesize_approx<?{cap}]"
+    return (
+        f"best[vcodec^=avc][acodec!=none]{size}/"
+        f"download{size}/"
+        f"best[acodec!=none]{size}"
+    )
+
+
+_HTTP_ERROR_RE = re.compile(r"\bHTTP Error (\d{3})\b")
+
+
+def http_error_status(error_msg: str, exc: Optional[BaseException] = None) -> Optional[int]:
+    """
+    HTTP status of a failed download: from the exception chain when there is
+    one, else yt-dlp's "HTTP Error NNN" text. Bare numbers in the message
+    (video ids, byte counts) are not statuses.
+    """
+    status = http_status_from_error(exc) if exc is not None else None
+    if status is None:
+        match = _HTTP_ERROR_RE.search(error_msg)
+        status = int(match.group(1)) if match else None
+    return status
+
+
+def is_blocked_error(error_msg: str, exc: Optional[BaseException] = None) -> bool:
+    """TikTok answered 403/429 — the session's cookies or fingerprint are burnt."""
+    return http_error_status(error_msg, exc) in (403, 429) or "rate limit" in error_msg.lower()
+
+
+class TikTokBlocked(Exception):
+    """TikTok answered 403/429; download_video tells the caller when to retry the job."""
+
+    def __init__(self, error_msg: str, retry_after: Optional[float] = None):
+        super().__init__(error_msg)
+        self.error_msg = error_msg
+        self.retry_after = retry_after
+
+
+def describe_download_error(error_msg: str) -> str:
+    """User-facing text for a yt-dlp DownloadError."""
+    if "Private video" in error_msg or "This video is not available" in error_msg:
+        return ERROR_MESSAGES['private_account']
+    elif "Sign in to confirm your age" in error_msg or "age-restricted" in error_msg.lower():
+        return ERROR_MESSAGES['private_account']
+    elif "Video unavailable" in error_msg or "unavailable" in error_msg.lower():
+        return "❌ Video is unavailable. It may have been deleted or is not accessible."
+    elif http_error_status(error_msg) == 403:
+        return "❌ Access forbidden. TikTok may be blocking requests. Please try again later."
+    elif http_error_status(error_msg) == 429 or "rate limit" in error_msg.lower():
+        return ERROR_MESSAGES['rate_limited']
+    elif "HTTP Error" in error_msg:
+        return f"❌ Connection error: {error_msg[:100]}"
+    else:
+        # Return more detailed error for debugging
+        return f"❌ Download failed: {error_msg[:150]}"
+
+
 class TikTokDownloader:
     def __init__(self):
         """Initialize TikTok downloader."""
         # Create download directory
         os.makedirs(DOWNLOAD_PATH, exist_ok=True)
+        # Keep-alive pool for ranged downloads, created on first use.
+        self._http: Optional[httpx.Client] = None
         
         # TikTok bytevc/hevc ladders are often video-only in the MP4; h264 muxes include audio.
         self.ydl_opts = {
@@ -203,6 +417,21 @@ class TikTokDownloader:
             'fragment_retries': 3,
             'ignoreerrors': False,
         }
+        # Long-lived YoutubeDL instances: cookies, keep-alive pools and TLS sessions
+        # survive between jobs instead of being rebuilt per extract_info call.
+        self.sessions = SessionPool(
+            self.ydl_opts,
+            size=TIKTOK_SESSION_POOL_SIZE,
+            impersonate_targets=TIKTOK_IMPERSONATE,
+            max_jobs=TIKTOK_SESSION_MAX_JOBS,
+        )
+        # Shared by every request this downloader makes to TikTok; worker processes
+        # each get an equal share of the configured rate.
+        workers = TIKTOK_WORKER_PROCESSES if TIKTOK_EXECUTION_MODE == "process" else 1
+        self.limiter = AdaptiveTokenBucket(
+            TIKTOK_RATE_PER_MINUTE / workers,
+            burst=max(1, TIKTOK_RATE_BURST // workers),
+        )
     
     def is_valid_tiktok_url(self, url: str) -> bool:
         """Check if the URL is a valid TikTok URL."""
@@ -245,196 +474,333 @@ class TikTokDownloader:
         
         return None
 
-    def _find_downloaded_file(self, info: dict, url: str) -> Optional[str]:
+    def _find_downloaded_file(self, info: dict, url: str, job_dir: str) -> Optional[str]:
+        """The media file yt-dlp wrote into this job's own directory."""
         video_id = info.get('id') or self.extract_video_id(url) or 'tiktok_video'
         video_ext = info.get('ext', 'mp4')
-        possible_files = [
-            os.path.join(DOWNLOAD_PATH, f"{video_id}.{video_ext}"),
-            os.path.join(DOWNLOAD_PATH, f"{video_id}.mp4"),
-            os.path.join(DOWNLOAD_PATH, f"{info.get('display_id', video_id)}.{video_ext}"),
-            os.path.join(DOWNLOAD_PATH, f"{info.get('display_id', video_id)}.mp4"),
-        ]
-        for file_path in possible_files:
-            if os.path.exists(file_path):
-                return file_path
+        display_id = info.get('display_id', video_id)
+        for name in (
+            f"{video_id}.{video_ext}",
+            f"{video_id}.mp4",
+            f"{display_id}.{video_ext}",
+            f"{display_id}.mp4",
+        ):
+            path = os.path.join(job_dir, name)
+            if os.path.exists(path):
+                return path
+        # Only this job writes here, so whatever finished file is left is ours.
         try:
             files = [
-                f
-                for f in os.listdir(DOWNLOAD_PATH)
-                if os.path.isfile(os.path.join(DOWNLOAD_PATH, f))
+                os.path.join(job_dir, f)
+                for f in os.listdir(job_dir)
+                if not f.endswith(('.part', '.ytdl'))
             ]
-            if files:
-                files.sort(
-                    key=lambda x: os.path.getmtime(os.path.join(DOWNLOAD_PATH, x)),
-                    reverse=True,
-                )
-                most_recent = os.path.join(DOWNLOAD_PATH, files[0])
-                if time.time() - os.path.getmtime(most_recent) < 120:
-                    return most_recent
-        except Exception as e:
+        except OSError as e:
             logger.warning("Error finding downloaded file: %s", e)
-        return None
+            return None
+        files = [f for f in files if os.path.isfile(f)]
+        return max(files, key=os.path.getmtime) if files else None
 
-    def _run_download(self, url: str, ydl_opts: dict) -> Optional[str]:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=True)
-            if not info:
-                return None
-            return self._find_downloaded_file(info, url)
-    
-    def download_video(self, url: str) -> Tuple[bool, str, List[Dict]]:
+    def _probe_format_size(self, fmt: Dict[str, Any]) -> Optional[int]:
+        if not str(fmt.get('protocol') or 'https').startswith('http'):
+            return None
+        self.limiter.acquire()
+        with span("size_probe", format_id=fmt.get('format_id')):
+            return probe_content_length(
+                fmt['url'], format_request_headers(fmt), timeout=TIKTOK_SIZE_PROBE_TIMEOUT
+            )
+
+    def _download_ranged(
+        self,
+        info: Dict[str, Any],
+        fmt: Dict[str, Any],
+        est: Optional[int],
+        progress_hook: Optional[Callable[[Dict[str, Any]], None]],
+        job_dir: str,
+    ) -> Optional[str]:
+        """Parallel Range download of a single-file format; None = let yt-dlp fetch it."""
+        if TIKTOK_PARALLEL_CHUNKS < 2 or not est or est < TIKTOK_RANGED_MIN_SIZE:
+            return None
+        if not str(fmt.get('protocol') or 'https').startswith('http'):
+            return None
+        if self._http is None:
+            self._http = make_pooled_client(TIKTOK_PARALLEL_CHUNKS)
+        video_id = info.get('id') or 'tiktok_video'
+        dest = os.path.join(job_dir, f"{video_id}.{fmt.get('ext') or 'mp4'}")
+        self.limiter.acquire()
+        started = time.monotonic()
+        try:
+            with span("download.ranged", bytes=est):
+                size = download_ranged(
+                    fmt['url'],
+                    dest,
+                    client=self._http,
+                    headers=format_request_headers(fmt),
+                    concurrency=TIKTOK_PARALLEL_CHUNKS,
+                    chunk_size=TIKTOK_CHUNK_SIZE,
+                    progress_hook=progress_hook,
+                )
+        except Exception as exc:
+            logger.warning("Ranged download failed (%s); falling back to yt-dlp", exc)
+            return None
+        TIKTOK_DOWNLOAD_SECONDS.observe(time.monotonic() - started, method="ranged")
+        logger.info(
+            "TikTok ranged download %s bytes in %.1fs (%s connections)",
+            size,
+            time.monotonic() - started,
+            TIKTOK_PARALLEL_CHUNKS,
+        )
+        return dest
+
+    def _run_download(
+        self,
+        session: DownloadSession,
+        url: str,
+        info: Dict[str, Any],
+        format_spec: str,
+        job_dir: str,
+    ) -> Optional[str]:
+        self.limiter.acquire()
+        outtmpl = os.path.join(job_dir, '%(id)s.%(ext)s')
+        with span("download.ytdlp"), TIKTOK_DOWNLOAD_SECONDS.time(method="ytdlp"):
+            done = session.download(info, format_spec, outtmpl=outtmpl)
+        if not done:
+            return None
+        for item in done.get('requested_downloads') or []:
+            path = item.get('filepath')
+            if path and os.path.exists(path):
+                return path
+        return self._find_downloaded_file(done, url, job_dir)
+
+    def download_video(
+        self,
+        url: str,
+        progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+        attempt: int = 0,
+    ) -> Union[Tuple[bool, str, List[Dict]], RetryLater]:
         """
         Download TikTok video and return media file info.
+
+        progress_hook receives yt-dlp progress dicts, then {'status': 'processing'}
+        before ffmpeg normalization. It runs on the download thread. Each job
+        directory is announced first as {'status': 'job_dir', 'job_dir': path},
+        so a worker pool that kills this process can remove it.
+
+        When TikTok throttles (403/429) and ``attempt`` is below
+        TIKTOK_BLOCK_RETRIES, nothing sleeps here: the RetryLater returned says
+        how long to back off before calling again with ``attempt + 1``.
         
         Returns:
-            Tuple of (success, message, media_files)
+            Tuple of (success, message, media_files), or RetryLater
         """
         try:
             if not self.is_valid_tiktok_url(url):
                 return False, ERROR_MESSAGES['invalid_link'], []
-            
-            # First, get video info to determine aspect ratio
             try:
-                with yt_dlp.YoutubeDL(self.ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-            except yt_dlp.utils.DownloadError as e:
-                error_msg = str(e)
-                logger.error(f"Info extraction error: {error_msg}")
-                
-                # Provide more specific error messages
-                if "Private video" in error_msg or "This video is not available" in error_msg:
-                    return False, ERROR_MESSAGES['private_account'], []
-                elif "Sign in to confirm your age" in error_msg or "age-restricted" in error_msg.lower():
-                    return False, ERROR_MESSAGES['private_account'], []
-                elif "Video unavailable" in error_msg or "unavailable" in error_msg.lower():
-                    return False, "❌ Video is unavailable. It may have been deleted or is not accessible.", []
-                elif "HTTP Error 403" in error_msg or "403" in error_msg:
-                    return False, "❌ Access forbidden. TikTok may be blocking requests. Please try again later.", []
-                elif "HTTP Error 429" in error_msg or "429" in error_msg or "rate limit" in error_msg.lower():
-                    return False, ERROR_MESSAGES['rate_limited'], []
-                elif "HTTP Error" in error_msg:
-                    return False, f"❌ Connection error: {error_msg[:100]}", []
-                else:
-                    # Return more detailed error for debugging
-                    return False, f"❌ Download failed: {error_msg[:150]}", []
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Error extracting video info: {error_msg}", exc_info=True)
-                return False, f"❌ Error: {error_msg[:150]}", []
-            
-            if not info:
-                return False, ERROR_MESSAGES['download_failed'], []
-            
-            # Check file size
+                with self.sessions.session(progress_hook) as session:
+                    result = self._download_with_session(session, url, progress_hook)
+                self.limiter.reward()
+                TIKTOK_JOBS_TOTAL.inc(result="ok" if result[0] else "failed")
+                return result
+            except TikTokBlocked as blocked:
+                # 403/429: slow everyone down; the retry gets a fresh session.
+                self.limiter.penalize(blocked.retry_after)
+                message = describe_download_error(blocked.error_msg)
+                if attempt >= TIKTOK_BLOCK_RETRIES:
+                    TIKTOK_JOBS_TOTAL.inc(result="blocked")
+                    return False, message, []
+                delay = max(
+                    blocked.retry_after or 0.0,
+                    backoff_delay(attempt, TIKTOK_BACKOFF_BASE, TIKTOK_BACKOFF_MAX),
+                )
+                logger.warning(
+                    "TikTok blocked (%s); retry %s/%s in %.1fs",
+                    blocked.error_msg[:80],
+                    attempt + 1,
+                    TIKTOK_BLOCK_RETRIES,
+                    delay,
+                )
+                return RetryLater(delay, message)
+        except Exception as e:
+            logger.error(f"Error processing TikTok URL: {e}")
+            TIKTOK_JOBS_TOTAL.inc(result="error")
+            return False, ERROR_MESSAGES['download_failed'], []
+
+    def _download_with_session(
+        self,
+        session: DownloadSession,
+        url: str,
+        progress_hook: Optional[Callable[[Dict[str, Any]], None]],
+    ) -> Tuple[bool, str, List[Dict]]:
+        # Each job writes into its own directory: two jobs for the same video
+        # never share <id>.mp4, its .part file or the normalized _tg.mp4.
+        job_dir = tempfile.mkdtemp(prefix=JOB_DIR_PREFIX, dir=DOWNLOAD_PATH)
+        if progress_hook:
+            progress_hook({'status': 'job_dir', 'job_dir': job_dir})
+        ok = False
+        try:
+            result = self._download_into(session, url, progress_hook, job_dir)
+            ok = result[0]
+            return result
+        finally:
+            if not ok:
+                shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _download_into(
+        self,
+        session: DownloadSession,
+        url: str,
+        progress_hook: Optional[Callable[[Dict[str, Any]], None]],
+        job_dir: str,
+    ) -> Tuple[bool, str, List[Dict]]:
+        # Loaded with the session already; imported here so this module stays light.
+        from yt_dlp.utils import DownloadError
+
+        format_spec = self.ydl_opts['format']
+
+        # First, get video info to determine aspect ratio
+        try:
+            self.limiter.acquire()
+            with span("yt_dlp.extract"), TIKTOK_EXTRACT_SECONDS.time():
+                info = session.extract_info(url)
+        except DownloadError as e:
+            error_msg = str(e)
+            logger.error(f"Info extraction error: {error_msg}")
+            if is_blocked_error(error_msg, e):
+                session.retire(error_msg[:80])
+                raise TikTokBlocked(error_msg, retry_after_from_error(e)) from e
+            return False, describe_download_error(error_msg), []
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"Error extracting video info: {error_msg}", exc_info=True)
+            return False, f"❌ Error: {error_msg[:150]}", []
+
+        if not info:
+            return False, ERROR_MESSAGES['download_failed'], []
+
+        # Pick a format that fits before downloading anything.
+        formats = info.get('formats') or []
+        fmt, est = None, None
+        if formats:
+            probe = self._probe_format_size if TIKTOK_SIZE_PROBE else None
+            fmt, est = pick_format_under_cap(
+                formats, info.get('duration'), MAX_FILE_SIZE, probe=probe
+            )
+            if fmt is None and est is not None:
+                logger.info(
+                    "TikTok rejected before download: smallest format ~%s bytes > cap %s",
+                    est,
+                    MAX_FILE_SIZE,
+                )
+                return False, ERROR_MESSAGES['file_too_large'], []
+            if fmt is not None:
+                logger.info(
+                    "TikTok format %s picked (~%s bytes, cap %s)",
+                    fmt.get('format_id'),
+                    est,
+                    MAX_FILE_SIZE,
+                )
+                format_spec = f"{fmt['format_id']}/{self.ydl_opts['format']}"
+        else:
             filesize = info.get('filesize') or info.get('filesize_approx', 0)
             if filesize and filesize > MAX_FILE_SIZE:
                 return False, ERROR_MESSAGES['file_too_large'], []
-            
-            # Check video dimensions to verify aspect ratio
-            # Note: We use a simple format selector since yt-dlp doesn't support
-            # height>=width comparisons. The downloaded video will match the original aspect ratio.
-            width = info.get('width', 0)
-            height = info.get('height', 0)
-            
-            logger.info(
-                "TikTok merged probe fps=%s vcodec=%s acodec=%s %sx%s",
-                info.get("fps"),
-                info.get("vcodec"),
-                info.get("acodec"),
-                info.get("width"),
-                info.get("height"),
-            )
-
-            # Download (retry without video-only ladders if mux has no audio).
-            downloaded_file = None
-            try:
-                downloaded_file = self._run_download(url, self.ydl_opts)
-                if downloaded_file and not probe_has_audio(downloaded_file):
-                    logger.warning(
-                        "TikTok file has no audio (%s); retrying with muxed format",
-                        downloaded_file,
-                    )
-                    try:
-                        os.remove(downloaded_file)
-                    except OSError:
-                        pass
-                    retry_opts = {
-                        **self.ydl_opts,
-                        'format': (
-                            'best[vcodec^=avc][acodec!=none]/'
-                            'download/best[acodec!=none]/b'
-                        ),
-                    }
-                    downloaded_file = self._run_download(url, retry_opts)
-
-                if not downloaded_file or not os.path.exists(downloaded_file):
-                    logger.error("Downloaded file not found for %s", url)
-                    return False, "❌ Downloaded file not found. The download may have failed.", []
-
-                if not probe_has_audio(downloaded_file):
-                    logger.error("TikTok download still has no audio track: %s", downloaded_file)
-                    os.remove(downloaded_file)
-                    return False, "❌ Downloaded video has no audio. Try again later.", []
 
-                file_size = os.path.getsize(downloaded_file)
-                if file_size > MAX_FILE_SIZE:
-                    os.remove(downloaded_file)
-                    return False, ERROR_MESSAGES['file_too_large'], []
+        logger.info(
+            "TikTok merged probe fps=%s vcodec=%s acodec=%s %sx%s",
+            info.get("fps"),
+            info.get("vcodec"),
+            info.get("acodec"),
+            info.get("width"),
+            info.get("height"),
+        )
 
-                downloaded_file = normalize_for_telegram(downloaded_file)
-                file_size = os.path.getsize(downloaded_file)
-                if file_size > MAX_FILE_SIZE:
+        # Download (retry without video-only ladders if mux has no audio).
+        downloaded_file = None
+        try:
+            if fmt is not None:
+                downloaded_file = self._download_ranged(info, fmt, est, progress_hook, job_dir)
+            if not downloaded_file:
+                downloaded_file = self._run_download(session, url, info, format_spec, job_dir)
+            if downloaded_file and not probe_has_audio(downloaded_file):
+                logger.warning(
+                    "TikTok file has no audio (%s); retrying with muxed format",
+                    downloaded_file,
+                )
+                try:
                     os.remove(downloaded_file)
-                    return False, ERROR_MESSAGES['file_too_large'], []
-
-                vmeta = probe_video_file(downloaded_file)
-                media_files = [{
-                    'type': 'video',
-                    'file_path': downloaded_file,
-                    'file_size': file_size,
-                    'mime_type': 'video/mp4',
-                    'title': info.get('title', 'TikTok Video'),
-                    'duration': vmeta.get('duration') or info.get('duration', 0),
-                    'width': vmeta.get('width') or info.get('width'),
-                    'height': vmeta.get('height') or info.get('height'),
-                }]
-                logger.info(
-                    "TikTok send meta width=%s height=%s duration=%s has_audio=%s",
-                    media_files[0].get("width"),
-                    media_files[0].get("height"),
-                    media_files[0].get("duration"),
-                    probe_has_audio(downloaded_file),
+                except OSError:
+                    pass
+                downloaded_file = self._run_download(
+                    session,
+                    url,
+                    info,
+                    muxed_format_spec(MAX_FILE_SIZE),
+                    job_dir,
                 )
 
-                return True, "✅ Successfully downloaded TikTok video", media_files
-
-            except yt_dlp.utils.DownloadError as e:
-                error_msg = str(e)
-                logger.error(f"Download error: {error_msg}")
-
-                if "Private video" in error_msg or "This video is not available" in error_msg:
-                    return False, ERROR_MESSAGES['private_account'], []
-                elif "Sign in to confirm your age" in error_msg or "age-restricted" in error_msg.lower():
-                    return False, ERROR_MESSAGES['private_account'], []
-                elif "Video unavailable" in error_msg or "unavailable" in error_msg.lower():
-                    return False, "❌ Video is unavailable. It may have been deleted or is not accessible.", []
-                elif "HTTP Error 403" in error_msg or "403" in error_msg:
-                    return False, "❌ Access forbidden. TikTok may be blocking requests. Please try again later.", []
-                elif "HTTP Error 429" in error_msg or "429" in error_msg or "rate limit" in error_msg.lower():
-                    return False, ERROR_MESSAGES['rate_limited'], []
-                elif "HTTP Error" in error_msg:
-                    return False, f"❌ Connection error: {error_msg[:100]}", []
-                else:
-                    return False, f"❌ Download failed: {error_msg[:150]}", []
-            except Exception as e:
-                error_msg = str(e)
-                logger.error(f"Error downloading TikTok video: {error_msg}", exc_info=True)
-                return False, f"❌ Error: {error_msg[:150]}", []
-                    
+            if not downloaded_file or not os.path.exists(downloaded_file):
+                logger.error("Downloaded file not found for %s", url)
+                return False, "❌ Downloaded file not found. The download may have failed.", []
+
+            if not probe_has_audio(downloaded_file):
+                logger.error("TikTok download still has no audio track: %s", downloaded_file)
+                os.remove(downloaded_file)
+                return False, "❌ Downloaded video has no audio. Try again later.", []
+
+            file_size = os.path.getsize(downloaded_file)
+            if file_size > MAX_FILE_SIZE:
+                os.remove(downloaded_file)
+                return False, ERROR_MESSAGES['file_too_large'], []
+
+            if progress_hook:
+                progress_hook({'status': 'processing'})
+            downloaded_file = normalize_for_telegram(downloaded_file)
+            file_size = os.path.getsize(downloaded_file)
+            if file_size > MAX_FILE_SIZE:
+                os.remove(downloaded_file)
+                return False, ERROR_MESSAGES['file_too_large'], []
+
+            vmeta = probe_video_file(downloaded_file)
+            media_files = [{
+                'type': 'video',
+                'file_path': downloaded_file,
+                'file_size': file_size,
+                'mime_type': 'video/mp4',
+                'title': info.get('title', 'TikTok Video'),
+                'duration': vmeta.get('duration') or info.get('duration', 0),
+                'width': vmeta.get('width') or info.get('width'),
+                'height': vmeta.get('height') or info.get('height'),
+            }]
+            logger.info(
+                "TikTok send meta width=%s height=%s duration=%s has_audio=%s",
+                media_files[0].get("width"),
+                media_files[0].get("height"),
+                media_files[0].get("duration"),
+                probe_has_audio(downloaded_file),
+            )
+
+            return True, "✅ Successfully downloaded TikTok video", media_files
+
+        except DownloadError as e:
+            error_msg = str(e)
+            logger.error(f"Download error: {error_msg}")
+            if is_blocked_error(error_msg, e):
+                session.retire(error_msg[:80])
+                raise TikTokBlocked(error_msg, retry_after_from_error(e)) from e
+            return False, describe_download_error(error_msg), []
         except Exception as e:
-            logger.error(f"Error processing TikTok URL: {e}")
-            return False, ERROR_MESSAGES['download_failed'], []
-    
+            error_msg = str(e)
+            logger.error(f"Error downloading TikTok video: {error_msg}", exc_info=True)
+            return False, f"❌ Error: {error_msg[:150]}", []
+
+    def session_stats(self) -> Dict[str, Any]:
+        return self.sessions.stats()
+
+    def warm_up(self) -> bool:
+        """Load yt-dlp and open a session before the first job needs one (blocking)."""
+        return self.sessions.warm_up()
+
     def cleanup_files(self, media_files: List[Dict]):
         """Clean up downloaded files after sending."""
         for media in media_files:
@@ -442,6 +808,9 @@ class TikTokDownloader:
                 if os.path.exists(media['file_path']):
                     os.remove(media['file_path'])
                     logger.info(f"Cleaned up {media['file_path']}")
+                job_dir = os.path.dirname(media['file_path'])
+                if os.path.basename(job_dir).startswith(JOB_DIR_PREFIX):
+                    shutil.rmtree(job_dir, ignore_errors=True)
             except Exception as e:
                 logger.error(f"Error cleaning up {media['file_path']}: {e}")
 
@@ -0,0 +1,124 @@
+"""Per-update tracing spans (contextvars) with a ring buffer of slow traces."""
+
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+_current: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "trace_span", default=None
+)
+_NOOP = nullcontext()
+
+_enabled = False
+_slow_threshold = 5.0
+_slow: Deque[Dict[str, Any]] = deque(maxlen=50)
+_slow_lock = threading.Lock()
+
+
+def configure(*, enabled: bool, slow_threshold: float, buffer_size: int) -> None:
+    global _enabled, _slow_threshold, _slow
+    _enabled = enabled
+    _slow_threshold = slow_threshold
+    with _slow_lock:
+        _slow = deque(_slow, maxlen=max(1, buffer_size))
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children", "error", "thread")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]):
+        self.name = name
+        self.attrs = attrs
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.thread = threading.current_thread().name
+
+    @property
+    def duration(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: Optional[float] = None) -> Dict[str, Any]:
+        origin = self.start if origin is None else origin
+        out: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 1),
+            "ms": round(self.duration * 1000, 1),
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.error:
+            out["error"] = self.error
+        if self.thread != "MainThread":
+            out["thread"] = self.thread
+        if self.children:
+            out["children"] = [c.to_dict(origin) for c in list(self.children)]
+        return out
+
+
+@contextmanager
+def _open(name: str, attrs: Dict[str, Any], parent: Optional[Span]) -> Iterator[Span]:
+    current = Span(name, attrs)
+    if parent is not None:
+        parent.children.append(current)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as exc:
+        current.error = f"{type(exc).__name__}: {exc}"[:200]
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+
+
+def span(name: str, **attrs: Any):
+    """
+    Child span of the active trace; a shared no-op when there is none, so
+    instrumented code costs one ContextVar lookup with tracing off.
+    asyncio.to_thread copies the context, so spans opened on worker threads
+    attach to the calling update's trace.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return _open(name, attrs, parent)
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    """Root span for one update; kept in the slow buffer if it exceeds the threshold."""
+    if not _enabled:
+        yield None
+        return
+    with _open(name, attrs, None) as root:
+        try:
+            yield root
+        finally:
+            root.end = time.perf_counter()
+            if root.duration >= _slow_threshold:
+                record = root.to_dict()
+                record["at"] = time.time()
+                with _slow_lock:
+                    _slow.append(record)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def slow_traces(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Newest first."""
+    with _slow_lock:
+        items = list(_slow)
+    items.reverse()
+    return items[:limit] if limit else items
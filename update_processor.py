@@ -0,0 +1,113 @@
+"""Concurrent update handling that keeps each chat (and forum topic) in order."""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import UPDATE_HANDLE_SECONDS, UPDATE_WAIT_SECONDS
+
+
+def update_order_key(update: object) -> Optional[Hashable]:
+    """
+    (chat id, topic id) for updates that must not overtake each other; updates
+    without a chat fall back to the user; None means no ordering is needed.
+    """
+    if not isinstance(update, Update):
+        return None
+    message = update.effective_message
+    chat = update.effective_chat
+    if chat is not None:
+        topic = (
+            message.message_thread_id
+            if message is not None and message.is_topic_message
+            else None
+        )
+        return ("chat", chat.id, topic)
+    user = update.effective_user
+    if user is not None:
+        return ("user", user.id)
+    return None
+
+
+class _KeyLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Runs up to ``max_running`` handlers at once across chats, one at a time per
+    chat/topic, in arrival order (asyncio.Lock wakes waiters FIFO).
+
+    PTB's own semaphore in process_update is taken *before* our per-chat wait,
+    so it is sized ``max_pending``: updates queued behind a busy chat must not
+    use up the slots other chats need. ``max_running`` is enforced only after
+    the chat lock is held.
+    """
+
+    def __init__(self, max_running: int, max_pending: Optional[int] = None):
+        max_running = max(1, max_running)
+        super().__init__(max(max_running, max_pending or max_running * 16))
+        self.max_running = max_running
+        self._running: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[Hashable, _KeyLock] = {}
+        self.active = 0
+        self.waiting = 0
+
+    async def initialize(self) -> None:
+        self._running = asyncio.Semaphore(self.max_running)
+
+    async def shutdown(self) -> None:
+        self._locks.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_running": self.max_running,
+            "running": self.active,
+            "waiting": self.waiting,
+            "ordered_keys": len(self._locks),
+        }
+
+    async def _run(self, coroutine: Awaitable[Any], queued_at: float) -> None:
+        if self._running is None:
+            self._running = asyncio.Semaphore(self.max_running)
+        async with self._running:
+            UPDATE_WAIT_SECONDS.observe(time.perf_counter() - queued_at)
+            self.active += 1
+            try:
+                with UPDATE_HANDLE_SECONDS.time():
+                    await coroutine
+            finally:
+                self.active -= 1
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        queued_at = time.perf_counter()
+        key = update_order_key(update)
+        if key is None:
+            await self._run(coroutine, queued_at)
+            return
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _KeyLock()
+        entry.users += 1
+        self.waiting += 1
+        queued = True
+        try:
+            async with entry.lock:
+                queued = False
+                self.waiting -= 1
+                await self._run(coroutine, queued_at)
+        finally:
+            if queued:
+                self.waiting -= 1
+            entry.users -= 1
+            if entry.users == 0:
+                self._locks.pop(key, None)
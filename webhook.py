@@ -0,0 +1,88 @@
+"""Telegram webhook ingestion on top of http_server, feeding PTB's update queue."""
+
+from __future__ import annotations
+
+import asyncio
+import hmac
+import logging
+from typing import Callable, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from http_server import Request, Response
+from update_processor import ChatOrderedUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def update_backlog(application: Application) -> int:
+    """Updates accepted but not yet handled: queued plus in the update processor."""
+    backlog = application.update_queue.qsize()
+    processor = application.update_processor
+    if isinstance(processor, ChatOrderedUpdateProcessor):
+        backlog += processor.active + processor.waiting
+    return backlog
+
+
+class WebhookIngress:
+    """
+    POST handler for Telegram updates. Rejects a wrong secret token with 403 and
+    answers 503 + Retry-After while the backlog is full or the bot is draining;
+    Telegram redelivers those updates later, so nothing is lost.
+    """
+
+    def __init__(
+        self,
+        application: Application,
+        *,
+        secret: Optional[str],
+        max_pending: int,
+        backlog: Optional[Callable[[], int]] = None,
+        retry_after: int = 5,
+    ):
+        self._application = application
+        self._secret = secret
+        self._max_pending = max(1, max_pending)
+        self._backlog = backlog or (lambda: update_backlog(application))
+        self._retry_after = str(retry_after)
+        self.draining = False
+        self.accepted = 0
+        self.rejected_busy = 0
+        self.rejected_auth = 0
+
+    async def handle(self, request: Request) -> Response:
+        if self._secret and not hmac.compare_digest(
+            (request.header(SECRET_HEADER) or "").encode(), self._secret.encode()
+        ):
+            self.rejected_auth += 1
+            return Response.text("forbidden", 403)
+        if self.draining or self._backlog() >= self._max_pending:
+            self.rejected_busy += 1
+            return Response.text("busy", 503, Retry_After=self._retry_after)
+        try:
+            update = Update.de_json(request.json(), self._application.bot)
+        except (ValueError, TypeError, KeyError) as exc:
+            logger.warning("Rejecting malformed webhook update: %s", exc)
+            return Response.text("bad update", 400)
+        if update is None:
+            return Response.text("bad update", 400)
+        await self._application.update_queue.put(update)
+        self.accepted += 1
+        return Response.text("ok")
+
+    async def drain(self, timeout: float) -> bool:
+        """Refuse new updates and wait for accepted ones to finish; False on timeout."""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._application.update_queue.join(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(
+                "Webhook drain timed out after %.0fs with %s updates pending",
+                timeout,
+                self._backlog(),
+            )
+            return False